@@ -0,0 +1,23 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+# Blocking database calls (the sync Firestore client and the local stores)
+# run here instead of on the event loop. The pool is bounded so a burst of
+# requests queues instead of opening unbounded threads and connections.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", "32")),
+    thread_name_prefix="db"
+)
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call on the shared DB executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def shutdown_executor():
+    _executor.shutdown(wait=True)
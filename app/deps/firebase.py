@@ -11,12 +11,16 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 _firebase_app = None
 _db = None
 _storage_client = None
+_init_attempted = False
 
 def initialize_firebase():
-    global _firebase_app, _db, _storage_client
+    global _firebase_app, _db, _storage_client, _init_attempted
     
-    if _firebase_app is not None:
+    # Initialize once per process; without credentials every get_db() call
+    # would otherwise retry (and log) the failed initialization
+    if _firebase_app is not None or _init_attempted:
         return _firebase_app
+    _init_attempted = True
     
     try:
         # Try to get service account from environment
@@ -63,11 +67,23 @@ def get_db():
     if _db is None:
         initialize_firebase()
     if _db is None:
-        # Use mock database for development
+        # Use a local document store for development; the SQLite backend
+        # can be shared by several worker processes
+        if os.getenv("DB_BACKEND", "mock") == "sqlite":
+            from .sqlite_db import sqlite_db
+            return sqlite_db
         from .mock_db import mock_db
         return mock_db
     return _db
 
+def get_firestore():
+    """Firestore client, or an in-process fake over the local store in development"""
+    db = get_db()
+    if hasattr(db, 'create_document'):
+        from .firestore_fake import get_fake_firestore
+        return get_fake_firestore(db)
+    return db
+
 def get_storage():
     if _storage_client is None:
         initialize_firebase()
@@ -0,0 +1,360 @@
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1.transforms import (
+    ArrayRemove, ArrayUnion, DELETE_FIELD, Increment, Maximum, Minimum, SERVER_TIMESTAMP
+)
+from .mock_db import MockAggregationQuery, MockQuery, thaw
+
+# Timestamps are stored as ISO strings (the local stores are JSON). Each
+# document lists the paths of the fields written as timestamps in
+# TIMESTAMPS_FIELD, and only those are handed back as datetimes, like
+# Firestore does; any other string stays a string
+TIMESTAMPS_FIELD = '__timestamps__'
+
+def _encode(value: Any) -> Any:
+    """Query values in stored form"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+def _store(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Document in stored form, with its timestamp paths tagged"""
+    paths: List[List[Any]] = []
+
+    def encode(value: Any, path: List[Any]) -> Any:
+        if isinstance(value, datetime):
+            paths.append(path)
+            return value.isoformat()
+        if isinstance(value, dict):
+            return {k: encode(v, path + [k]) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [encode(v, path + [i]) for i, v in enumerate(value)]
+        return value
+
+    stored = encode({k: v for k, v in doc.items() if k != TIMESTAMPS_FIELD}, [])
+    if paths:
+        stored[TIMESTAMPS_FIELD] = paths
+    return stored
+
+def _load(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Stored (thawed) document with its tagged fields turned back into datetimes"""
+    for path in doc.pop(TIMESTAMPS_FIELD, None) or ():
+        parent: Any = doc
+        try:
+            for key in path[:-1]:
+                parent = parent[key]
+            value = parent[path[-1]]
+        except (KeyError, IndexError, TypeError):
+            # The field was since overwritten or removed outside this client
+            continue
+        if isinstance(value, str):
+            try:
+                parent[path[-1]] = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                pass
+    return doc
+
+def _resolve(current: Any, value: Any, now: datetime) -> Any:
+    """Turn a written value (possibly a Firestore transform) into what is stored"""
+    if value is SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, ArrayUnion):
+        existing = list(current) if isinstance(current, list) else []
+        return existing + [v for v in value.values if v not in existing]
+    if isinstance(value, ArrayRemove):
+        removed = list(value.values)
+        return [v for v in (current if isinstance(current, list) else []) if v not in removed]
+    if isinstance(value, Increment):
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, (Maximum, Minimum)):
+        if not isinstance(current, (int, float)):
+            return value.value
+        return max(current, value.value) if isinstance(value, Maximum) else min(current, value.value)
+    if isinstance(value, dict):
+        return {k: _resolve(None, v, now) for k, v in value.items() if v is not DELETE_FIELD}
+    return value
+
+def _apply_field(doc: Dict[str, Any], path: str, value: Any, now: datetime):
+    """Write one dotted field path, as update() does"""
+    parts = path.split('.')
+    for part in parts[:-1]:
+        if not isinstance(doc.get(part), dict):
+            doc[part] = {}
+        doc = doc[part]
+    if value is DELETE_FIELD:
+        doc.pop(parts[-1], None)
+    else:
+        doc[parts[-1]] = _resolve(doc.get(parts[-1]), value, now)
+
+def _merge(doc: Dict[str, Any], data: Mapping[str, Any], now: datetime):
+    """Deep-merge written data, as set(..., merge=True) does"""
+    for key, value in data.items():
+        if value is DELETE_FIELD:
+            doc.pop(key, None)
+        elif isinstance(value, dict) and isinstance(doc.get(key), dict):
+            _merge(doc[key], value, now)
+        else:
+            doc[key] = _resolve(doc.get(key), value, now)
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[Mapping[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return _load(thaw(self._data)) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value: Any = self.to_dict() or {}
+        for part in field_path.split('.'):
+            value = value[part]
+        return value
+
+class FakeDocumentReference:
+    def __init__(self, client: "FakeFirestore", collection: str, doc_id: str):
+        self._client = client
+        self.collection_id = collection
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.collection_id}/{self.id}"
+
+    @property
+    def parent(self) -> "FakeCollectionReference":
+        return FakeCollectionReference(self._client, self.collection_id)
+
+    def get(self, transaction: Optional["FakeTransaction"] = None) -> FakeDocumentSnapshot:
+        if transaction is not None:
+            return transaction.get_document(self)
+        return FakeDocumentSnapshot(self, self._client._store.get_document(self.collection_id, self.id))
+
+    def create(self, document_data: Dict[str, Any]):
+        batch = self._client.batch()
+        batch.create(self, document_data)
+        batch.commit()
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        batch = self._client.batch()
+        batch.set(self, document_data, merge=merge)
+        batch.commit()
+
+    def update(self, field_updates: Dict[str, Any]):
+        batch = self._client.batch()
+        batch.update(self, field_updates)
+        batch.commit()
+
+    def delete(self):
+        batch = self._client.batch()
+        batch.delete(self)
+        batch.commit()
+
+class FakeQuery:
+    """Firestore query surface compiled onto the local store's MockQuery"""
+
+    ASCENDING = MockQuery.ASCENDING
+    DESCENDING = MockQuery.DESCENDING
+
+    def __init__(self, client: "FakeFirestore", collection: str, query: Optional[MockQuery] = None):
+        self._client = client
+        self.collection_id = collection
+        self._query = query if query is not None else client._store.query(collection)
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, filter: Any = None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return FakeQuery(self._client, self.collection_id, self._query.where(field_path, op_string, _encode(value)))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "FakeQuery":
+        # The store keeps document IDs in the 'id' field
+        field_path = 'id' if field_path == '__name__' else field_path
+        return FakeQuery(self._client, self.collection_id, self._query.order_by(field_path, direction))
+
+    def select(self, field_paths: Iterable[str]) -> "FakeQuery":
+        # The timestamp tags come along so the selected timestamps decode
+        fields = [*field_paths, TIMESTAMPS_FIELD]
+        return FakeQuery(self._client, self.collection_id, self._query.select(fields))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self._client, self.collection_id, self._query.limit(count))
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "FakeQuery":
+        if isinstance(document_fields_or_snapshot, FakeDocumentSnapshot):
+            cursor = dict(document_fields_or_snapshot._data or {}, id=document_fields_or_snapshot.id)
+        else:
+            cursor = _encode(dict(document_fields_or_snapshot))
+            if '__name__' in cursor:
+                name = cursor.pop('__name__')
+                cursor['id'] = getattr(name, 'id', name)
+        return FakeQuery(self._client, self.collection_id, self._query.start_after(cursor))
+
+    def stream(self) -> Iterator[FakeDocumentSnapshot]:
+        for data in self._query.stream():
+            ref = FakeDocumentReference(self._client, self.collection_id, data['id'])
+            yield FakeDocumentSnapshot(ref, data)
+
+    def get(self) -> List[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+    def count(self, alias: Optional[str] = None) -> MockAggregationQuery:
+        return self._query.count(alias)
+
+    def sum(self, field_path: str, alias: Optional[str] = None) -> MockAggregationQuery:
+        return self._query.sum(field_path, alias)
+
+    def avg(self, field_path: str, alias: Optional[str] = None) -> MockAggregationQuery:
+        return self._query.avg(field_path, alias)
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: "FakeFirestore", collection: str):
+        super().__init__(client, collection)
+        self.id = collection
+
+    def document(self, document_id: Optional[str] = None) -> FakeDocumentReference:
+        if document_id is None:
+            document_id = self._client._store._new_id(self.id)
+        return FakeDocumentReference(self._client, self.id, document_id)
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None) -> Tuple[datetime, FakeDocumentReference]:
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+class FakeWriteBatch:
+    """Buffers writes and resolves transforms against current data on commit()"""
+
+    def __init__(self, client: "FakeFirestore"):
+        self._client = client
+        self._writes: List[Tuple[str, FakeDocumentReference, Dict[str, Any], bool]] = []
+
+    def create(self, reference: FakeDocumentReference, document_data: Dict[str, Any]):
+        self._writes.append(('create', reference, document_data, False))
+
+    def set(self, reference: FakeDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._writes.append(('set', reference, document_data, merge))
+
+    def update(self, reference: FakeDocumentReference, field_updates: Dict[str, Any]):
+        self._writes.append(('update', reference, field_updates, False))
+
+    def delete(self, reference: FakeDocumentReference):
+        self._writes.append(('delete', reference, {}, False))
+
+    def commit(self) -> List[datetime]:
+        writes, self._writes = self._writes, []
+        now = datetime.now(timezone.utc)
+        # Transforms are resolved inside the store's transaction, so they read
+        # exactly what they overwrite
+        self._client._store.transact(lambda get: _resolve_writes(writes, get, now))
+        return [now for _ in writes]
+
+class FakeTransaction(FakeWriteBatch):
+    """Handed to run_transaction() callbacks: reads go through the store
+    transaction and writes are applied when the callback returns"""
+
+    def __init__(self, client: "FakeFirestore", get):
+        super().__init__(client)
+        self._get = get
+
+    def get_document(self, reference: FakeDocumentReference) -> FakeDocumentSnapshot:
+        return FakeDocumentSnapshot(reference, self._get(reference.collection_id, reference.id))
+
+    def get_all(self, references: Iterable[FakeDocumentReference]) -> Iterator[FakeDocumentSnapshot]:
+        for ref in references:
+            yield self.get_document(ref)
+
+def _resolve_writes(writes: List[Tuple[str, FakeDocumentReference, Dict[str, Any], bool]],
+                    get, now: datetime) -> List[Tuple[str, str, str, Optional[Dict[str, Any]]]]:
+    """Turn buffered writes into plain store operations, reading current
+    documents through get(collection, doc_id)"""
+    current: Dict[Tuple[str, str], Optional[Dict[str, Any]]] = {}
+    for op, ref, data, merge in writes:
+        key = (ref.collection_id, ref.id)
+        if key not in current:
+            existing = get(ref.collection_id, ref.id)
+            current[key] = _load(thaw(existing)) if existing is not None else None
+        doc = current[key]
+        if op == 'create' and doc is not None:
+            raise AlreadyExists(f"Document already exists: {ref.path}")
+        if op == 'update' and doc is None:
+            raise NotFound(f"No document to update: {ref.path}")
+        if op == 'delete':
+            current[key] = None
+            continue
+        if op == 'update':
+            new_doc = doc
+            for field_path, value in data.items():
+                _apply_field(new_doc, field_path, value, now)
+        elif merge and doc is not None:
+            new_doc = doc
+            _merge(new_doc, data, now)
+        else:
+            new_doc = _resolve(None, dict(data), now)
+        current[key] = new_doc
+
+    return [
+        ('delete', collection, doc_id, None) if doc is None else ('set', collection, doc_id, dict(_store(doc), id=doc_id))
+        for (collection, doc_id), doc in current.items()
+    ]
+
+class FakeFirestore:
+    """In-process stand-in for the Firestore client, backed by the local store.
+
+    Covers the surface the app uses (collection/document get/set/update/
+    delete/add, where/order_by/limit/start_after/select/stream, batches, get_all)
+    and interprets SERVER_TIMESTAMP, DELETE_FIELD, ArrayUnion, ArrayRemove,
+    Increment, Maximum and Minimum. Queries run on the store's declared indexes.
+    run_transaction() stands in for firestore.transactional.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def collection(self, collection_id: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, collection_id)
+
+    def document(self, document_path: str) -> FakeDocumentReference:
+        collection, doc_id = document_path.split('/')
+        return FakeDocumentReference(self, collection, doc_id)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def run_transaction(self, fn: Callable[[FakeTransaction], Any]) -> Any:
+        """Run fn(transaction) and apply its writes in one store transaction, so
+        nothing changes what it read in between; returns what fn returns"""
+        result = None
+
+        def attempt(get):
+            nonlocal result
+            transaction = FakeTransaction(self, get)
+            result = fn(transaction)
+            return _resolve_writes(transaction._writes, get, datetime.now(timezone.utc))
+
+        self._store.transact(attempt)
+        return result
+
+    def get_all(self, references: Iterable[FakeDocumentReference],
+                transaction: Optional[FakeTransaction] = None) -> Iterator[FakeDocumentSnapshot]:
+        """Multi-get: one store lookup per collection"""
+        if transaction is not None:
+            yield from transaction.get_all(references)
+            return
+        by_collection: Dict[str, List[FakeDocumentReference]] = {}
+        for ref in references:
+            by_collection.setdefault(ref.collection_id, []).append(ref)
+        for collection, refs in by_collection.items():
+            found = self._store.get_documents(collection, [ref.id for ref in refs])
+            for ref in refs:
+                yield FakeDocumentSnapshot(ref, found.get(ref.id))
+
+def get_fake_firestore(store) -> FakeFirestore:
+    """Return a fake client over a local store (or a request session over one)"""
+    return FakeFirestore(store)
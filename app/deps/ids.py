@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from typing import List
+
+_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+_TIME_WIDTH = 9     # milliseconds since the epoch, good until the year 5188
+_SEQ_WIDTH = 3      # 46656 IDs per millisecond per process
+_NODE_WIDTH = 5
+_MAX_SEQ = 36 ** _SEQ_WIDTH
+
+def _base36(value: int, width: int) -> str:
+    chars = []
+    for _ in range(width):
+        value, rem = divmod(value, 36)
+        chars.append(_ALPHABET[rem])
+    return "".join(reversed(chars))
+
+class IdAllocator:
+    """Hands out time-ordered document IDs that are unique across processes.
+
+    An ID is <prefix>_<time><sequence><node>: the millisecond clock, a
+    per-millisecond counter and a random per-process node tag, all fixed-width
+    base36, so IDs sort by creation time and no shared state is needed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._seq = 0
+        self._reset_node()
+
+    def _reset_node(self):
+        self._node = _base36(int.from_bytes(os.urandom(4), "big"), _NODE_WIDTH)
+
+    def _reserve(self, count: int) -> List[tuple]:
+        """Claim `count` consecutive (millisecond, sequence) slots"""
+        slots = []
+        with self._lock:
+            now = int(time.time() * 1000)
+            if now > self._last_ms:
+                self._last_ms, self._seq = now, 0
+            # If the clock stalls or steps back, keep counting from the last
+            # millisecond handed out so IDs stay unique and increasing
+            for _ in range(count):
+                if self._seq >= _MAX_SEQ:
+                    self._last_ms, self._seq = self._last_ms + 1, 0
+                slots.append((self._last_ms, self._seq))
+                self._seq += 1
+        return slots
+
+    def new_id(self, prefix: str) -> str:
+        """Return one new ID"""
+        return self.new_ids(prefix, 1)[0]
+
+    def new_ids(self, prefix: str, count: int) -> List[str]:
+        """Reserve a block of `count` IDs in creation order"""
+        return [
+            f"{prefix}_{_base36(ms, _TIME_WIDTH)}{_base36(seq, _SEQ_WIDTH)}{self._node}"
+            for ms, seq in self._reserve(count)
+        ]
+
+# Global instance
+id_allocator = IdAllocator()
+
+if hasattr(os, "register_at_fork"):
+    # Forked workers must not share the parent's node tag
+    os.register_at_fork(after_in_child=id_allocator._reset_node)
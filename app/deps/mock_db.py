@@ -1,77 +1,793 @@
 import json
 import os
-from typing import Dict, List, Optional, Any
+import re
+import shutil
+import threading
+from functools import cmp_to_key
+from types import MappingProxyType
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, Iterable, Iterator, Mapping, Tuple
 from datetime import datetime
+from .ids import id_allocator
+
+# Secondary indexes per collection: "hash" serves == lookups, "array" serves
+# array_contains lookups on list fields.
+DEFAULT_INDEXES = {
+    "users": {"role": "hash", "class_ids": "array"},
+    "classes": {"teacher_uid": "hash", "student_uids": "array"},
+    "assignments": {"class_id": "hash", "teacher_uid": "hash"},
+    "submissions": {"assn_id": "hash", "student_uid": "hash"},
+    "lessons": {"teacher_uid": "hash", "student_uid": "hash"},
+    "individual_assignments": {"teacher_uid": "hash", "student_uid": "hash"},
+    "student_teacher_relations": {"teacher_uid": "hash", "student_uid": "hash"},
+    "game_results": {"game_name": "hash", "student_uid": "hash"},
+    "progress_buckets": {"student_uid": "hash"},
+}
+
+def freeze(value: Any) -> Any:
+    """Deep read-only copy: dicts become mapping proxies and lists tuples"""
+    if isinstance(value, MappingProxyType):
+        return value
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """Deep mutable copy of a stored (frozen) document or value"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+def _index_key(value: Any) -> Any:
+    """Return a hashable key that compares like the original value"""
+    if isinstance(value, (list, tuple, Mapping)):
+        return ("__json__", json.dumps(value, sort_keys=True, default=_json_default))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ("__json__", json.dumps(value, sort_keys=True, default=_json_default))
+
+class FieldIndex:
+    """Maps field values to the IDs of the documents that hold them"""
+
+    def __init__(self, field: str, kind: str = "hash"):
+        if kind not in ("hash", "array"):
+            raise ValueError(f"Unknown index kind: {kind}")
+        self.field = field
+        self.kind = kind
+        # key -> doc IDs (a dict keeps insertion order and O(1) removal)
+        self.entries: Dict[Any, Dict[str, None]] = {}
+        # doc ID -> keys it is currently indexed under; callers may mutate
+        # stored documents in place, so removal must not re-read the document
+        self.doc_keys: Dict[str, tuple] = {}
+
+    def _keys_for(self, doc: Dict[str, Any]) -> tuple:
+        if self.field not in doc:
+            return ()
+        value = doc[self.field]
+        if self.kind == "array":
+            if not isinstance(value, (list, tuple)):
+                return ()
+            return tuple(dict.fromkeys(_index_key(v) for v in value))
+        return (_index_key(value),)
+
+    def add(self, doc_id: str, doc: Dict[str, Any]):
+        keys = self._keys_for(doc)
+        if keys:
+            self.doc_keys[doc_id] = keys
+            for key in keys:
+                self.entries.setdefault(key, {})[doc_id] = None
+
+    def remove(self, doc_id: str):
+        for key in self.doc_keys.pop(doc_id, ()):
+            ids = self.entries.get(key)
+            if ids is not None:
+                ids.pop(doc_id, None)
+                if not ids:
+                    del self.entries[key]
+
+    def lookup(self, value: Any) -> List[str]:
+        return list(self.entries.get(_index_key(value), ()))
+
+def _sort_key(value: Any) -> tuple:
+    """Order mixed values the way Firestore does: null < bool < number < text"""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        # Timestamps are stored as ISO strings unless a caller passed a datetime
+        return (3, value.isoformat())
+    if isinstance(value, str):
+        return (3, value)
+    return (4, json.dumps(value, sort_keys=True, default=_json_default))
+
+def _matches(doc: Dict[str, Any], field: str, operator: str, value: Any) -> bool:
+    if field not in doc:
+        return False
+    current = doc[field]
+    if isinstance(current, (tuple, Mapping)) and operator in ("==", "!=", "in", "not-in"):
+        current = thaw(current)
+    if operator == "==":
+        return current == value
+    if operator == "!=":
+        return current != value
+    if operator == "in":
+        return current in value
+    if operator == "not-in":
+        # Like Firestore (and SQL), not-in never matches null
+        return current is not None and current not in value
+    if operator == "array_contains":
+        return isinstance(current, (list, tuple)) and value in current
+    if operator == "array_contains_any":
+        return isinstance(current, (list, tuple)) and any(v in current for v in value)
+    if operator in ("<", "<=", ">", ">="):
+        left, right = _sort_key(current), _sort_key(value)
+        if left[0] != right[0]:
+            return False
+        if operator == "<":
+            return left < right
+        if operator == "<=":
+            return left <= right
+        if operator == ">":
+            return left > right
+        return left >= right
+    raise ValueError(f"Unsupported operator: {operator}")
+
+def project(doc_data: Mapping[str, Any], fields: Iterable[str]) -> Mapping[str, Any]:
+    """Read-only view of a document holding only the given fields and its ID"""
+    return MappingProxyType({k: doc_data[k] for k in ('id', *fields) if k in doc_data})
+
+class AggregationResult(NamedTuple):
+    """One value of an aggregation query, shaped like Firestore's"""
+    alias: str
+    value: Any
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def accumulate(docs: Iterable[Mapping[str, Any]], aggregations: Iterable[Tuple[str, Optional[str], str]]) -> Dict[str, Any]:
+    """Fold documents into count/sum/avg values keyed by alias. Like Firestore,
+    sum and avg only see numeric values, and avg of none is None."""
+    aggregations = list(aggregations)
+    fields = [(field, alias) for kind, field, alias in aggregations if kind != 'count']
+    count = 0
+    totals = {alias: 0 for _, alias in fields}
+    seen = {alias: 0 for _, alias in fields}
+    for doc_data in docs:
+        count += 1
+        for field, alias in fields:
+            value = doc_data.get(field)
+            if _is_number(value):
+                totals[alias] += value
+                seen[alias] += 1
+    values = {}
+    for kind, _, alias in aggregations:
+        if kind == 'count':
+            values[alias] = count
+        elif kind == 'sum':
+            values[alias] = totals[alias]
+        else:
+            values[alias] = totals[alias] / seen[alias] if seen[alias] else None
+    return values
+
+class MockAggregationQuery:
+    """count()/sum()/avg() over the matches of a MockQuery, computed by the
+    store without returning the documents. Only the query's filters apply."""
+
+    def __init__(self, query: "MockQuery", aggregations: Tuple[Tuple[str, Optional[str], str], ...] = ()):
+        self._query = query
+        self.aggregations = aggregations
+
+    def _add(self, kind: str, field: Optional[str], alias: Optional[str]) -> "MockAggregationQuery":
+        alias = alias or (kind if field is None else f"{kind}_{field}")
+        return MockAggregationQuery(self._query, self.aggregations + ((kind, field, alias),))
+
+    def count(self, alias: Optional[str] = None) -> "MockAggregationQuery":
+        return self._add('count', None, alias)
+
+    def sum(self, field: str, alias: Optional[str] = None) -> "MockAggregationQuery":
+        return self._add('sum', field, alias)
+
+    def avg(self, field: str, alias: Optional[str] = None) -> "MockAggregationQuery":
+        return self._add('avg', field, alias)
+
+    def get(self) -> List[List[AggregationResult]]:
+        values = self._query._db._aggregate(self._query, self.aggregations)
+        return [[AggregationResult(alias, values[alias]) for _, _, alias in self.aggregations]]
+
+class MockQuery:
+    """Immutable, chainable query mirroring Firestore's where/order_by/limit/start_after"""
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, db: "MockDatabase", collection: str):
+        self._db = db
+        self.collection = collection
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.orders: List[Tuple[str, str]] = []
+        self.limit_count: Optional[int] = None
+        self.cursor: Optional[Dict[str, Any]] = None
+        self.projection: Optional[Tuple[str, ...]] = None
+
+    def _copy(self) -> "MockQuery":
+        query = MockQuery(self._db, self.collection)
+        query.filters = list(self.filters)
+        query.orders = list(self.orders)
+        query.limit_count = self.limit_count
+        query.cursor = self.cursor
+        query.projection = self.projection
+        return query
+
+    def where(self, field: str, operator: str, value: Any) -> "MockQuery":
+        query = self._copy()
+        query.filters.append((field, operator, value))
+        return query
+
+    def order_by(self, field: str, direction: str = ASCENDING) -> "MockQuery":
+        if direction not in (self.ASCENDING, self.DESCENDING):
+            raise ValueError(f"Unknown direction: {direction}")
+        query = self._copy()
+        query.orders.append((field, direction))
+        return query
+
+    def limit(self, count: int) -> "MockQuery":
+        query = self._copy()
+        query.limit_count = count
+        return query
+
+    def start_after(self, cursor: Dict[str, Any]) -> "MockQuery":
+        """Resume after a document (or a dict of order_by field values)"""
+        query = self._copy()
+        query.cursor = cursor
+        return query
+
+    def select(self, fields: Iterable[str]) -> "MockQuery":
+        """Return only these top-level fields (and the ID) of each result"""
+        query = self._copy()
+        query.projection = tuple(fields)
+        return query
+
+    def count(self, alias: Optional[str] = None) -> MockAggregationQuery:
+        return MockAggregationQuery(self).count(alias)
+
+    def sum(self, field: str, alias: Optional[str] = None) -> MockAggregationQuery:
+        return MockAggregationQuery(self).sum(field, alias)
+
+    def avg(self, field: str, alias: Optional[str] = None) -> MockAggregationQuery:
+        return MockAggregationQuery(self).avg(field, alias)
+
+    def stream(self) -> Iterator[Mapping[str, Any]]:
+        return iter(self._db._run_query(self))
+
+    def get(self) -> List[Mapping[str, Any]]:
+        return self._db._run_query(self)
+
+_COLLECTION_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+class MockWriteBatch:
+    """Buffers creates, updates and deletes and applies them together on commit()"""
+
+    def __init__(self, db):
+        self._db = db
+        self._ops: List[Tuple[str, str, str, Optional[Dict[str, Any]]]] = []
+
+    def create(self, collection: str, data: Dict[str, Any], doc_id: Optional[str] = None) -> str:
+        """Queue a new document and return the ID it will be stored under"""
+        if doc_id is None:
+            doc_id = self._db._new_id(collection)
+        data['id'] = doc_id
+        data['created_at'] = datetime.now().isoformat()
+        self._ops.append(('set', collection, doc_id, data))
+        return doc_id
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        data['id'] = doc_id
+        self._ops.append(('set', collection, doc_id, data))
+
+    def update(self, collection: str, doc_id: str, updates: Dict[str, Any]):
+        self._ops.append(('update', collection, doc_id, updates))
+
+    def delete(self, collection: str, doc_id: str):
+        self._ops.append(('delete', collection, doc_id, None))
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        if ops:
+            self._db._commit(ops)
 
 class MockDatabase:
-    def __init__(self):
-        self.data_file = "mock_data.json"
-        self.data = self._load_data()
-    
-    def _load_data(self) -> Dict[str, Any]:
+    """JSON-file document store used when Firebase is not configured.
+
+    Reads return read-only views of the stored documents (use thaw() for a
+    mutable copy); writes replace documents instead of mutating them.
+
+    The store is single-process: the data is loaded into memory once and
+    journals and shards are written without file locks, so a second process
+    (another worker, or a maintenance command run while the server is up)
+    overwrites the other's writes. Use DB_BACKEND=sqlite for that.
+    """
+
+    def __init__(self, data_file: str = "mock_data.json", journal: Optional[bool] = None,
+                 indexes: Optional[Dict[str, Dict[str, str]]] = None):
+        self.data_file = data_file
+        # Each collection lives in its own shard (<storage_dir>/<name>.json plus
+        # <name>.journal) and is only loaded the first time it is touched.
+        self.storage_dir = os.path.splitext(data_file)[0]
+        # Journaled mode appends one compact record per mutation instead of
+        # rewriting the whole shard; set MOCK_DB_JOURNAL=0 to disable.
+        if journal is None:
+            journal = os.getenv("MOCK_DB_JOURNAL", "1") != "0"
+        self.journal = journal
+        self.fsync = os.getenv("MOCK_DB_FSYNC", "0") == "1"
+        self._journal_fhs: Dict[str, Any] = {}
+        # Loaded shards only
+        self.data: Dict[str, Dict[str, Any]] = {}
+        self.index_specs: Dict[str, Dict[str, str]] = {
+            collection: dict(fields) for collection, fields in (DEFAULT_INDEXES if indexes is None else indexes).items()
+        }
+        self.indexes: Dict[str, Dict[str, FieldIndex]] = {}
+        # Guards in-memory state and journal appends; compaction only holds it
+        # long enough to rotate a journal, never while writing a snapshot
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._journal_counts: Dict[str, int] = {}
+        self._compactor: Optional[threading.Thread] = None
+        self._compactor_stop = threading.Event()
+        self._migrate_legacy_file()
+
+    def _migrate_legacy_file(self):
+        """Split a single-file mock_data.json (and its journal) into shards once"""
+        if os.path.isdir(self.storage_dir):
+            return
+        legacy: Dict[str, Any] = {}
         if os.path.exists(self.data_file):
             try:
                 with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    legacy = json.load(f)
             except:
                 pass
-        return {
-            "classes": {},
-            "users": {},
-            "assignments": {},
-            "submissions": {}
-        }
-    
-    def _save_data(self):
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2, default=str)
-    
+        os.makedirs(self.storage_dir, exist_ok=True)
+        legacy_journal = self.storage_dir + ".journal"
+        for record in self._read_journal(legacy_journal):
+            self._apply_record(legacy.setdefault(record['c'], {}), record)
+        for collection, docs in legacy.items():
+            self._save_shard(collection, docs)
+        if os.path.exists(legacy_journal):
+            os.remove(legacy_journal)
+
+    def _shard_path(self, collection: str) -> str:
+        if not _COLLECTION_RE.match(collection):
+            raise ValueError(f"Invalid collection name: {collection}")
+        return os.path.join(self.storage_dir, collection + ".json")
+
+    def _journal_path(self, collection: str) -> str:
+        return os.path.join(self.storage_dir, collection + ".journal")
+
+    def _rotated_journal_path(self, collection: str) -> str:
+        return self._journal_path(collection) + ".old"
+
+    def _collection(self, collection: str) -> Dict[str, Any]:
+        """Return a collection's documents, loading its shard on first access"""
+        docs = self.data.get(collection)
+        if docs is None:
+            with self._lock:
+                docs = self.data.get(collection)
+                if docs is None:
+                    docs = self._load_shard(collection)
+                    self.data[collection] = docs
+                    for field, kind in self.index_specs.get(collection, {}).items():
+                        self._build_index(collection, field, kind)
+        return docs
+
+    def _load_shard(self, collection: str) -> Dict[str, Any]:
+        docs: Dict[str, Any] = {}
+        path = self._shard_path(collection)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    docs = json.load(f)
+            except:
+                pass
+        # A journal rotated by an interrupted compaction comes first; replaying
+        # it over a snapshot that already contains it is harmless
+        pending = 0
+        for path in (self._rotated_journal_path(collection), self._journal_path(collection)):
+            for record in self._read_journal(path):
+                self._apply_record(docs, record)
+                pending += 1
+        self._journal_counts[collection] = pending
+        return {doc_id: freeze(doc_data) for doc_id, doc_data in docs.items()}
+
+    def _save_shard(self, collection: str, docs: Dict[str, Any]):
+        """Write a shard snapshot to a temp file and atomically swap it in"""
+        path = self._shard_path(collection)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(docs, f, ensure_ascii=False, indent=2, default=_json_default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_dir()
+
+    def _fsync_dir(self):
+        """Make a rename in the storage directory durable (POSIX only)"""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(self.storage_dir, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _read_journal(self, path: str) -> Iterator[Dict[str, Any]]:
+        """Yield journaled mutations in the order they were written"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A crash mid-append can leave a torn last record
+                    continue
+
+    def _apply_record(self, docs: Dict[str, Any], record: Dict[str, Any]):
+        doc_id = record['id']
+        if record['op'] == 'set':
+            docs[doc_id] = record['d']
+        elif record['op'] == 'update':
+            if doc_id in docs:
+                docs[doc_id].update(record['d'])
+        elif record['op'] == 'delete':
+            docs.pop(doc_id, None)
+
+    def declare_index(self, collection: str, field: str, kind: str = "hash"):
+        """Declare a secondary index; it is built when the collection loads"""
+        self.index_specs.setdefault(collection, {})[field] = kind
+        if collection in self.data:
+            self._build_index(collection, field, kind)
+
+    def _build_index(self, collection: str, field: str, kind: str):
+        index = FieldIndex(field, kind)
+        for doc_id, doc_data in self.data[collection].items():
+            index.add(doc_id, doc_data)
+        self.indexes.setdefault(collection, {})[field] = index
+
+    def _index_add(self, collection: str, doc_id: str, doc_data: Dict[str, Any]):
+        for index in self.indexes.get(collection, {}).values():
+            index.add(doc_id, doc_data)
+
+    def _index_remove(self, collection: str, doc_id: str):
+        for index in self.indexes.get(collection, {}).values():
+            index.remove(doc_id)
+
+    def _find_index(self, collection: str, field: str, operator: str) -> Optional[FieldIndex]:
+        index = self.indexes.get(collection, {}).get(field)
+        if index is None:
+            return None
+        if operator == "==" and index.kind == "hash":
+            return index
+        if operator == "array_contains" and index.kind == "array":
+            return index
+        return None
+
+    def _apply_op(self, op: str, collection: str, doc_id: str, data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply one mutation in memory and return its journal record"""
+        docs = self._collection(collection)
+        self._index_remove(collection, doc_id)
+        # Stored documents are frozen and replaced on write, never mutated, so
+        # views handed out earlier stay consistent snapshots
+        if op == 'set':
+            docs[doc_id] = freeze(data)
+        elif op == 'update':
+            docs[doc_id] = freeze({**docs[doc_id], **data})
+        elif op == 'delete':
+            docs.pop(doc_id, None)
+        if doc_id in docs:
+            self._index_add(collection, doc_id, docs[doc_id])
+        record = {"op": op, "c": collection, "id": doc_id}
+        if data is not None:
+            record["d"] = data
+        return record
+
+    def _write(self, collection: str, records: List[Dict[str, Any]]):
+        """Persist mutations that have already been applied in memory"""
+        if not self.journal:
+            self._save_shard(collection, self.data[collection])
+            return
+        fh = self._journal_fhs.get(collection)
+        if fh is None:
+            fh = self._journal_fhs[collection] = open(self._journal_path(collection), 'a', encoding='utf-8')
+        fh.write("".join(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=_json_default) + "\n" for record in records
+        ))
+        fh.flush()
+        if self.fsync:
+            os.fsync(fh.fileno())
+        self._journal_counts[collection] = self._journal_counts.get(collection, 0) + len(records)
+
+    def compact(self, min_records: int = 1):
+        """Fold each loaded collection's journal into a fresh shard snapshot.
+
+        The journal is rotated aside under the store lock together with a
+        snapshot of the collection; the snapshot is then written and swapped in
+        without blocking writers, and the rotated journal is dropped last.
+        """
+        with self._compact_lock:
+            for collection in list(self.data):
+                with self._lock:
+                    if self._journal_counts.get(collection, 0) < min_records:
+                        continue
+                    fh = self._journal_fhs.pop(collection, None)
+                    if fh is not None:
+                        fh.close()
+                    journal_path = self._journal_path(collection)
+                    rotated_path = self._rotated_journal_path(collection)
+                    if os.path.exists(journal_path):
+                        if os.path.exists(rotated_path):
+                            # An earlier compaction did not finish: its records may
+                            # not be in the shard yet, so keep them and add ours
+                            self._append_journal(journal_path, rotated_path)
+                        else:
+                            os.replace(journal_path, rotated_path)
+                    # Documents are frozen and replaced on write, so a shallow
+                    # copy is a consistent point-in-time snapshot
+                    snapshot = dict(self.data[collection])
+                    self._journal_counts[collection] = 0
+                self._save_shard(collection, snapshot)
+                if os.path.exists(rotated_path):
+                    os.remove(rotated_path)
+
+    def _append_journal(self, path: str, target: str):
+        """Move the records of one journal file to the end of another"""
+        with open(target, 'rb+') as out:
+            out.seek(0, os.SEEK_END)
+            if out.tell():
+                out.seek(-1, os.SEEK_END)
+                # Keep a torn last record from swallowing the first appended one
+                if out.read(1) != b"\n":
+                    out.write(b"\n")
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.remove(path)
+
+    def start_compaction_worker(self, interval: Optional[float] = None, min_records: Optional[int] = None):
+        """Compact journals periodically on a daemon thread"""
+        if not self.journal or (self._compactor is not None and self._compactor.is_alive()):
+            return
+        if interval is None:
+            interval = float(os.getenv("MOCK_DB_COMPACT_INTERVAL", "60"))
+        if min_records is None:
+            min_records = int(os.getenv("MOCK_DB_COMPACT_MIN_RECORDS", "100"))
+        if interval <= 0:
+            return
+
+        def run():
+            while not self._compactor_stop.wait(interval):
+                try:
+                    self.compact(min_records)
+                except Exception as e:
+                    print(f"Mock database compaction failed: {e}")
+
+        self._compactor_stop.clear()
+        self._compactor = threading.Thread(target=run, name="mock-db-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compaction_worker(self):
+        """Stop the compaction thread and fold any remaining journal entries"""
+        if self._compactor is not None:
+            self._compactor_stop.set()
+            self._compactor.join()
+            self._compactor = None
+        if self.journal:
+            self.compact()
+
+    def _new_id(self, collection: str) -> str:
+        return id_allocator.new_id(collection)
+
     def create_document(self, collection: str, data: Dict[str, Any]) -> str:
         """Create a new document and return its ID"""
-        if collection not in self.data:
-            self.data[collection] = {}
-        
-        doc_id = f"{collection}_{len(self.data[collection]) + 1}"
-        data['id'] = doc_id
-        data['created_at'] = datetime.now().isoformat()
-        self.data[collection][doc_id] = data
-        self._save_data()
+        with self._lock:
+            doc_id = self._new_id(collection)
+            data['id'] = doc_id
+            data['created_at'] = datetime.now().isoformat()
+            self._write(collection, [self._apply_op('set', collection, doc_id, data)])
         return doc_id
-    
-    def get_document(self, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
-        """Get a document by ID"""
-        return self.data.get(collection, {}).get(doc_id)
-    
+
+    def get_document(self, collection: str, doc_id: str) -> Optional[Mapping[str, Any]]:
+        """Get a read-only view of a document by ID"""
+        return self._collection(collection).get(doc_id)
+
+    def get_documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Mapping[str, Any]]:
+        """Get many documents by ID at once; missing IDs are left out"""
+        with self._lock:
+            docs = self._collection(collection)
+            return {doc_id: docs[doc_id] for doc_id in doc_ids if doc_id in docs}
+
     def update_document(self, collection: str, doc_id: str, updates: Dict[str, Any]) -> bool:
         """Update a document"""
-        if doc_id in self.data.get(collection, {}):
-            self.data[collection][doc_id].update(updates)
-            self._save_data()
-            return True
+        with self._lock:
+            if doc_id in self._collection(collection):
+                self._write(collection, [self._apply_op('update', collection, doc_id, updates)])
+                return True
         return False
-    
+
     def delete_document(self, collection: str, doc_id: str) -> bool:
         """Delete a document"""
-        if doc_id in self.data.get(collection, {}):
-            del self.data[collection][doc_id]
-            self._save_data()
-            return True
+        with self._lock:
+            if doc_id in self._collection(collection):
+                self._write(collection, [self._apply_op('delete', collection, doc_id, None)])
+                return True
         return False
-    
-    def query_documents(self, collection: str, field: str, operator: str, value: Any) -> List[Dict[str, Any]]:
+
+    def batch(self) -> "MockWriteBatch":
+        """Start a write batch that is applied atomically on commit()"""
+        return MockWriteBatch(self)
+
+    def create_documents(self, collection: str, docs: List[Dict[str, Any]]) -> List[str]:
+        """Create many documents with a single flush and return their IDs"""
+        batch = self.batch()
+        # One reservation for the whole block keeps the IDs in insertion order
+        doc_ids = [batch.create(collection, data, doc_id)
+                   for data, doc_id in zip(docs, id_allocator.new_ids(collection, len(docs)))]
+        batch.commit()
+        return doc_ids
+
+    def update_documents(self, collection: str, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """Update many documents (doc ID -> updates) with a single flush"""
+        batch = self.batch()
+        for doc_id, doc_updates in updates.items():
+            batch.update(collection, doc_id, doc_updates)
+        try:
+            batch.commit()
+            return True
+        except KeyError:
+            return False
+
+    def _commit(self, ops: List[Tuple[str, str, str, Optional[Dict[str, Any]]]]):
+        with self._lock:
+            # Validate everything first so a failing batch leaves no partial writes
+            exists: Dict[Tuple[str, str], bool] = {}
+            for op, collection, doc_id, _ in ops:
+                key = (collection, doc_id)
+                present = exists[key] if key in exists else doc_id in self._collection(collection)
+                if op == 'update' and not present:
+                    raise KeyError(f"No document to update: {collection}/{doc_id}")
+                exists[key] = op != 'delete'
+
+            records: Dict[str, List[Dict[str, Any]]] = {}
+            for op, collection, doc_id, data in ops:
+                records.setdefault(collection, []).append(self._apply_op(op, collection, doc_id, data))
+            # One append (or shard save) per collection touched
+            for collection, collection_records in records.items():
+                self._write(collection, collection_records)
+
+    def transact(self, fn: Callable[[Callable[[str, str], Optional[Mapping[str, Any]]]], List[Tuple[str, str, str, Optional[Dict[str, Any]]]]]):
+        """Run fn(get_document) and commit the operations it returns under the
+        store lock, so no other writer changes what fn read before its writes land"""
+        with self._lock:
+            ops = fn(self.get_document)
+            if ops:
+                self._commit(ops)
+
+    def query_documents(self, collection: str, field: str, operator: str, value: Any) -> List[Mapping[str, Any]]:
         """Query documents by field"""
-        results = []
-        for doc_id, doc_data in self.data.get(collection, {}).items():
-            if field in doc_data:
-                if operator == "==" and doc_data[field] == value:
-                    results.append(doc_data)
-                elif operator == "array_contains" and value in doc_data.get(field, []):
-                    results.append(doc_data)
-        return results
-    
-    def get_all_documents(self, collection: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            docs = self._collection(collection)
+            index = self._find_index(collection, field, operator)
+            if index is not None:
+                return [docs[doc_id] for doc_id in index.lookup(value)]
+
+            results = []
+            for doc_id, doc_data in docs.items():
+                if field in doc_data:
+                    if operator == "==" and doc_data[field] == value:
+                        results.append(doc_data)
+                    elif operator == "array_contains" and value in doc_data.get(field, []):
+                        results.append(doc_data)
+            return results
+
+    def get_all_documents(self, collection: str) -> List[Mapping[str, Any]]:
         """Get all documents in a collection"""
-        return list(self.data.get(collection, {}).values())
+        with self._lock:
+            return list(self._collection(collection).values())
+
+    def query(self, collection: str) -> MockQuery:
+        """Start a chainable query on a collection"""
+        return MockQuery(self, collection)
+
+    def _candidate_ids(self, query: MockQuery) -> Optional[List[str]]:
+        """Pick the smallest ID set any indexed predicate can provide"""
+        best = None
+        for field, operator, value in query.filters:
+            if operator in ("==", "array_contains"):
+                index = self._find_index(query.collection, field, operator)
+                ids = index.lookup(value) if index else None
+            elif operator in ("in", "array_contains_any"):
+                index = self._find_index(query.collection, field,
+                                         "==" if operator == "in" else "array_contains")
+                ids = list(dict.fromkeys(i for v in value for i in index.lookup(v))) if index else None
+            else:
+                ids = None
+            if ids is not None and (best is None or len(ids) < len(best)):
+                best = ids
+        return best
+
+    def _run_query(self, query: MockQuery) -> List[Mapping[str, Any]]:
+        # Filter under the lock; documents are immutable, so sorting the
+        # matches can happen after it is released
+        with self._lock:
+            docs = self._collection(query.collection)
+            ids = self._candidate_ids(query)
+            candidates = docs.values() if ids is None else (docs[i] for i in ids if i in docs)
+
+            results = []
+            for doc_data in candidates:
+                if all(_matches(doc_data, f, op, v) for f, op, v in query.filters):
+                    # Like Firestore, ordering on a field excludes documents without it
+                    if all(field in doc_data for field, _ in query.orders):
+                        results.append(doc_data)
+                        if (not query.orders and query.cursor is None
+                                and query.limit_count is not None and len(results) >= query.limit_count):
+                            break
+
+        if query.orders or query.cursor is not None:
+            def keys(doc_data):
+                values = [_sort_key(doc_data.get(field)) for field, _ in query.orders]
+                return values + [_sort_key(doc_data.get('id'))]
+
+            def compare(a, b):
+                directions = [d for _, d in query.orders] + [MockQuery.ASCENDING]
+                for left, right, direction in zip(a, b, directions):
+                    if left != right:
+                        result = -1 if left < right else 1
+                        return -result if direction == MockQuery.DESCENDING else result
+                return 0
+
+            keyed = sorted(((keys(d), d) for d in results), key=cmp_to_key(lambda x, y: compare(x[0], y[0])))
+            if query.cursor is not None:
+                cursor_keys = keys(query.cursor)
+                if 'id' not in query.cursor:
+                    # Bare field values: skip every document that ties on them
+                    cursor_keys[-1] = (float('inf'),)
+                keyed = [item for item in keyed if compare(item[0], cursor_keys) > 0]
+            results = [d for _, d in keyed]
+
+        if query.limit_count is not None:
+            results = results[:query.limit_count]
+        if query.projection is not None:
+            results = [project(doc_data, query.projection) for doc_data in results]
+        return results
+
+    def _aggregate(self, query: MockQuery, aggregations: Iterable[Tuple[str, Optional[str], str]]) -> Dict[str, Any]:
+        aggregations = list(aggregations)
+        with self._lock:
+            docs = self._collection(query.collection)
+            ids = self._candidate_ids(query)
+            if ids is not None and len(query.filters) == 1 and all(kind == 'count' for kind, _, _ in aggregations):
+                # The index entry is exactly the match set: count without touching documents
+                count = sum(1 for i in ids if i in docs)
+                return {alias: count for _, _, alias in aggregations}
+            candidates = docs.values() if ids is None else (docs[i] for i in ids if i in docs)
+            matches = (d for d in candidates if all(_matches(d, f, op, v) for f, op, v in query.filters))
+            return accumulate(matches, aggregations)
 
 # Global instance
 mock_db = MockDatabase()
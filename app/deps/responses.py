@@ -0,0 +1,17 @@
+from typing import Any
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+_serializer = TypeAdapter(Any)
+
+class ModelResponse(Response):
+    """JSON response for models built from trusted storage data.
+
+    Returning it from an endpoint skips FastAPI's response_model validation
+    (the route's response_model still documents the shape), and pydantic-core
+    serializes the models straight to bytes.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _serializer.dump_json(content)
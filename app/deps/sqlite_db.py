@@ -0,0 +1,377 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, List, Optional, Any, Iterable, Mapping, Tuple
+from datetime import datetime
+
+from .mock_db import DEFAULT_INDEXES, MockQuery, MockWriteBatch
+from .ids import id_allocator
+
+_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$')
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+def _view(text: str) -> Mapping[str, Any]:
+    """Decode a stored document as a read-only view, matching MockDatabase"""
+    return json.loads(text, object_hook=MappingProxyType)
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_json_default)
+
+def _param(value: Any) -> Any:
+    """Convert a Python value to what json_extract() would return for it"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, Mapping)):
+        return _dumps(value)
+    return value
+
+def _path(field: str) -> str:
+    # Field names are inlined so the expression indexes below can match
+    if not _FIELD_RE.match(field):
+        raise ValueError(f"Unsupported field path: {field}")
+    return f"'$.{field}'"
+
+class SQLiteDatabase:
+    """Document store with the MockDatabase interface, kept in SQLite.
+
+    Every uvicorn worker opens the same file; WAL mode gives concurrent
+    readers alongside a single writer, and writes touch one row instead of
+    rewriting the dataset.
+    """
+
+    def __init__(self, path: str = "mock_data.sqlite3", seed_file: Optional[str] = "mock_data.json",
+                 indexes: Optional[Dict[str, Dict[str, str]]] = None):
+        self.path = path
+        self.indexes = DEFAULT_INDEXES if indexes is None else indexes
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " collection TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " data TEXT NOT NULL,"
+                " PRIMARY KEY (collection, id))"
+            )
+            # Inverted index for array_contains on declared list fields
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS array_entries ("
+                " collection TEXT NOT NULL,"
+                " field TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " id TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_array_entries ON array_entries (collection, field, value)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_array_entries_doc ON array_entries (collection, id)")
+            for field in sorted({f for fields in self.indexes.values() for f, kind in fields.items() if kind == "hash"}):
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_doc_{field.replace('.', '_')} "
+                    f"ON documents (collection, json_extract(data, {_path(field)}))"
+                )
+        if seed_file and os.path.exists(seed_file):
+            self._seed(seed_file)
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        return _Transaction(conn)
+
+    def _seed(self, seed_file: str):
+        """Import the JSON snapshot the first time the database is created"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone():
+                return
+            try:
+                with open(seed_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except ValueError:
+                return
+            for collection, docs in snapshot.items():
+                for doc_id, data in docs.items():
+                    self._put(conn, collection, doc_id, data)
+
+    def _array_fields(self, collection: str) -> List[str]:
+        return [f for f, kind in self.indexes.get(collection, {}).items() if kind == "array"]
+
+    def _put(self, conn: sqlite3.Connection, collection: str, doc_id: str, data: Dict[str, Any]):
+        conn.execute(
+            "INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+            (collection, doc_id, _dumps(data))
+        )
+        conn.execute("DELETE FROM array_entries WHERE collection = ? AND id = ?", (collection, doc_id))
+        for field in self._array_fields(collection):
+            values = data.get(field)
+            if isinstance(values, (list, tuple)):
+                conn.executemany(
+                    "INSERT INTO array_entries (collection, field, value, id) VALUES (?, ?, ?, ?)",
+                    [(collection, field, value, doc_id) for value in dict.fromkeys(_dumps(v) for v in values)]
+                )
+
+    def _load(self, conn: sqlite3.Connection, collection: str, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            "SELECT data FROM documents WHERE collection = ? AND id = ?", (collection, doc_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _new_id(self, collection: str) -> str:
+        return id_allocator.new_id(collection)
+
+    def create_document(self, collection: str, data: Dict[str, Any]) -> str:
+        """Create a new document and return its ID"""
+        with self._transaction() as conn:
+            doc_id = self._new_id(collection)
+            data['id'] = doc_id
+            data['created_at'] = datetime.now().isoformat()
+            self._put(conn, collection, doc_id, data)
+        return doc_id
+
+    def get_document(self, collection: str, doc_id: str) -> Optional[Mapping[str, Any]]:
+        """Get a read-only view of a document by ID"""
+        row = self._conn().execute(
+            "SELECT data FROM documents WHERE collection = ? AND id = ?", (collection, doc_id)
+        ).fetchone()
+        return _view(row[0]) if row else None
+
+    def get_documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Mapping[str, Any]]:
+        """Get many documents by ID in one query per 500 IDs; missing IDs are left out"""
+        found: Dict[str, Mapping[str, Any]] = {}
+        doc_ids = list(dict.fromkeys(doc_ids))
+        for start in range(0, len(doc_ids), 500):
+            chunk = doc_ids[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                (collection, *chunk)
+            )
+            for doc_id, text in rows:
+                found[doc_id] = _view(text)
+        return found
+
+    def update_document(self, collection: str, doc_id: str, updates: Dict[str, Any]) -> bool:
+        """Update a document"""
+        with self._transaction() as conn:
+            data = self._load(conn, collection, doc_id)
+            if data is None:
+                return False
+            data.update(updates)
+            self._put(conn, collection, doc_id, data)
+        return True
+
+    def delete_document(self, collection: str, doc_id: str) -> bool:
+        """Delete a document"""
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM documents WHERE collection = ? AND id = ?", (collection, doc_id)
+            ).rowcount
+            conn.execute("DELETE FROM array_entries WHERE collection = ? AND id = ?", (collection, doc_id))
+        return deleted > 0
+
+    def batch(self) -> MockWriteBatch:
+        """Start a write batch that is applied in one transaction on commit()"""
+        return MockWriteBatch(self)
+
+    def create_documents(self, collection: str, docs: List[Dict[str, Any]]) -> List[str]:
+        """Create many documents in one transaction and return their IDs"""
+        batch = self.batch()
+        doc_ids = [batch.create(collection, data, doc_id)
+                   for data, doc_id in zip(docs, id_allocator.new_ids(collection, len(docs)))]
+        batch.commit()
+        return doc_ids
+
+    def update_documents(self, collection: str, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """Update many documents (doc ID -> updates) in one transaction"""
+        batch = self.batch()
+        for doc_id, doc_updates in updates.items():
+            batch.update(collection, doc_id, doc_updates)
+        try:
+            batch.commit()
+            return True
+        except KeyError:
+            return False
+
+    def _commit(self, ops: List[Tuple[str, str, str, Optional[Dict[str, Any]]]]):
+        with self._transaction() as conn:
+            for op, collection, doc_id, data in ops:
+                if op == 'set':
+                    self._put(conn, collection, doc_id, data)
+                elif op == 'update':
+                    current = self._load(conn, collection, doc_id)
+                    if current is None:
+                        # Raising inside the transaction rolls back the whole batch
+                        raise KeyError(f"No document to update: {collection}/{doc_id}")
+                    current.update(data)
+                    self._put(conn, collection, doc_id, current)
+                elif op == 'delete':
+                    conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?", (collection, doc_id))
+                    conn.execute("DELETE FROM array_entries WHERE collection = ? AND id = ?", (collection, doc_id))
+
+    def transact(self, fn: Callable[[Callable[[str, str], Optional[Mapping[str, Any]]]], List[Tuple[str, str, str, Optional[Dict[str, Any]]]]]):
+        """Run fn(get_document) and commit the operations it returns in one
+        BEGIN IMMEDIATE transaction, so no other writer (thread or process)
+        changes what fn read before its writes land"""
+        with self._transaction():
+            ops = fn(self.get_document)
+            if ops:
+                self._commit(ops)
+
+    def query_documents(self, collection: str, field: str, operator: str, value: Any) -> List[Mapping[str, Any]]:
+        """Query documents by field"""
+        return self.query(collection).where(field, operator, value).get()
+
+    def get_all_documents(self, collection: str) -> List[Mapping[str, Any]]:
+        """Get all documents in a collection"""
+        rows = self._conn().execute("SELECT data FROM documents WHERE collection = ?", (collection,))
+        return [_view(row[0]) for row in rows]
+
+    def query(self, collection: str) -> MockQuery:
+        """Start a chainable query on a collection"""
+        return MockQuery(self, collection)
+
+    def _predicate(self, collection: str, field: str, operator: str, value: Any) -> Tuple[str, List[Any]]:
+        expr = f"json_extract(data, {_path(field)})"
+        exists = f"json_type(data, {_path(field)}) IS NOT NULL"
+        if operator in ("array_contains", "array_contains_any"):
+            values = [value] if operator == "array_contains" else list(value)
+            if not values:
+                return "0", []
+            marks = ", ".join("?" for _ in values)
+            if field in self._array_fields(collection):
+                return (f"id IN (SELECT id FROM array_entries WHERE collection = ? AND field = ? AND value IN ({marks}))",
+                        [collection, field] + [_dumps(v) for v in values])
+            return (f"EXISTS (SELECT 1 FROM json_each(data, {_path(field)}) WHERE json_each.value IN ({marks}))",
+                    [_param(v) for v in values])
+        if operator in ("in", "not-in"):
+            values = list(value)
+            if not values:
+                return ("0", []) if operator == "in" else (exists, [])
+            marks = ", ".join("?" for _ in values)
+            keyword = "IN" if operator == "in" else "NOT IN"
+            return f"{exists} AND {expr} {keyword} ({marks})", [_param(v) for v in values]
+        if value is None and operator in ("==", "!="):
+            null_check = "=" if operator == "==" else "!="
+            return f"{exists} AND json_type(data, {_path(field)}) {null_check} 'null'", []
+        if operator in ("==", "!=", "<", "<=", ">", ">="):
+            sql_operator = "=" if operator == "==" else operator
+            return f"{exists} AND {expr} {sql_operator} ?", [_param(value)]
+        raise ValueError(f"Unsupported operator: {operator}")
+
+    def _filter_clauses(self, query: MockQuery) -> Tuple[List[str], List[Any]]:
+        clauses = ["collection = ?"]
+        params: List[Any] = [query.collection]
+        for field, operator, value in query.filters:
+            clause, clause_params = self._predicate(query.collection, field, operator, value)
+            clauses.append(clause)
+            params.extend(clause_params)
+        return clauses, params
+
+    def _run_query(self, query: MockQuery) -> List[Mapping[str, Any]]:
+        clauses, params = self._filter_clauses(query)
+
+        # Ordering on a field excludes documents without it, as in Firestore
+        orders = [(f"json_extract(data, {_path(field)})", direction) for field, direction in query.orders]
+        for field, _ in query.orders:
+            clauses.append(f"json_type(data, {_path(field)}) IS NOT NULL")
+        order_terms = orders + [("id", MockQuery.ASCENDING)]
+
+        if query.cursor is not None:
+            cursor_values = [_param(query.cursor.get(field)) for field, _ in query.orders]
+            terms = order_terms
+            if 'id' in query.cursor:
+                cursor_values.append(query.cursor['id'])
+            else:
+                # Bare field values: skip every document that ties on them
+                terms = orders
+            alternatives = []
+            for i, (expr, direction) in enumerate(terms):
+                equal = [f"{e} = ?" for e, _ in terms[:i]]
+                comparison = "<" if direction == MockQuery.DESCENDING else ">"
+                alternatives.append("(" + " AND ".join(equal + [f"{expr} {comparison} ?"]) + ")")
+                params.extend(cursor_values[:i] + [cursor_values[i]])
+            if alternatives:
+                clauses.append("(" + " OR ".join(alternatives) + ")")
+
+        if query.projection is None:
+            columns = "data"
+        else:
+            # Pull only the selected fields out of the stored JSON; '->'
+            # yields NULL for a missing field and 'null' for a JSON null
+            fields = [f for f in dict.fromkeys(query.projection) if f != 'id']
+            columns = ", ".join(["id"] + [f"data -> {_path(f)}" for f in fields])
+        sql = f"SELECT {columns} FROM documents WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY " + ", ".join(
+            f"{expr} {'DESC' if direction == MockQuery.DESCENDING else 'ASC'}" for expr, direction in order_terms
+        )
+        if query.limit_count is not None:
+            sql += " LIMIT ?"
+            params.append(query.limit_count)
+        rows = self._conn().execute(sql, params)
+        if query.projection is None:
+            return [_view(row[0]) for row in rows]
+        return [
+            MappingProxyType({'id': row[0], **{
+                field: _view(value) for field, value in zip(fields, row[1:]) if value is not None
+            }})
+            for row in rows
+        ]
+
+    def _aggregate(self, query: MockQuery, aggregations: Iterable[Tuple[str, Optional[str], str]]) -> Dict[str, Any]:
+        aggregations = list(aggregations)
+        clauses, params = self._filter_clauses(query)
+        columns = []
+        for kind, field, _ in aggregations:
+            if kind == 'count':
+                columns.append("COUNT(*)")
+            else:
+                # Like Firestore, only numeric values are summed or averaged
+                columns.append(f"{kind.upper()}(CASE WHEN json_type(data, {_path(field)}) IN ('integer', 'real') "
+                               f"THEN json_extract(data, {_path(field)}) END)")
+        row = self._conn().execute(
+            f"SELECT {', '.join(columns)} FROM documents WHERE " + " AND ".join(clauses), params
+        ).fetchone()
+        return {
+            alias: 0 if kind == 'sum' and value is None else value
+            for (kind, _, alias), value in zip(aggregations, row)
+        }
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT so read-modify-write updates are serialized across processes.
+    Nested on the same connection, it joins the outer transaction."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.outer = False
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.outer = not self.conn.in_transaction
+        if self.outer:
+            self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.outer:
+            return False
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+# Global instance
+sqlite_db = SQLiteDatabase(os.getenv("SQLITE_DB_PATH", "mock_data.sqlite3"))
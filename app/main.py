@@ -5,7 +5,8 @@ from fastapi.responses import HTMLResponse
 import os
 from pathlib import Path
 
-from .deps.firebase import initialize_firebase
+from .deps.firebase import initialize_firebase, get_db
+from .deps.executor import shutdown_executor
 from .routers import auth, teacher, student, analytics, games
 
 # Initialize Firebase (optional for development)
@@ -36,6 +37,20 @@ app.include_router(student.router, prefix="/api/student", tags=["student"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
 app.include_router(games.router, prefix="/api/games", tags=["games"])
 
+@app.on_event("startup")
+async def start_background_jobs():
+    # Compact the local mock store's change log off the request path
+    db = get_db()
+    if hasattr(db, 'start_compaction_worker'):
+        db.start_compaction_worker()
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    db = get_db()
+    shutdown_executor()
+    if hasattr(db, 'stop_compaction_worker'):
+        db.stop_compaction_worker()
+
 
 # HTML routes
 @app.get("/", response_class=HTMLResponse)
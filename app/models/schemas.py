@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any, Literal
+from typing import List, Optional, Dict, Any, Literal, Generic, TypeVar
 from datetime import datetime
 
+T = TypeVar("T")
+
 class UserProfile(BaseModel):
     uid: str
     role: Literal["teacher", "student", "guardian"]
@@ -125,12 +127,16 @@ class Class(BaseModel):
     teacher_uid: str
     grade: int
     student_uids: List[str] = []
+    student_count: int = 0
     created_at: datetime
 
 class CreateClassRequest(BaseModel):
     name: str
     grade: int
 
+class ClassMembershipRequest(BaseModel):
+    student_uids: List[str]
+
 class QuestionSchema(BaseModel):
     type: Literal["mcq", "numeric", "short", "checkbox"]
     options: Optional[List[str]] = None
@@ -151,6 +157,17 @@ class Assignment(BaseModel):
     results_visible_to_students: bool = True
     created_at: datetime
 
+class AssignmentSummary(BaseModel):
+    id: str
+    title: str
+    class_id: str
+    teacher_uid: str
+    type: Literal["homework", "quiz"]
+    question_count: int
+    due_at: Optional[datetime] = None
+    results_visible_to_students: bool = True
+    created_at: datetime
+
 class CreateAssignmentRequest(BaseModel):
     title: str
     class_id: str
@@ -165,6 +182,7 @@ class Submission(BaseModel):
     assn_id: str
     student_uid: str
     answers: Dict[str, Any] = {}
+    question_scores: Dict[str, float] = {}  # soru ID -> puan (teslimde hesaplanır)
     score: Optional[float] = None
     max_score: float
     started_at: Optional[datetime] = None
@@ -172,6 +190,24 @@ class Submission(BaseModel):
     feedback: Optional[str] = None
     visible_to_student: bool = True
 
+class AssignmentRollup(BaseModel):
+    id: str  # assignment ID
+    submitted: int = 0
+    graded: int = 0
+    score_sum: float = 0
+    score_sumsq: float = 0
+    histogram: Dict[str, int] = {}  # puan yüzdesi dilimi (0-9) -> teslim sayısı
+
+class ProgressBucket(BaseModel):
+    id: str
+    student_uid: str
+    period: Literal["day", "week"]
+    start: str  # günün ya da haftanın (pazartesi) tarihi, YYYY-MM-DD
+    count: int = 0
+    percentage_sum: float = 0
+    percentage_max: Optional[float] = None
+    scores: Dict[str, float] = {}  # teslim ID -> yüzde; sayı, toplam ve en yüksek bundan hesaplanır
+
 class SubmitAnswersRequest(BaseModel):
     answers: Dict[str, Any]
     submit: bool = False
@@ -186,7 +222,11 @@ class GameResult(BaseModel):
 
 class AnalyticsData(BaseModel):
     student_uid: str
-    scores_over_time: List[Dict[str, Any]]
+    scores_over_time: Dict[str, Dict[str, Any]]  # "7d", "30d", "90d" -> pencere özeti ve kovaları
     topic_mastery: Dict[str, float]
     completion_rate: float
-    average_score: float
\ No newline at end of file
+    average_score: float
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
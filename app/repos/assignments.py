@@ -1,22 +1,107 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from google.cloud import firestore
-from ..models.schemas import Assignment, CreateAssignmentRequest, Submission, SubmitAnswersRequest
-from ..deps.firebase import get_db
-from datetime import datetime
+from ..models.schemas import (
+    Assignment, AssignmentRollup, AssignmentSummary, CreateAssignmentRequest, Page, ProgressBucket, Submission,
+    SubmitAnswersRequest
+)
+from ..deps.firestore_fake import get_fake_firestore
+from .base import BaseRepository, aggregate, invalidates, offload, run_transaction
+from .decoding import assignment_codec, assignment_summary_codec, parse_timestamp, progress_codec, rollup_codec, submission_codec
+from .pagination import DEFAULT_PAGE_SIZE, fetch_page
+from datetime import date, datetime, timedelta, timezone
 
-class AssignmentsRepository:
-    def __init__(self):
-        self.db = get_db()
+# Fields list views need; answer keys and question files stay on the server
+SUMMARY_FIELDS = tuple(field for field in AssignmentSummary.model_fields if field != 'id')
+
+# Progress bucket fields the analytics read
+PROGRESS_FIELDS = ("student_uid", "period", "start", "count", "percentage_sum", "percentage_max")
+
+# Rollup score histogram: deciles of the score percentage, 100% in the last one
+HISTOGRAM_BUCKETS = 10
+
+def submission_doc_id(assignment_id: str, student_uid: str) -> str:
+    """Document ID of a student's submission: one per assignment and student"""
+    return f"{assignment_id}__{student_uid}"
+
+def rollup_contribution(submitted: bool, score: Optional[float], max_score: Optional[float]) -> Dict[str, float]:
+    """What one submission adds to its assignment's rollup"""
+    contribution = {"submitted": 1 if submitted else 0}
+    if score is not None:
+        percentage = score / max_score if max_score else 0
+        bucket = max(0, min(int(percentage * HISTOGRAM_BUCKETS), HISTOGRAM_BUCKETS - 1))
+        contribution.update({
+            "graded": 1,
+            "score_sum": score,
+            "score_sumsq": score * score,
+            f"histogram.{bucket}": 1
+        })
+    return contribution
+
+def _submission_contribution(data: Dict[str, Any]) -> Dict[str, float]:
+    return rollup_contribution(data.get("submitted_at") is not None, data.get("score"), data.get("max_score"))
+
+def _rollup_change(changes: Dict[str, Dict[str, float]], assignment_id: str,
+                   before: Dict[str, float], after: Dict[str, float]):
+    """Accumulate the move of one submission from contribution before to after"""
+    change = changes.setdefault(assignment_id, {})
+    for key in set(before) | set(after):
+        change[key] = change.get(key, 0) + after.get(key, 0) - before.get(key, 0)
+
+def progress_bucket_starts(submitted_at: Any) -> Dict[str, str]:
+    """Day and week (starting Monday) buckets of a submission time, as UTC dates"""
+    moment = parse_timestamp(submitted_at)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    day = moment.date()
+    return {"day": day.isoformat(), "week": (day - timedelta(days=day.weekday())).isoformat()}
+
+def progress_bucket_id(student_uid: str, period: str, start: str) -> str:
+    return f"{student_uid}__{period}__{start}"
+
+def progress_change(changes: Dict[Tuple[str, str, str], Dict[str, Optional[float]]], student_uid: str,
+                    submission_id: str, submitted_at: Any, score: Optional[float], max_score: Optional[float],
+                    sign: int):
+    """Accumulate adding (sign=1) or removing (sign=-1) one scored submission in its
+    progress buckets, as submission ID -> percentage (None to remove); later calls win"""
+    if submitted_at is None or score is None:
+        return
+    percentage = score / max_score * 100 if max_score else 0
+    for period, start in progress_bucket_starts(submitted_at).items():
+        changes.setdefault((student_uid, period, start), {})[submission_id] = percentage if sign > 0 else None
+
+def progress_bucket(student_uid: str, period: str, start: str, scores: Dict[str, float]) -> Dict[str, Any]:
+    """Bucket document: the percentages of its submissions by submission ID, and the
+    count, sum and max derived from them"""
+    return {
+        "student_uid": student_uid,
+        "period": period,
+        "start": start,
+        "scores": scores,
+        "count": len(scores),
+        "percentage_sum": sum(scores.values()),
+        "percentage_max": max(scores.values(), default=None)
+    }
+
+class AssignmentsRepository(BaseRepository):
+    def __init__(self, db=None):
+        super().__init__(db)
         # Check if using mock database
         if hasattr(self.db, 'create_document'):
-            # Mock database
+            # Mock database - submissions, rollups and assignment updates go through the
+            # in-process Firestore fake over the same store
             self.collection = None
+            self.firestore = get_fake_firestore(self.db)
         else:
             # Firebase
-            self.assignments_collection = self.db.collection('assignments')
-            self.submissions_collection = self.db.collection('submissions')
+            self.firestore = self.db
+        self.assignments_collection = self.firestore.collection('assignments')
+        self.submissions_collection = self.firestore.collection('submissions')
+        self.rollups_collection = self.firestore.collection('assignment_rollups')
+        self.progress_collection = self.firestore.collection('progress_buckets')
     
-    async def create_assignment(self, assignment_data: CreateAssignmentRequest, teacher_uid: str) -> str:
+    @offload
+    @invalidates('assignments')
+    def create_assignment(self, assignment_data: CreateAssignmentRequest, teacher_uid: str) -> str:
         """Create a new assignment"""
         assignment_doc = {
             "title": assignment_data.title,
@@ -25,7 +110,7 @@ class AssignmentsRepository:
             "type": assignment_data.type,
             "question_files": [],
             "question_count": assignment_data.question_count,
-            "answer_schema": assignment_data.answer_schema.dict(),
+            "answer_schema": {qid: q.dict() for qid, q in assignment_data.answer_schema.items()},
             "due_at": assignment_data.due_at,
             "results_visible_to_students": assignment_data.results_visible_to_students,
             "created_at": datetime.now().isoformat()
@@ -41,37 +126,37 @@ class AssignmentsRepository:
             doc_ref.set(assignment_doc)
             return doc_ref.id
     
-    async def get_assignment(self, assignment_id: str) -> Optional[Assignment]:
+    @offload
+    def get_assignment(self, assignment_id: str) -> Optional[Assignment]:
         """Get assignment by ID"""
+        return self._cached('assignments', assignment_id, lambda: self._fetch_assignment(assignment_id))
+    
+    def _fetch_assignment(self, assignment_id: str) -> Optional[Assignment]:
         if hasattr(self.db, 'get_document'):
             # Mock database
             data = self.db.get_document('assignments', assignment_id)
             if data:
-                data['id'] = assignment_id
-                return Assignment(**data)
+                return assignment_codec.decode(data, assignment_id)
             return None
         else:
             # Firebase
             doc = self.assignments_collection.document(assignment_id).get()
             if doc.exists:
-                data = doc.to_dict()
-                data['id'] = assignment_id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                if 'due_at' in data and data['due_at']:
-                    data['due_at'] = data['due_at'].replace(tzinfo=None)
-                return Assignment(**data)
+                return assignment_codec.from_snapshot(doc)
             return None
     
-    async def get_class_assignments(self, class_id: str) -> List[Assignment]:
+    @offload
+    def get_class_assignments(self, class_id: str) -> List[Assignment]:
         """Get all assignments for a class"""
+        return self._cached('assignments', ('class', class_id), lambda: self._fetch_class_assignments(class_id))
+    
+    def _fetch_class_assignments(self, class_id: str) -> List[Assignment]:
         if hasattr(self.db, 'query_documents'):
             # Mock database
             assignments_data = self.db.query_documents('assignments', 'class_id', '==', class_id)
             assignments = []
             for data in assignments_data:
-                data['id'] = data.get('id', '')
-                assignments.append(Assignment(**data))
+                assignments.append(assignment_codec.decode(data))
             return assignments
         else:
             # Firebase
@@ -79,43 +164,80 @@ class AssignmentsRepository:
             assignments = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                if 'due_at' in data and data['due_at']:
-                    data['due_at'] = data['due_at'].replace(tzinfo=None)
-                assignments.append(Assignment(**data))
+                assignments.append(assignment_codec.from_snapshot(doc))
             
             return assignments
     
-    async def get_teacher_assignments(self, teacher_uid: str) -> List[Assignment]:
-        """Get all assignments for a teacher"""
+    @offload
+    def get_class_assignment_summaries(self, class_id: str) -> List[AssignmentSummary]:
+        """Get list-view fields of all assignments for a class"""
+        return self._cached('assignments', ('class_summaries', class_id),
+                            lambda: self._fetch_class_assignment_summaries(class_id))
+    
+    def _fetch_class_assignment_summaries(self, class_id: str) -> List[AssignmentSummary]:
         if hasattr(self.db, 'query_documents'):
             # Mock database
-            assignments_data = self.db.query_documents('assignments', 'teacher_uid', '==', teacher_uid)
-            assignments = []
-            for data in assignments_data:
-                data['id'] = data.get('id', '')
-                assignments.append(Assignment(**data))
-            return assignments
+            query = self.db.query('assignments').where("class_id", "==", class_id).select(SUMMARY_FIELDS)
+            return [assignment_summary_codec.decode(data) for data in query.stream()]
         else:
             # Firebase
-            query = self.assignments_collection.where("teacher_uid", "==", teacher_uid)
-            assignments = []
+            query = self.assignments_collection.where("class_id", "==", class_id).select(SUMMARY_FIELDS)
+            summaries = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                if 'due_at' in data and data['due_at']:
-                    data['due_at'] = data['due_at'].replace(tzinfo=None)
-                assignments.append(Assignment(**data))
+                summaries.append(assignment_summary_codec.from_snapshot(doc))
             
-            return assignments
+            return summaries
+    
+    @offload
+    def get_assignment_summaries_in_classes(self, class_ids: List[str]) -> List[AssignmentSummary]:
+        """Get list-view fields of the assignments of up to IN_QUERY_LIMIT classes with one query"""
+        return self._cached('assignments', ('classes_summaries', tuple(class_ids)),
+                            lambda: self._fetch_assignment_summaries_in_classes(class_ids))
     
-    async def update_assignment(self, assignment_id: str, updates: dict) -> bool:
+    def _fetch_assignment_summaries_in_classes(self, class_ids: List[str]) -> List[AssignmentSummary]:
+        if not class_ids:
+            return []
+        if hasattr(self.db, 'query_documents'):
+            # Mock database
+            query = self.db.query('assignments').where("class_id", "in", class_ids).select(SUMMARY_FIELDS)
+            return [assignment_summary_codec.decode(data) for data in query.stream()]
+        else:
+            # Firebase
+            query = self.assignments_collection.where("class_id", "in", class_ids).select(SUMMARY_FIELDS)
+            return [assignment_summary_codec.from_snapshot(doc) for doc in query.stream()]
+    
+    @offload
+    def get_teacher_assignments(self, teacher_uid: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Page[AssignmentSummary]:
+        """Get one page of list-view fields of a teacher's assignments, newest first"""
+        if cursor or limit != DEFAULT_PAGE_SIZE:
+            # Only the first page is read often enough to cache; caching every
+            # cursor and limit would push the hot entries out of the LRU
+            return self._fetch_teacher_assignments(teacher_uid, limit, cursor)
+        return self._cached('assignments', ('teacher', teacher_uid),
+                            lambda: self._fetch_teacher_assignments(teacher_uid, limit, cursor))
+    
+    def _fetch_teacher_assignments(self, teacher_uid: str, limit: int, cursor: Optional[str]) -> Page[AssignmentSummary]:
+        if hasattr(self.db, 'query_documents'):
+            # Mock database
+            query = self.db.query('assignments').where("teacher_uid", "==", teacher_uid).select(SUMMARY_FIELDS)
+            results, next_cursor = fetch_page(query, limit, cursor, "created_at", firestore.Query.DESCENDING)
+            assignments = [assignment_summary_codec.decode(data) for data in results]
+            return Page(items=assignments, next_cursor=next_cursor)
+        else:
+            # Firebase
+            query = self.assignments_collection.where("teacher_uid", "==", teacher_uid).select(SUMMARY_FIELDS)
+            results, next_cursor = fetch_page(query, limit, cursor, "created_at", firestore.Query.DESCENDING)
+            assignments = []
+            
+            for doc in results:
+                assignments.append(assignment_summary_codec.from_snapshot(doc))
+            
+            return Page(items=assignments, next_cursor=next_cursor)
+    
+    @offload
+    @invalidates('assignments')
+    def update_assignment(self, assignment_id: str, updates: dict) -> bool:
         """Update assignment document"""
         try:
             self.assignments_collection.document(assignment_id).update(updates)
@@ -123,23 +245,120 @@ class AssignmentsRepository:
         except Exception:
             return False
     
-    async def delete_assignment(self, assignment_id: str) -> bool:
+    @offload
+    @invalidates('assignments')
+    def delete_assignment(self, assignment_id: str) -> bool:
         """Delete an assignment"""
         try:
-            self.assignments_collection.document(assignment_id).delete()
+            batch = self.firestore.batch()
+            batch.delete(self.assignments_collection.document(assignment_id))
+            batch.delete(self.rollups_collection.document(assignment_id))
+            batch.commit()
             return True
         except Exception:
             return False
     
-    async def save_student_answers(self, assignment_id: str, student_uid: str, 
-                                 answers_data: SubmitAnswersRequest, max_score: float) -> str:
-        """Save or submit student answers"""
-        # Check if submission already exists
-        existing_submission = await self.get_student_submission(assignment_id, student_uid)
+    def _stage_rollup_changes(self, batch, changes: Dict[str, Dict[str, float]]):
+        """Add per-assignment rollup changes (see _rollup_change) to a batch or transaction as increments"""
+        for assignment_id, change in changes.items():
+            fields = {}
+            for key, amount in change.items():
+                if not amount:
+                    continue
+                if key.startswith("histogram."):
+                    fields.setdefault("histogram", {})[key.split(".", 1)[1]] = firestore.Increment(amount)
+                else:
+                    fields[key] = firestore.Increment(amount)
+            if fields:
+                # Merged increments create the rollup on an assignment's first submission
+                batch.set(self.rollups_collection.document(assignment_id), fields, merge=True)
+    
+    def _stage_progress_changes(self, transaction, changes: Dict[Tuple[str, str, str], Dict[str, Optional[float]]]):
+        """Apply progress bucket changes (see progress_change) in a transaction. Each bucket
+        is rewritten from its submissions' percentages, so a lowered score lowers its max.
+        It reads the buckets, so it must come before the transaction's other writes."""
+        if not changes:
+            return
+        refs = {key: self.progress_collection.document(progress_bucket_id(*key)) for key in changes}
+        current = {doc.id: doc.to_dict() for doc in self.firestore.get_all(list(refs.values()), transaction=transaction)
+                   if doc.exists}
+        for key, change in changes.items():
+            ref = refs[key]
+            scores = dict((current.get(ref.id) or {}).get("scores") or {})
+            for submission_id, percentage in change.items():
+                if percentage is None:
+                    scores.pop(submission_id, None)
+                else:
+                    scores[submission_id] = percentage
+            if scores:
+                transaction.set(ref, progress_bucket(*key, scores))
+            elif ref.id in current:
+                transaction.delete(ref)
+    
+    @offload
+    def get_progress_buckets(self, student_uid: str, period: str, since: date) -> List[ProgressBucket]:
+        """Get a student's day or week buckets starting on or after since, oldest first"""
+        # The per-submission scores map is only needed when writing
+        query = (self.progress_collection
+                 .where("student_uid", "==", student_uid)
+                 .where("period", "==", period)
+                 .where("start", ">=", since.isoformat())
+                 .order_by("start")
+                 .select(PROGRESS_FIELDS))
+        buckets = [progress_codec.from_snapshot(doc) for doc in query.stream()]
+        # Buckets whose submissions were all moved elsewhere stay behind empty
+        return [bucket for bucket in buckets if bucket.count > 0]
+    
+    @offload
+    def get_assignment_rollups(self, assignment_ids: List[str]) -> List[AssignmentRollup]:
+        """Get the submission rollups of many assignments in one batched read, in the given order"""
+        refs = [self.rollups_collection.document(assignment_id) for assignment_id in assignment_ids]
+        rollups = {doc.id: rollup_codec.from_snapshot(doc) for doc in self.firestore.get_all(refs) if doc.exists}
+        return [rollups.get(assignment_id) or AssignmentRollup(id=assignment_id) for assignment_id in assignment_ids]
+    
+    @offload
+    def save_student_answers(self, assignment_id: str, student_uid: str,
+                             answers_data: SubmitAnswersRequest, max_score: float,
+                             score: Optional[float] = None, feedback: Optional[str] = None,
+                             question_scores: Optional[Dict[str, float]] = None) -> str:
+        """Save or submit student answers (with the score, feedback and per-question scores of a submission)"""
+        # Concurrent saves land on the same document; the transaction makes each
+        # one see the other's write before moving the rollups
+        doc_ref = self.submissions_collection.document(submission_doc_id(assignment_id, student_uid))
+        return run_transaction(self.firestore, lambda transaction: self._write_student_answers(
+            transaction, doc_ref, assignment_id, student_uid, answers_data, max_score, score, feedback,
+            question_scores))
+    
+    def _write_student_answers(self, transaction, doc_ref, assignment_id: str, student_uid: str,
+                               answers_data: SubmitAnswersRequest, max_score: float,
+                               score: Optional[float], feedback: Optional[str],
+                               question_scores: Optional[Dict[str, float]]) -> str:
+        snapshot = doc_ref.get(transaction=transaction)
+        existing = snapshot.to_dict() if snapshot.exists else None
+        submitted = existing is not None and existing.get("submitted_at") is not None
+        
+        before = _submission_contribution(existing) if existing else {}
+        after = rollup_contribution(
+            answers_data.submit or submitted,
+            score if answers_data.submit else (existing.get("score") if existing else None),
+            max_score
+        )
+        if answers_data.submit:
+            # Submitting (again) moves the score to today's progress buckets;
+            # staged first, as it reads the buckets
+            progress = {}
+            if existing:
+                progress_change(progress, student_uid, doc_ref.id, existing.get("submitted_at"),
+                                existing.get("score"), existing.get("max_score"), -1)
+            progress_change(progress, student_uid, doc_ref.id, datetime.now(timezone.utc), score, max_score, 1)
+            self._stage_progress_changes(transaction, progress)
+        
+        changes = {}
+        _rollup_change(changes, assignment_id, before, after)
+        self._stage_rollup_changes(transaction, changes)
         
-        if existing_submission:
+        if existing:
             # Update existing submission
-            submission_id = existing_submission.id
             updates = {
                 "answers": answers_data.answers,
                 "max_score": max_score
@@ -147,84 +366,141 @@ class AssignmentsRepository:
             
             if answers_data.submit:
                 updates["submitted_at"] = firestore.SERVER_TIMESTAMP
+                updates["score"] = score
+                updates["feedback"] = feedback
+                updates["question_scores"] = question_scores or {}
             else:
                 updates["started_at"] = firestore.SERVER_TIMESTAMP
             
-            self.submissions_collection.document(submission_id).update(updates)
-            return submission_id
+            transaction.update(doc_ref, updates)
         else:
             # Create new submission
-            doc_ref = self.submissions_collection.document()
-            
             submission_doc = {
                 "assn_id": assignment_id,
                 "student_uid": student_uid,
                 "answers": answers_data.answers,
-                "score": None,
+                "question_scores": (question_scores or {}) if answers_data.submit else {},
+                "score": score if answers_data.submit else None,
                 "max_score": max_score,
                 "started_at": firestore.SERVER_TIMESTAMP,
                 "submitted_at": firestore.SERVER_TIMESTAMP if answers_data.submit else None,
-                "feedback": None,
+                "feedback": feedback if answers_data.submit else None,
                 "visible_to_student": True
             }
             
-            doc_ref.set(submission_doc)
-            return doc_ref.id
+            transaction.set(doc_ref, submission_doc)
+        return doc_ref.id
     
-    async def get_student_submission(self, assignment_id: str, student_uid: str) -> Optional[Submission]:
+    @offload
+    def get_student_submission(self, assignment_id: str, student_uid: str) -> Optional[Submission]:
         """Get student's submission for an assignment"""
-        query = self.submissions_collection.where("assn_id", "==", assignment_id).where("student_uid", "==", student_uid)
-        
-        for doc in query.stream():
-            data = doc.to_dict()
-            data['id'] = doc.id
-            if 'started_at' in data and data['started_at']:
-                data['started_at'] = data['started_at'].replace(tzinfo=None)
-            if 'submitted_at' in data and data['submitted_at']:
-                data['submitted_at'] = data['submitted_at'].replace(tzinfo=None)
-            return Submission(**data)
-        
+        doc = self.submissions_collection.document(submission_doc_id(assignment_id, student_uid)).get()
+        if doc.exists:
+            return submission_codec.from_snapshot(doc)
         return None
     
-    async def get_assignment_submissions(self, assignment_id: str) -> List[Submission]:
+    @offload
+    def get_assignment_submissions(self, assignment_id: str) -> List[Submission]:
         """Get all submissions for an assignment"""
         query = self.submissions_collection.where("assn_id", "==", assignment_id)
         submissions = []
         
         for doc in query.stream():
-            data = doc.to_dict()
-            data['id'] = doc.id
-            if 'started_at' in data and data['started_at']:
-                data['started_at'] = data['started_at'].replace(tzinfo=None)
-            if 'submitted_at' in data and data['submitted_at']:
-                data['submitted_at'] = data['submitted_at'].replace(tzinfo=None)
-            submissions.append(Submission(**data))
+            submissions.append(submission_codec.from_snapshot(doc))
         
         return submissions
     
-    async def update_submission_score(self, submission_id: str, score: float, feedback: str) -> bool:
+    @offload
+    def get_item_responses(self, assignment_id: str) -> List[Submission]:
+        """Get an assignment's submitted submissions with only student_uid, answers and question_scores loaded"""
+        query = (self.submissions_collection
+                 .where("assn_id", "==", assignment_id)
+                 .where("submitted_at", "!=", None)
+                 .select(["student_uid", "answers", "question_scores"]))
+        return [submission_codec.from_snapshot(doc) for doc in query.stream()]
+    
+    @offload
+    def update_submission_score(self, submission_id: str, score: float, feedback: str) -> bool:
         """Update submission with score and feedback"""
-        try:
-            self.submissions_collection.document(submission_id).update({
-                "score": score,
-                "feedback": feedback
-            })
+        return self._write_submission_scores({submission_id: (score, feedback)})
+    
+    @offload
+    def update_submission_scores(self, scores: Dict[str, Tuple[float, str]],
+                                 question_scores: Optional[Dict[str, Dict[str, float]]] = None) -> bool:
+        """Update score and feedback (and per-question scores, when given) for many submissions in one batch"""
+        return self._write_submission_scores(scores, question_scores or {})
+    
+    def _write_submission_scores(self, scores: Dict[str, Tuple[float, str]],
+                                 question_scores: Optional[Dict[str, Dict[str, float]]] = None) -> bool:
+        """Write new scores and move the affected assignment rollups in the same transaction"""
+        refs = [self.submissions_collection.document(submission_id) for submission_id in scores]
+        
+        def write(transaction) -> bool:
+            current = {doc.id: doc.to_dict() for doc in self.firestore.get_all(refs, transaction=transaction)
+                       if doc.exists}
+            if len(current) != len(scores):
+                return False
+            
+            changes = {}
+            progress = {}
+            for ref in refs:
+                score, _ = scores[ref.id]
+                data = current[ref.id]
+                _rollup_change(changes, data["assn_id"], _submission_contribution(data),
+                               _submission_contribution({**data, "score": score}))
+                progress_change(progress, data["student_uid"], ref.id, data.get("submitted_at"),
+                                data.get("score"), data.get("max_score"), -1)
+                progress_change(progress, data["student_uid"], ref.id, data.get("submitted_at"),
+                                score, data.get("max_score"), 1)
+            # Reads the buckets, so before any write
+            self._stage_progress_changes(transaction, progress)
+            self._stage_rollup_changes(transaction, changes)
+            for ref in refs:
+                score, feedback = scores[ref.id]
+                updates = {"score": score, "feedback": feedback}
+                if question_scores and ref.id in question_scores:
+                    updates["question_scores"] = question_scores[ref.id]
+                transaction.update(ref, updates)
             return True
+        
+        try:
+            return run_transaction(self.firestore, write)
         except Exception:
             return False
     
-    async def get_student_submissions(self, student_uid: str) -> List[Submission]:
+    @offload
+    def get_student_submission_stats(self, student_uid: str) -> Dict[str, Any]:
+        """Submission count, submitted count and average score of a student,
+        aggregated by the database instead of reading the submissions"""
+        query = self.submissions_collection.where("student_uid", "==", student_uid)
+        stats = aggregate(query.count(alias="total").avg("score", alias="average_score"))
+        submitted = aggregate(query.where("submitted_at", "!=", None).count(alias="completed"))
+        return {
+            "total": stats["total"],
+            "completed": submitted["completed"],
+            "average_score": stats["average_score"] or 0
+        }
+    
+    @offload
+    def get_recent_submissions(self, student_uid: str, limit: int = 5) -> List[Submission]:
+        """Get a student's latest submitted submissions, newest first, with only score,
+        max_score and submitted_at loaded"""
+        query = (self.submissions_collection
+                 .where("student_uid", "==", student_uid)
+                 .order_by("submitted_at", direction=firestore.Query.DESCENDING)
+                 .limit(limit)
+                 .select(["score", "max_score", "submitted_at"]))
+        submissions = [submission_codec.from_snapshot(doc) for doc in query.stream()]
+        # Not yet submitted ones sort last (null) and are dropped
+        return [submission for submission in submissions if submission.submitted_at]
+    
+    @offload
+    def get_student_submissions(self, student_uid: str) -> List[Submission]:
         """Get all submissions for a student"""
         query = self.submissions_collection.where("student_uid", "==", student_uid)
         submissions = []
         
         for doc in query.stream():
-            data = doc.to_dict()
-            data['id'] = doc.id
-            if 'started_at' in data and data['started_at']:
-                data['started_at'] = data['started_at'].replace(tzinfo=None)
-            if 'submitted_at' in data and data['submitted_at']:
-                data['submitted_at'] = data['submitted_at'].replace(tzinfo=None)
-            submissions.append(Submission(**data))
+            submissions.append(submission_codec.from_snapshot(doc))
         
         return submissions
\ No newline at end of file
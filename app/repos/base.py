@@ -0,0 +1,71 @@
+import functools
+from typing import Any, Callable, Dict, List
+from google.cloud import firestore
+from ..deps.executor import run_blocking
+from ..deps.firebase import get_db
+from .cache import document_cache
+
+# Firestore accepts at most 30 values in an 'in' filter
+IN_QUERY_LIMIT = 30
+
+def chunked(values: List[Any], size: int = IN_QUERY_LIMIT) -> List[List[Any]]:
+    """Split values into lists small enough for one 'in' query"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+def aggregate(query) -> Dict[str, Any]:
+    """Run a count()/sum()/avg() aggregation query and return its values by alias"""
+    return {result.alias: result.value for result in query.get()[0]}
+
+def run_transaction(client, fn: Callable[[Any], Any]) -> Any:
+    """Run fn(transaction) in a Firestore transaction (retried on contention)
+    and return its result. fn reads with ref.get(transaction=...) or
+    get_all(..., transaction=...) before it writes through the transaction.
+    The local fake and request sessions provide run_transaction themselves."""
+    if hasattr(client, 'run_transaction'):
+        return client.run_transaction(fn)
+    return firestore.transactional(fn)(client.transaction())
+
+def offload(method: Callable) -> Callable:
+    """Make a blocking repository method awaitable on the DB executor"""
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        return await run_blocking(method, *args, **kwargs)
+    return wrapper
+
+def invalidates(*collections: str) -> Callable:
+    """Drop cached reads of collections once a repository write has run"""
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args: Any, **kwargs: Any) -> Any:
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                for collection in collections:
+                    self._invalidate(collection)
+        return wrapper
+    return decorator
+
+class BaseRepository:
+    """Shares one database client across repositories.
+
+    Methods that talk to the database are plain functions decorated with
+    @offload, so the event loop never waits on a Firestore round trip.
+    """
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else get_db()
+
+    def _cached(self, collection: str, key: Any, loader: Callable[[], Any]) -> Any:
+        """Serve a read-mostly lookup from the process-wide document cache"""
+        if getattr(self.db, 'has_pending_writes', lambda: False)():
+            # Uncommitted session writes must neither be hidden nor cached
+            return loader()
+        return document_cache.get_or_load(collection, key, loader)
+
+    def _invalidate(self, collection: str):
+        """Drop cached reads of a collection after writing to it"""
+        document_cache.invalidate(collection)
+        if hasattr(self.db, 'on_flush'):
+            # Session writes reach the database later; drop whatever was
+            # cached in between once they do
+            self.db.on_flush(lambda: document_cache.invalidate(collection))
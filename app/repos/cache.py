@@ -0,0 +1,132 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+from pydantic import BaseModel
+
+# Seconds an entry stays fresh, per collection; override with
+# CACHE_TTL_<COLLECTION> (e.g. CACHE_TTL_ASSIGNMENTS=60). 0 disables caching.
+# Invalidation is per process: a write drops this worker's entries only, so
+# other workers (and writes made outside the app) can serve stale data for
+# up to the TTL.
+DEFAULT_TTLS = {
+    "assignments": 300,
+    "classes": 120,
+    "users": 300,
+}
+
+def _clone(value: Any) -> Any:
+    """Deep-copy what the cache hands out so callers can't modify cached entries,
+    including nested lists, dicts and models"""
+    if isinstance(value, BaseModel):
+        return value.model_copy(deep=True)
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+class DocumentCache:
+    """Process-wide LRU cache of repository reads with per-collection TTLs.
+
+    Concurrent misses on the same key wait for a single load. Writes through
+    the repositories call invalidate(), which also stops loads that were
+    already running from storing what they read.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttls: Dict[str, float] = None):
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Tuple[str, Hashable], threading.Lock] = {}
+        self._generations: Dict[str, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def ttl(self, collection: str) -> float:
+        return float(os.getenv(f"CACHE_TTL_{collection.upper()}", self.ttls.get(collection, 0)))
+
+    def _count(self, collection: str, stat: str):
+        stats = self._stats.setdefault(collection, {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+        stats[stat] += 1
+
+    def _lookup(self, key: Tuple[str, Hashable]) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get_or_load(self, collection: str, key: Hashable, loader: Callable[[], Any], store: bool = True) -> Any:
+        """Return the cached value for key, loading it once on a miss"""
+        ttl = self.ttl(collection)
+        if ttl <= 0:
+            return loader()
+        cache_key = (collection, key)
+        with self._lock:
+            found, value = self._lookup(cache_key)
+            if found:
+                self._count(collection, "hits")
+                return _clone(value)
+            load_lock = self._loading.setdefault(cache_key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                found, value = self._lookup(cache_key)
+                if found:
+                    # Another request loaded it while we waited
+                    self._count(collection, "hits")
+                    return _clone(value)
+                self._count(collection, "misses")
+                generation = self._generations.get(collection, 0)
+            try:
+                value = loader()
+            finally:
+                with self._lock:
+                    self._loading.pop(cache_key, None)
+            with self._lock:
+                if store and self._generations.get(collection, 0) == generation:
+                    self._entries[cache_key] = (time.monotonic() + ttl, value)
+                    self._entries.move_to_end(cache_key)
+                    while len(self._entries) > self.max_entries:
+                        (evicted_collection, _), _ = self._entries.popitem(last=False)
+                        self._count(evicted_collection, "evictions")
+        return _clone(value)
+
+    def invalidate(self, collection: str, key: Hashable = None):
+        """Drop one entry, or every entry of a collection when key is None"""
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+            if key is not None:
+                self._entries.pop((collection, key), None)
+            else:
+                for cache_key in [k for k in self._entries if k[0] == collection]:
+                    del self._entries[cache_key]
+            self._count(collection, "invalidations")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations = {c: g + 1 for c, g in self._generations.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes: Dict[str, int] = {}
+            for collection, _ in self._entries:
+                sizes[collection] = sizes.get(collection, 0) + 1
+            collections = {}
+            for collection, stats in self._stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                collections[collection] = {
+                    **stats,
+                    "entries": sizes.get(collection, 0),
+                    "ttl_seconds": self.ttl(collection),
+                    "hit_rate": round(stats["hits"] / lookups, 3) if lookups else None,
+                }
+            return {"max_entries": self.max_entries, "entries": len(self._entries), "collections": collections}
+
+# Global instance
+document_cache = DocumentCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "2048")))
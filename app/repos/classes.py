@@ -1,25 +1,29 @@
-from typing import List, Optional
+from typing import Callable, List, Optional
 from google.cloud import firestore
 from ..models.schemas import Class, CreateClassRequest
-from ..deps.firebase import get_db
+from .base import BaseRepository, invalidates, offload, run_transaction
+from .decoding import class_codec
 from datetime import datetime
 
-class ClassesRepository:
-    def __init__(self):
-        self.db = get_db()
+class ClassesRepository(BaseRepository):
+    def __init__(self, db=None):
+        super().__init__(db)
         # Check if it's mock database
         if hasattr(self.db, 'create_document'):
             self.collection = None  # Mock database doesn't need collection
         else:
             self.collection = self.db.collection('classes')
     
-    async def create_class(self, class_data: CreateClassRequest, teacher_uid: str) -> str:
+    @offload
+    @invalidates('classes')
+    def create_class(self, class_data: CreateClassRequest, teacher_uid: str) -> str:
         """Create a new class"""
         class_doc = {
             "name": class_data.name,
             "teacher_uid": teacher_uid,
             "grade": class_data.grade,
-            "student_uids": []
+            "student_uids": [],
+            "student_count": 0
         }
         
         if hasattr(self.db, 'create_document'):
@@ -32,33 +36,37 @@ class ClassesRepository:
             doc_ref.set(class_doc)
             return doc_ref.id
     
-    async def get_class(self, class_id: str) -> Optional[Class]:
+    @offload
+    def get_class(self, class_id: str) -> Optional[Class]:
         """Get class by ID"""
+        return self._cached('classes', class_id, lambda: self._fetch_class(class_id))
+    
+    def _fetch_class(self, class_id: str) -> Optional[Class]:
         if hasattr(self.db, 'get_document'):
             # Mock database
             data = self.db.get_document('classes', class_id)
             if data:
-                return Class(**data)
+                return class_codec.decode(data)
             return None
         else:
             # Firebase
             doc = self.collection.document(class_id).get()
             if doc.exists:
-                data = doc.to_dict()
-                data['id'] = class_id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                return Class(**data)
+                return class_codec.from_snapshot(doc)
             return None
     
-    async def get_teacher_classes(self, teacher_uid: str) -> List[Class]:
+    @offload
+    def get_teacher_classes(self, teacher_uid: str) -> List[Class]:
         """Get all classes for a teacher"""
+        return self._cached('classes', ('teacher', teacher_uid), lambda: self._fetch_teacher_classes(teacher_uid))
+    
+    def _fetch_teacher_classes(self, teacher_uid: str) -> List[Class]:
         if hasattr(self.db, 'query_documents'):
             # Mock database
             classes_data = self.db.query_documents('classes', 'teacher_uid', '==', teacher_uid)
             classes = []
             for data in classes_data:
-                classes.append(Class(**data))
+                classes.append(class_codec.decode(data))
             return classes
         else:
             # Firebase
@@ -66,22 +74,22 @@ class ClassesRepository:
             classes = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                classes.append(Class(**data))
+                classes.append(class_codec.from_snapshot(doc))
             
             return classes
     
-    async def get_student_classes(self, student_uid: str) -> List[Class]:
+    @offload
+    def get_student_classes(self, student_uid: str) -> List[Class]:
         """Get all classes for a student"""
+        return self._cached('classes', ('student', student_uid), lambda: self._fetch_student_classes(student_uid))
+    
+    def _fetch_student_classes(self, student_uid: str) -> List[Class]:
         if hasattr(self.db, 'query_documents'):
             # Mock database
             classes_data = self.db.query_documents('classes', 'student_uids', 'array_contains', student_uid)
             classes = []
             for data in classes_data:
-                classes.append(Class(**data))
+                classes.append(class_codec.decode(data))
             return classes
         else:
             # Firebase
@@ -89,61 +97,74 @@ class ClassesRepository:
             classes = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                classes.append(Class(**data))
+                classes.append(class_codec.from_snapshot(doc))
             
             return classes
     
-    async def add_student_to_class(self, class_id: str, student_uid: str) -> bool:
-        """Add student to a class"""
-        try:
-            if hasattr(self.db, 'get_document'):
-                # Mock database
-                class_data = self.db.get_document('classes', class_id)
-                if class_data:
-                    if 'student_uids' not in class_data:
-                        class_data['student_uids'] = []
-                    if student_uid not in class_data['student_uids']:
-                        class_data['student_uids'].append(student_uid)
-                        self.db.update_document('classes', class_id, class_data)
-                    return True
-                return False
-            else:
-                # Firebase
-                class_ref = self.collection.document(class_id)
-                class_ref.update({
-                    "student_uids": firestore.ArrayUnion([student_uid])
-                })
-                return True
-        except Exception:
-            return False
+    @offload
+    @invalidates('classes')
+    def add_student_to_class(self, class_id: str, student_uid: str) -> bool:
+        """Add a newly created student, whose class_ids already lists the class, to the
+        class's roster; existing students change classes through MembershipRepository"""
+        return self._change_students(
+            class_id, lambda uids: uids if student_uid in uids else uids + [student_uid])
+    
+    @offload
+    @invalidates('classes')
+    def add_students_to_class(self, class_id: str, student_uids: List[str]) -> bool:
+        """Add many newly created students to a class's roster with a single write"""
+        return self._change_students(
+            class_id, lambda uids: uids + [uid for uid in dict.fromkeys(student_uids) if uid not in uids])
     
-    async def remove_student_from_class(self, class_id: str, student_uid: str) -> bool:
-        """Remove student from a class"""
+    def _change_students(self, class_id: str, change: Callable[[List[str]], List[str]]) -> bool:
+        """Replace a class's student list with change(current list), and the counter
+        with it; the check and the write run in one transaction"""
         try:
-            if hasattr(self.db, 'get_document'):
-                # Mock database
-                class_data = self.db.get_document('classes', class_id)
-                if class_data and 'student_uids' in class_data:
-                    if student_uid in class_data['student_uids']:
-                        class_data['student_uids'].remove(student_uid)
-                        self.db.update_document('classes', class_id, class_data)
-                    return True
-                return False
+            if hasattr(self.db, 'transact'):
+                # Mock database - the check and the write run under the store's transaction
+                found = False
+                
+                def write(get):
+                    nonlocal found
+                    class_data = get('classes', class_id)
+                    found = class_data is not None
+                    if not found:
+                        return []
+                    current_uids = list(class_data.get('student_uids', []))
+                    student_uids = change(current_uids)
+                    if student_uids == current_uids:
+                        return []
+                    return [('update', 'classes', class_id, {
+                        'student_uids': student_uids,
+                        'student_count': len(student_uids)
+                    })]
+                
+                self.db.transact(write)
+                return found
             else:
                 # Firebase
                 class_ref = self.collection.document(class_id)
-                class_ref.update({
-                    "student_uids": firestore.ArrayRemove([student_uid])
-                })
-                return True
+                
+                def write(transaction) -> bool:
+                    class_doc = class_ref.get(transaction=transaction)
+                    if not class_doc.exists:
+                        return False
+                    current_uids = class_doc.to_dict().get('student_uids', [])
+                    student_uids = change(list(current_uids))
+                    if student_uids != current_uids:
+                        transaction.update(class_ref, {
+                            "student_uids": student_uids,
+                            "student_count": len(student_uids)
+                        })
+                    return True
+                
+                return run_transaction(self.db, write)
         except Exception:
             return False
     
-    async def update_class(self, class_id: str, updates: dict) -> bool:
+    @offload
+    @invalidates('classes')
+    def update_class(self, class_id: str, updates: dict) -> bool:
         """Update class document"""
         try:
             if hasattr(self.db, 'update_document'):
@@ -156,7 +177,9 @@ class ClassesRepository:
         except Exception:
             return False
     
-    async def delete_class(self, class_id: str) -> bool:
+    @offload
+    @invalidates('classes')
+    def delete_class(self, class_id: str) -> bool:
         """Delete a class"""
         try:
             if hasattr(self.db, 'delete_document'):
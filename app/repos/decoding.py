@@ -0,0 +1,96 @@
+import typing
+from typing import Any, Dict, Mapping, Optional, Tuple, Type, TypeVar
+from datetime import datetime
+from pydantic import BaseModel
+from ..deps.mock_db import thaw
+from ..models.schemas import (
+    Assignment, AssignmentRollup, AssignmentSummary, Class, IndividualAssignment,
+    Lesson, ProgressBucket, StudentTeacherRelation, Submission, UserProfile
+)
+
+M = TypeVar("M", bound=BaseModel)
+
+def parse_timestamp(value: Any) -> Any:
+    """Convert an ISO timestamp string from the mock store to a datetime"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value
+
+def _naive(value: Any) -> Any:
+    """Timestamps come back as ISO strings (local stores) or aware datetimes
+    (Firestore); models hold naive UTC datetimes"""
+    value = parse_timestamp(value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+def _model_type(annotation: Any) -> Optional[Type[BaseModel]]:
+    return annotation if isinstance(annotation, type) and issubclass(annotation, BaseModel) else None
+
+class DocumentCodec:
+    """Turns stored documents of one collection into models.
+
+    Documents in our collections were validated by the request models when
+    they were written, so models are built with model_construct() instead of
+    being validated again. The codec reads the model's fields once to find
+    timestamps and nested models, which are the only values that need
+    converting on the way out of storage.
+    """
+
+    def __init__(self, model: Type[M], id_field: str = 'id'):
+        self.model = model
+        self.id_field = id_field
+        # Stored keys the model reads; anything else in a document is not copied
+        self.stored_fields: Tuple[str, ...] = tuple(dict.fromkeys(('id', *model.model_fields)))
+        self.timestamp_fields: Tuple[str, ...] = ()
+        # field -> (container origin or None, nested model)
+        self.nested: Dict[str, Tuple[Any, Type[BaseModel]]] = {}
+        for name, field in model.model_fields.items():
+            args = typing.get_args(field.annotation)
+            origin = typing.get_origin(field.annotation)
+            if field.annotation is datetime or (origin is typing.Union and datetime in args):
+                self.timestamp_fields += (name,)
+            elif _model_type(field.annotation):
+                self.nested[name] = (None, field.annotation)
+            elif origin in (list, dict) and args and _model_type(args[-1]):
+                self.nested[name] = (origin, args[-1])
+
+    def _build(self, doc: Dict[str, Any], doc_id: Optional[str]) -> M:
+        stored_id = doc.pop('id', None)
+        doc[self.id_field] = doc_id if doc_id is not None else stored_id
+        for name in self.timestamp_fields:
+            if doc.get(name) is not None:
+                doc[name] = _naive(doc[name])
+        for name, (origin, nested) in self.nested.items():
+            value = doc.get(name)
+            if value is None:
+                continue
+            if origin is dict:
+                doc[name] = {k: nested.model_construct(**v) for k, v in value.items()}
+            elif origin is list:
+                doc[name] = [nested.model_construct(**v) for v in value]
+            else:
+                doc[name] = nested.model_construct(**value)
+        return self.model.model_construct(**doc)
+
+    def decode(self, data: Mapping[str, Any], doc_id: Optional[str] = None) -> M:
+        """Model from a local store document (read-only mapping). Only the model's
+        fields are copied out of the view; their lists and dicts are thawed on
+        purpose, since models are mutable and are serialized as plain JSON types"""
+        return self._build({name: thaw(data[name]) for name in self.stored_fields if name in data}, doc_id)
+
+    def from_snapshot(self, snapshot) -> M:
+        """Model from a Firestore document snapshot"""
+        return self._build(snapshot.to_dict(), snapshot.id)
+
+# One codec per collection
+user_codec = DocumentCodec(UserProfile, id_field='uid')
+class_codec = DocumentCodec(Class)
+assignment_codec = DocumentCodec(Assignment)
+assignment_summary_codec = DocumentCodec(AssignmentSummary)
+submission_codec = DocumentCodec(Submission)
+lesson_codec = DocumentCodec(Lesson)
+individual_assignment_codec = DocumentCodec(IndividualAssignment)
+relation_codec = DocumentCodec(StudentTeacherRelation)
+rollup_codec = DocumentCodec(AssignmentRollup)
+progress_codec = DocumentCodec(ProgressBucket)
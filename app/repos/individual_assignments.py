@@ -1,19 +1,22 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from google.cloud import firestore
-from ..models.schemas import IndividualAssignment, CreateIndividualAssignmentRequest
-from ..deps.firebase import get_db
+from ..models.schemas import IndividualAssignment, CreateIndividualAssignmentRequest, Page
+from .base import BaseRepository, aggregate, offload
+from .decoding import individual_assignment_codec
+from .pagination import DEFAULT_PAGE_SIZE, fetch_page
 from datetime import datetime
 
-class IndividualAssignmentsRepository:
-    def __init__(self):
-        self.db = get_db()
+class IndividualAssignmentsRepository(BaseRepository):
+    def __init__(self, db=None):
+        super().__init__(db)
         # Check if it's mock database
         if hasattr(self.db, 'create_document'):
             self.collection = None  # Mock database doesn't need collection
         else:
             self.collection = self.db.collection('individual_assignments')
     
-    async def create_assignment(self, assignment_data: CreateIndividualAssignmentRequest, teacher_uid: str) -> str:
+    @offload
+    def create_assignment(self, assignment_data: CreateIndividualAssignmentRequest, teacher_uid: str) -> str:
         """Create a new individual assignment"""
         assignment_doc = {
             "title": assignment_data.title,
@@ -35,64 +38,51 @@ class IndividualAssignmentsRepository:
             doc_ref.set(assignment_doc)
             return doc_ref.id
     
-    async def get_assignment(self, assignment_id: str) -> Optional[IndividualAssignment]:
+    @offload
+    def get_assignment(self, assignment_id: str) -> Optional[IndividualAssignment]:
         """Get assignment by ID"""
         if hasattr(self.db, 'get_document'):
             # Mock database
             data = self.db.get_document('individual_assignments', assignment_id)
             if data:
-                data['id'] = assignment_id
-                data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                return IndividualAssignment(**data)
+                return individual_assignment_codec.decode(data, assignment_id)
             return None
         else:
             # Firebase
             doc = self.collection.document(assignment_id).get()
             if doc.exists:
-                data = doc.to_dict()
-                data['id'] = assignment_id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                return IndividualAssignment(**data)
+                return individual_assignment_codec.from_snapshot(doc)
             return None
     
-    async def get_teacher_assignments(self, teacher_uid: str) -> List[IndividualAssignment]:
-        """Get all assignments created by a teacher"""
+    @offload
+    def get_teacher_assignments(self, teacher_uid: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Page[IndividualAssignment]:
+        """Get one page of the assignments created by a teacher, newest first"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_assignments = self.db.get_all_documents('individual_assignments')
-            assignments = []
-            for data in all_assignments:
-                if data.get('teacher_uid') == teacher_uid:
-                    data['id'] = data.get('id', '')
-                    data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    assignments.append(IndividualAssignment(**data))
-            return assignments
+            query = self.db.query('individual_assignments').where("teacher_uid", "==", teacher_uid)
+            results, next_cursor = fetch_page(query, limit, cursor, "created_at", firestore.Query.DESCENDING)
+            assignments = [individual_assignment_codec.decode(data) for data in results]
+            return Page(items=assignments, next_cursor=next_cursor)
         else:
             # Firebase
-            query = self.collection.where("teacher_uid", "==", teacher_uid).order_by("created_at", direction=firestore.Query.DESCENDING)
+            query = self.collection.where("teacher_uid", "==", teacher_uid)
+            results, next_cursor = fetch_page(query, limit, cursor, "created_at", firestore.Query.DESCENDING)
             assignments = []
             
-            for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                assignments.append(IndividualAssignment(**data))
+            for doc in results:
+                assignments.append(individual_assignment_codec.from_snapshot(doc))
             
-            return assignments
+            return Page(items=assignments, next_cursor=next_cursor)
     
-    async def get_student_assignments(self, student_uid: str) -> List[IndividualAssignment]:
+    @offload
+    def get_student_assignments(self, student_uid: str) -> List[IndividualAssignment]:
         """Get all assignments for a student"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_assignments = self.db.get_all_documents('individual_assignments')
+            query = self.db.query('individual_assignments').where("student_uid", "==", student_uid).order_by("created_at", direction=firestore.Query.DESCENDING)
             assignments = []
-            for data in all_assignments:
-                if data.get('student_uid') == student_uid:
-                    data['id'] = data.get('id', '')
-                    data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    assignments.append(IndividualAssignment(**data))
+            for data in query.stream():
+                assignments.append(individual_assignment_codec.decode(data))
             return assignments
         else:
             # Firebase
@@ -100,15 +90,29 @@ class IndividualAssignmentsRepository:
             assignments = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                assignments.append(IndividualAssignment(**data))
+                assignments.append(individual_assignment_codec.from_snapshot(doc))
             
             return assignments
     
-    async def update_assignment(self, assignment_id: str, updates: dict) -> bool:
+    @offload
+    def get_teacher_assignment_stats(self, teacher_uid: str) -> Dict[str, Any]:
+        """Number of open assignments and average score of completed ones over all
+        of a teacher's assignments, aggregated by the database"""
+        if hasattr(self.db, 'get_all_documents'):
+            # Mock database
+            query = self.db.query('individual_assignments').where("teacher_uid", "==", teacher_uid)
+        else:
+            # Firebase
+            query = self.collection.where("teacher_uid", "==", teacher_uid)
+        active = aggregate(query.where("status", "in", ["assigned", "in_progress"]).count(alias="active"))
+        completed = aggregate(query.where("status", "==", "completed").avg("score", alias="average_score"))
+        return {
+            "active": active["active"],
+            "average_score": completed["average_score"] or 0
+        }
+    
+    @offload
+    def update_assignment(self, assignment_id: str, updates: dict) -> bool:
         """Update assignment"""
         if hasattr(self.db, 'update_document'):
             # Mock database
@@ -125,7 +129,8 @@ class IndividualAssignmentsRepository:
             except Exception:
                 return False
     
-    async def delete_assignment(self, assignment_id: str) -> bool:
+    @offload
+    def delete_assignment(self, assignment_id: str) -> bool:
         """Delete assignment"""
         if hasattr(self.db, 'delete_document'):
             # Mock database
@@ -1,19 +1,22 @@
 from typing import List, Optional
 from google.cloud import firestore
-from ..models.schemas import Lesson, CreateLessonRequest
-from ..deps.firebase import get_db
+from ..models.schemas import Lesson, CreateLessonRequest, Page
+from .base import BaseRepository, aggregate, offload
+from .decoding import lesson_codec
+from .pagination import DEFAULT_PAGE_SIZE, fetch_page
 from datetime import datetime
 
-class LessonsRepository:
-    def __init__(self):
-        self.db = get_db()
+class LessonsRepository(BaseRepository):
+    def __init__(self, db=None):
+        super().__init__(db)
         # Check if it's mock database
         if hasattr(self.db, 'create_document'):
             self.collection = None  # Mock database doesn't need collection
         else:
             self.collection = self.db.collection('lessons')
     
-    async def create_lesson(self, lesson_data: CreateLessonRequest, teacher_uid: str) -> str:
+    @offload
+    def create_lesson(self, lesson_data: CreateLessonRequest, teacher_uid: str) -> str:
         """Create a new lesson"""
         lesson_doc = {
             "student_uid": lesson_data.student_uid,
@@ -37,80 +40,75 @@ class LessonsRepository:
             doc_ref.set(lesson_doc)
             return doc_ref.id
     
-    async def get_lesson(self, lesson_id: str) -> Optional[Lesson]:
+    @offload
+    def get_lesson(self, lesson_id: str) -> Optional[Lesson]:
         """Get lesson by ID"""
         if hasattr(self.db, 'get_document'):
             # Mock database
             data = self.db.get_document('lessons', lesson_id)
             if data:
-                data['id'] = lesson_id
-                data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                return Lesson(**data)
+                return lesson_codec.decode(data, lesson_id)
             return None
         else:
             # Firebase
             doc = self.collection.document(lesson_id).get()
             if doc.exists:
-                data = doc.to_dict()
-                data['id'] = lesson_id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                return Lesson(**data)
+                return lesson_codec.from_snapshot(doc)
             return None
     
-    async def get_teacher_lessons(self, teacher_uid: str) -> List[Lesson]:
-        """Get all lessons for a teacher"""
+    @offload
+    def get_teacher_lessons(self, teacher_uid: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Page[Lesson]:
+        """Get one page of a teacher's lessons, newest first"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_lessons = self.db.get_all_documents('lessons')
-            lessons = []
-            for data in all_lessons:
-                if data.get('teacher_uid') == teacher_uid:
-                    data['id'] = data.get('id', '')
-                    data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    lessons.append(Lesson(**data))
-            return lessons
+            query = self.db.query('lessons').where("teacher_uid", "==", teacher_uid)
+            results, next_cursor = fetch_page(query, limit, cursor, "lesson_date", firestore.Query.DESCENDING)
+            lessons = [lesson_codec.decode(data) for data in results]
+            return Page(items=lessons, next_cursor=next_cursor)
         else:
             # Firebase
-            query = self.collection.where("teacher_uid", "==", teacher_uid).order_by("lesson_date", direction=firestore.Query.DESCENDING)
+            query = self.collection.where("teacher_uid", "==", teacher_uid)
+            results, next_cursor = fetch_page(query, limit, cursor, "lesson_date", firestore.Query.DESCENDING)
             lessons = []
             
-            for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                lessons.append(Lesson(**data))
+            for doc in results:
+                lessons.append(lesson_codec.from_snapshot(doc))
             
-            return lessons
+            return Page(items=lessons, next_cursor=next_cursor)
     
-    async def get_student_lessons(self, student_uid: str) -> List[Lesson]:
-        """Get all lessons for a student"""
+    @offload
+    def get_student_lessons(self, student_uid: str, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Page[Lesson]:
+        """Get one page of a student's lessons, newest first"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_lessons = self.db.get_all_documents('lessons')
-            lessons = []
-            for data in all_lessons:
-                if data.get('student_uid') == student_uid:
-                    data['id'] = data.get('id', '')
-                    data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    lessons.append(Lesson(**data))
-            return lessons
+            query = self.db.query('lessons').where("student_uid", "==", student_uid)
+            results, next_cursor = fetch_page(query, limit, cursor, "lesson_date", firestore.Query.DESCENDING)
+            lessons = [lesson_codec.decode(data) for data in results]
+            return Page(items=lessons, next_cursor=next_cursor)
         else:
             # Firebase
-            query = self.collection.where("student_uid", "==", student_uid).order_by("lesson_date", direction=firestore.Query.DESCENDING)
+            query = self.collection.where("student_uid", "==", student_uid)
+            results, next_cursor = fetch_page(query, limit, cursor, "lesson_date", firestore.Query.DESCENDING)
             lessons = []
             
-            for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                lessons.append(Lesson(**data))
+            for doc in results:
+                lessons.append(lesson_codec.from_snapshot(doc))
             
-            return lessons
+            return Page(items=lessons, next_cursor=next_cursor)
+    
+    @offload
+    def count_teacher_lessons_since(self, teacher_uid: str, since: datetime) -> int:
+        """Count a teacher's lessons dated on or after since, aggregated by the database"""
+        if hasattr(self.db, 'get_all_documents'):
+            # Mock database
+            query = self.db.query('lessons').where("teacher_uid", "==", teacher_uid)
+        else:
+            # Firebase
+            query = self.collection.where("teacher_uid", "==", teacher_uid)
+        return aggregate(query.where("lesson_date", ">=", since).count(alias="lessons"))["lessons"]
     
-    async def update_lesson(self, lesson_id: str, updates: dict) -> bool:
+    @offload
+    def update_lesson(self, lesson_id: str, updates: dict) -> bool:
         """Update lesson"""
         if hasattr(self.db, 'update_document'):
             # Mock database
@@ -127,7 +125,8 @@ class LessonsRepository:
             except Exception:
                 return False
     
-    async def delete_lesson(self, lesson_id: str) -> bool:
+    @offload
+    def delete_lesson(self, lesson_id: str) -> bool:
         """Delete lesson"""
         if hasattr(self.db, 'delete_document'):
             # Mock database
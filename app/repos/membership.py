@@ -0,0 +1,101 @@
+from typing import List
+from google.cloud import firestore
+from .base import BaseRepository, invalidates, offload, run_transaction
+
+# Firestore takes at most 500 writes per batch: one per student plus the class
+MAX_STUDENTS_PER_COMMIT = 499
+
+class MembershipRepository(BaseRepository):
+    """Class membership lives on both sides: classes.student_uids (with
+    student_count) and users.class_ids. Every change here writes both
+    sides in one transaction, so they cannot drift apart on a partial failure."""
+
+    async def add_student(self, class_id: str, student_uid: str) -> bool:
+        """Add one student to a class"""
+        return await self.add_students(class_id, [student_uid])
+
+    async def remove_student(self, class_id: str, student_uid: str) -> bool:
+        """Remove one student from a class"""
+        return await self.remove_students(class_id, [student_uid])
+
+    @offload
+    @invalidates('classes', 'users')
+    def add_students(self, class_id: str, student_uids: List[str]) -> bool:
+        """Add many students to a class in one commit"""
+        return self._change_membership(class_id, student_uids, add=True)
+
+    @offload
+    @invalidates('classes', 'users')
+    def remove_students(self, class_id: str, student_uids: List[str]) -> bool:
+        """Remove many students from a class in one commit"""
+        return self._change_membership(class_id, student_uids, add=False)
+
+    def _change_membership(self, class_id: str, student_uids: List[str], add: bool) -> bool:
+        """Returns False without writing anything if the class or any of the
+        students does not exist. The reads and the writes run in one transaction,
+        so concurrent changes of the same class are not lost"""
+        student_uids = list(dict.fromkeys(student_uids))
+        if not student_uids:
+            return True
+        if len(student_uids) > MAX_STUDENTS_PER_COMMIT:
+            raise ValueError(f"At most {MAX_STUDENTS_PER_COMMIT} students can be changed at once")
+
+        try:
+            if hasattr(self.db, 'transact'):
+                # Mock database - the reads and the writes run under the store's transaction
+                found = False
+
+                def write(get):
+                    nonlocal found
+                    class_data = get('classes', class_id)
+                    students = {uid: get('users', uid) for uid in student_uids}
+                    found = class_data is not None and all(data is not None for data in students.values())
+                    if not found:
+                        return []
+
+                    current = list(class_data.get('student_uids', []))
+                    roster = _roster(current, student_uids, add)
+                    ops = []
+                    if roster != current:
+                        ops.append(('update', 'classes', class_id, {'student_uids': roster, 'student_count': len(roster)}))
+                    for uid, data in students.items():
+                        class_ids = list(data.get('class_ids', []))
+                        if add and class_id not in class_ids:
+                            ops.append(('update', 'users', uid, {'class_ids': class_ids + [class_id]}))
+                        elif not add and class_id in class_ids:
+                            ops.append(('update', 'users', uid, {'class_ids': [c for c in class_ids if c != class_id]}))
+                    return ops
+
+                self.db.transact(write)
+                return found
+            else:
+                # Firebase - one get for the class, one batched get for the students
+                class_ref = self.db.collection('classes').document(class_id)
+                student_refs = [self.db.collection('users').document(uid) for uid in student_uids]
+
+                def write(transaction) -> bool:
+                    class_doc = class_ref.get(transaction=transaction)
+                    existing = [doc for doc in self.db.get_all(student_refs, transaction=transaction) if doc.exists]
+                    if not class_doc.exists or len(existing) != len(student_uids):
+                        return False
+
+                    current = class_doc.to_dict().get('student_uids', [])
+                    roster = _roster(list(current), student_uids, add)
+                    if roster != current:
+                        transaction.update(class_ref, {"student_uids": roster, "student_count": len(roster)})
+                    # ArrayUnion/ArrayRemove are idempotent, so every student's side is written
+                    for ref in student_refs:
+                        transaction.update(ref, {
+                            "class_ids": firestore.ArrayUnion([class_id]) if add else firestore.ArrayRemove([class_id])
+                        })
+                    return True
+
+                return run_transaction(self.db, write)
+        except Exception:
+            return False
+
+def _roster(current: List[str], student_uids: List[str], add: bool) -> List[str]:
+    """A class's student list after adding or removing student_uids"""
+    if add:
+        return current + [uid for uid in student_uids if uid not in current]
+    return [uid for uid in current if uid not in student_uids]
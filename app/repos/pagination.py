@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from google.cloud import firestore
+from ..deps.mock_db import MockQuery
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values: List[Any], doc_id: str) -> str:
+    """Pack the sort values and ID of the last item on a page into an opaque token"""
+    payload = {
+        'v': [{'$dt': v.isoformat()} if isinstance(v, datetime) else v for v in values],
+        'id': doc_id,
+    }
+    raw = json.dumps(payload, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[List[Any], str]:
+    """Unpack a token from encode_cursor; raises InvalidCursor if it was tampered with"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values, doc_id = payload['v'], payload['id']
+        if not isinstance(values, list) or not isinstance(doc_id, str):
+            raise InvalidCursor("Invalid cursor")
+        return [datetime.fromisoformat(v['$dt']) if isinstance(v, dict) else v for v in values], doc_id
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise InvalidCursor("Invalid cursor")
+
+def fetch_page(query, limit: int, cursor: Optional[str] = None, order_field: Optional[str] = None,
+               direction: str = firestore.Query.ASCENDING) -> Tuple[list, Optional[str]]:
+    """Run one page of a filtered query, ordered by order_field then document ID.
+
+    Takes a local store query (results are dicts) or a Firestore query
+    (results are snapshots) and returns the raw results with the cursor of
+    the next page, or None on the last one.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    fields = [order_field] if order_field else []
+    local = isinstance(query, MockQuery)
+    for field in fields:
+        query = query.order_by(field, direction=direction)
+    if not local:
+        # Local stores always break ties by ID; Firestore needs it spelled out
+        query = query.order_by('__name__', direction=direction if fields else firestore.Query.ASCENDING)
+    if cursor:
+        values, doc_id = decode_cursor(cursor)
+        if len(values) != len(fields):
+            raise InvalidCursor("Invalid cursor")
+        position = dict(zip(fields, values))
+        position['id' if local else '__name__'] = doc_id
+        query = query.start_after(position)
+
+    # One extra result tells whether another page follows
+    results = list(query.limit(limit + 1).stream())
+    if len(results) <= limit:
+        return results, None
+    results = results[:limit]
+    last = results[-1]
+    if local:
+        return results, encode_cursor([last.get(f) for f in fields], last['id'])
+    return results, encode_cursor([last.get(f) for f in fields], last.id)
@@ -0,0 +1,572 @@
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from ..deps.executor import run_blocking
+from ..deps.firebase import get_db
+from ..deps.mock_db import MockQuery, MockWriteBatch, freeze
+from .base import run_transaction
+
+class SessionStore:
+    """Request-scoped view of a local store (MockDatabase or SQLiteDatabase).
+
+    Documents read by ID or by query are kept in an identity map, so reading
+    them again costs nothing. Writes are buffered and later reads of the same
+    document see them; flush() sends everything to the store as one batch.
+    Read-modify-write steps (transact(), e.g. Firestore transforms through
+    the fake client) are buffered as functions and run again at flush
+    inside the store's transaction, so they apply to current data rather
+    than to what this session read earlier.
+    A query on a collection with buffered writes flushes first.
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._lock = threading.RLock()
+        self._docs: Dict[Tuple[str, str], Optional[Mapping[str, Any]]] = {}
+        self._queries: Dict[Tuple, List[Mapping[str, Any]]] = {}
+        # Each step maps a document getter to the operations to write
+        self._steps: List[Callable[[Callable[[str, str], Optional[Mapping[str, Any]]]], List[Tuple]]] = []
+        self._dirty: set = set()
+        self._flush_callbacks: List[Callable[[], None]] = []
+
+    def has_pending_writes(self) -> bool:
+        return bool(self._steps)
+
+    def on_flush(self, callback: Callable[[], None]):
+        """Run callback after the buffered writes have been sent"""
+        with self._lock:
+            self._flush_callbacks.append(callback)
+
+    def _remember(self, collection: str, doc_data: Mapping[str, Any]):
+        key = (collection, doc_data.get('id'))
+        if key not in self._dirty:
+            self._docs[key] = doc_data
+
+    # Reads
+
+    def get_document(self, collection: str, doc_id: str) -> Optional[Mapping[str, Any]]:
+        with self._lock:
+            key = (collection, doc_id)
+            if key not in self._docs:
+                self._docs[key] = self._store.get_document(collection, doc_id)
+            return self._docs[key]
+
+    def get_documents(self, collection: str, doc_ids: List[str]) -> Dict[str, Mapping[str, Any]]:
+        with self._lock:
+            missing = [doc_id for doc_id in dict.fromkeys(doc_ids) if (collection, doc_id) not in self._docs]
+            if missing:
+                found = self._store.get_documents(collection, missing)
+                for doc_id in missing:
+                    self._docs[(collection, doc_id)] = found.get(doc_id)
+            return {
+                doc_id: self._docs[(collection, doc_id)]
+                for doc_id in doc_ids if self._docs[(collection, doc_id)] is not None
+            }
+
+    def _cached_query(self, key: Tuple, run, partial: bool = False) -> List[Mapping[str, Any]]:
+        with self._lock:
+            collection = key[0]
+            if any(c == collection for c, _ in self._dirty):
+                self.flush()
+            if key not in self._queries:
+                results = run()
+                # Projected results are not whole documents
+                for doc_data in results if not partial else ():
+                    self._remember(collection, doc_data)
+                self._queries[key] = results
+            return list(self._queries[key])
+
+    def query(self, collection: str) -> MockQuery:
+        return MockQuery(self, collection)
+
+    def _run_query(self, query: MockQuery) -> List[Mapping[str, Any]]:
+        key = (query.collection, 'query', repr(query.filters), repr(query.orders), query.limit_count,
+               json.dumps(query.cursor, sort_keys=True, default=str), query.projection)
+        return self._cached_query(key, lambda: self._store._run_query(query), query.projection is not None)
+
+    def _aggregate(self, query: MockQuery, aggregations: Iterable[Tuple[str, Optional[str], str]]) -> Dict[str, Any]:
+        # Aggregates are computed by the store, so buffered writes must reach it first
+        with self._lock:
+            if any(c == query.collection for c, _ in self._dirty):
+                self.flush()
+        return self._store._aggregate(query, aggregations)
+
+    def query_documents(self, collection: str, field: str, operator: str, value: Any) -> List[Mapping[str, Any]]:
+        key = (collection, 'query_documents', field, operator, repr(value))
+        return self._cached_query(key, lambda: self._store.query_documents(collection, field, operator, value))
+
+    def get_all_documents(self, collection: str) -> List[Mapping[str, Any]]:
+        return self._cached_query((collection, 'all'), lambda: self._store.get_all_documents(collection))
+
+    # Writes
+
+    def _new_id(self, collection: str) -> str:
+        return self._store._new_id(collection)
+
+    def batch(self) -> MockWriteBatch:
+        return MockWriteBatch(self)
+
+    def _commit(self, ops: List[Tuple[str, str, str, Optional[Dict[str, Any]]]]):
+        """Buffer a batch's operations and apply them to the identity map"""
+        with self._lock:
+            self._stage(ops)
+            self._steps.append(lambda get: ops)
+
+    def _stage(self, ops: List[Tuple[str, str, str, Optional[Dict[str, Any]]]]):
+        with self._lock:
+            # Validate everything first so a failing batch buffers nothing
+            exists: Dict[Tuple[str, str], bool] = {}
+            for op, collection, doc_id, _ in ops:
+                key = (collection, doc_id)
+                present = exists[key] if key in exists else self.get_document(collection, doc_id) is not None
+                if op == 'update' and not present:
+                    raise KeyError(f"No document to update: {collection}/{doc_id}")
+                exists[key] = op != 'delete'
+            for op, collection, doc_id, data in ops:
+                key = (collection, doc_id)
+                if op == 'set':
+                    self._docs[key] = freeze(data)
+                elif op == 'update':
+                    self._docs[key] = freeze({**self._docs[key], **data})
+                else:
+                    self._docs[key] = None
+                self._dirty.add(key)
+                self._queries = {k: v for k, v in self._queries.items() if k[0] != collection}
+
+    def transact(self, fn: Callable[[Callable[[str, str], Optional[Mapping[str, Any]]]], List[Tuple[str, str, str, Optional[Dict[str, Any]]]]]):
+        """Run fn(get_document) against this session's view so later reads see
+        its writes, and buffer fn itself to run again at flush"""
+        with self._lock:
+            ops = fn(self.get_document)
+            if ops:
+                self._stage(ops)
+            self._steps.append(fn)
+
+    def create_document(self, collection: str, data: Dict[str, Any]) -> str:
+        batch = self.batch()
+        doc_id = batch.create(collection, data)
+        batch.commit()
+        return doc_id
+
+    def update_document(self, collection: str, doc_id: str, updates: Dict[str, Any]) -> bool:
+        with self._lock:
+            if self.get_document(collection, doc_id) is None:
+                return False
+            self._commit([('update', collection, doc_id, updates)])
+            return True
+
+    def delete_document(self, collection: str, doc_id: str) -> bool:
+        with self._lock:
+            if self.get_document(collection, doc_id) is None:
+                return False
+            self._commit([('delete', collection, doc_id, None)])
+            return True
+
+    def create_documents(self, collection: str, docs: List[Dict[str, Any]]) -> List[str]:
+        batch = self.batch()
+        doc_ids = [batch.create(collection, data) for data in docs]
+        batch.commit()
+        return doc_ids
+
+    def update_documents(self, collection: str, updates: Dict[str, Dict[str, Any]]) -> bool:
+        batch = self.batch()
+        for doc_id, doc_updates in updates.items():
+            batch.update(collection, doc_id, doc_updates)
+        try:
+            batch.commit()
+            return True
+        except KeyError:
+            return False
+
+    def flush(self):
+        """Send buffered writes to the store in one transaction"""
+        with self._lock:
+            steps, self._steps = self._steps, []
+            callbacks, self._flush_callbacks = self._flush_callbacks, []
+            if steps:
+                self._store.transact(lambda get: _replay(steps, get))
+            # Re-read flushed documents from the store next time
+            for key in self._dirty:
+                self._docs.pop(key, None)
+            self._dirty = set()
+            for callback in callbacks:
+                callback()
+
+    def discard(self):
+        with self._lock:
+            for key in self._dirty:
+                self._docs.pop(key, None)
+            self._steps, self._dirty = [], set()
+            self._queries = {}
+            self._flush_callbacks = []
+
+def _replay(steps: List[Callable], get: Callable[[str, str], Optional[Mapping[str, Any]]]) -> List[Tuple]:
+    """Run buffered steps against current store data, each one reading the
+    writes of the steps before it"""
+    written: Dict[Tuple[str, str], Optional[Mapping[str, Any]]] = {}
+
+    def read(collection: str, doc_id: str) -> Optional[Mapping[str, Any]]:
+        key = (collection, doc_id)
+        return written[key] if key in written else get(collection, doc_id)
+
+    ops: List[Tuple] = []
+    for step in steps:
+        for op, collection, doc_id, data in step(read):
+            key = (collection, doc_id)
+            if op == 'set':
+                written[key] = data
+            elif op == 'update':
+                current = read(collection, doc_id)
+                # A missing document is left for the store to reject
+                written[key] = {**current, **data} if current is not None else None
+            else:
+                written[key] = None
+            ops.append((op, collection, doc_id, data))
+    return ops
+
+def _cache_key(value: Any) -> Optional[str]:
+    text = repr(value)
+    # Objects without a value-based repr can't be told apart safely
+    return None if ' at 0x' in text else text
+
+class _SessionQuery:
+    def __init__(self, session: "SessionClient", query, collection_id: str, key: Optional[Tuple] = (),
+                 partial: bool = False):
+        self._session = session
+        self._query = query
+        self._collection_id = collection_id
+        self._key = key
+        self._partial = partial
+
+    def _chain(self, method: str, *args: Any, **kwargs: Any) -> "_SessionQuery":
+        args = tuple(a._snapshot if isinstance(a, _SessionSnapshot) else a for a in args)
+        part = _cache_key((method, args, sorted(kwargs.items())))
+        key = self._key + (part,) if self._key is not None and part is not None else None
+        return _SessionQuery(self._session, getattr(self._query, method)(*args, **kwargs), self._collection_id, key,
+                             self._partial or method == 'select')
+
+    def where(self, *args: Any, **kwargs: Any) -> "_SessionQuery":
+        return self._chain('where', *args, **kwargs)
+
+    def order_by(self, *args: Any, **kwargs: Any) -> "_SessionQuery":
+        return self._chain('order_by', *args, **kwargs)
+
+    def limit(self, *args: Any, **kwargs: Any) -> "_SessionQuery":
+        return self._chain('limit', *args, **kwargs)
+
+    def start_after(self, *args: Any, **kwargs: Any) -> "_SessionQuery":
+        return self._chain('start_after', *args, **kwargs)
+
+    def select(self, field_paths: Any) -> "_SessionQuery":
+        return self._chain('select', tuple(field_paths))
+
+    def stream(self):
+        return iter(self._session._run_query(self))
+
+    def get(self) -> List[Any]:
+        return self._session._run_query(self)
+
+    def count(self, alias: Optional[str] = None) -> "_SessionAggregation":
+        return _SessionAggregation(self._session, self._query.count(alias), self._collection_id)
+
+    def sum(self, field_path: str, alias: Optional[str] = None) -> "_SessionAggregation":
+        return _SessionAggregation(self._session, self._query.sum(field_path, alias), self._collection_id)
+
+    def avg(self, field_path: str, alias: Optional[str] = None) -> "_SessionAggregation":
+        return _SessionAggregation(self._session, self._query.avg(field_path, alias), self._collection_id)
+
+class _SessionAggregation:
+    """Aggregation query that sends the collection's buffered writes before running"""
+
+    def __init__(self, session: "SessionClient", query, collection_id: str):
+        self._session = session
+        self._query = query
+        self._collection_id = collection_id
+
+    def count(self, alias: Optional[str] = None) -> "_SessionAggregation":
+        return _SessionAggregation(self._session, self._query.count(alias), self._collection_id)
+
+    def sum(self, field_path: str, alias: Optional[str] = None) -> "_SessionAggregation":
+        return _SessionAggregation(self._session, self._query.sum(field_path, alias), self._collection_id)
+
+    def avg(self, field_path: str, alias: Optional[str] = None) -> "_SessionAggregation":
+        return _SessionAggregation(self._session, self._query.avg(field_path, alias), self._collection_id)
+
+    def get(self) -> List[Any]:
+        with self._session._lock:
+            if self._collection_id in self._session._dirty_collections:
+                self._session.flush()
+        return self._query.get()
+
+class _SessionSnapshot:
+    """Cached document snapshot; to_dict() returns a fresh copy every time"""
+
+    def __init__(self, snapshot, reference: "_SessionDocument"):
+        self._snapshot = snapshot
+        self.reference = reference
+        self.id = snapshot.id
+        self.exists = snapshot.exists
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return self._snapshot.to_dict()
+
+    def get(self, field_path: str) -> Any:
+        return self._snapshot.get(field_path)
+
+class _SessionDocument:
+    def __init__(self, session: "SessionClient", ref):
+        self._session = session
+        self._ref = ref
+        self.id = ref.id
+        self.path = ref.path
+
+    def get(self, transaction: Optional["_SessionTransaction"] = None) -> _SessionSnapshot:
+        if transaction is not None:
+            return transaction.get_document(self)
+        return self._session._get_document(self._ref)
+
+    def create(self, document_data: Dict[str, Any]):
+        self._session._buffer([('create', self._ref, document_data, {})])
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        self._session._buffer([('set', self._ref, document_data, {'merge': merge})])
+
+    def update(self, field_updates: Dict[str, Any]):
+        self._session._buffer([('update', self._ref, field_updates, {})])
+
+    def delete(self):
+        self._session._buffer([('delete', self._ref, None, {})])
+
+class _SessionCollection(_SessionQuery):
+    def __init__(self, session: "SessionClient", collection):
+        super().__init__(session, collection, collection.id)
+        self.id = collection.id
+
+    def document(self, document_id: Optional[str] = None) -> _SessionDocument:
+        ref = self._query.document(document_id) if document_id is not None else self._query.document()
+        return _SessionDocument(self._session, ref)
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return None, ref
+
+class _SessionBatch:
+    def __init__(self, session: "SessionClient"):
+        self._session = session
+        self._writes: List[Tuple[str, Any, Optional[Dict[str, Any]], Dict[str, Any]]] = []
+
+    def create(self, reference: _SessionDocument, document_data: Dict[str, Any]):
+        self._writes.append(('create', reference._ref, document_data, {}))
+
+    def set(self, reference: _SessionDocument, document_data: Dict[str, Any], merge: bool = False):
+        self._writes.append(('set', reference._ref, document_data, {'merge': merge}))
+
+    def update(self, reference: _SessionDocument, field_updates: Dict[str, Any]):
+        self._writes.append(('update', reference._ref, field_updates, {}))
+
+    def delete(self, reference: _SessionDocument):
+        self._writes.append(('delete', reference._ref, None, {}))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._session._buffer(writes)
+
+class _SessionTransaction(_SessionBatch):
+    """Handed to run_transaction() callbacks. In the first run reads come from
+    the session; at flush they are made in a Firestore transaction, which
+    then gets the callback's writes."""
+
+    def __init__(self, session: "SessionClient", transaction=None):
+        super().__init__(session)
+        self._transaction = transaction
+
+    def get_document(self, reference: _SessionDocument) -> _SessionSnapshot:
+        if self._transaction is None:
+            return self._session._get_document(reference._ref)
+        return _SessionSnapshot(reference._ref.get(transaction=self._transaction), reference)
+
+    def get_all(self, references: List[_SessionDocument]) -> List[_SessionSnapshot]:
+        if self._transaction is None:
+            return self._session.get_all(references)
+        snapshots = self._session._client.get_all([ref._ref for ref in references], transaction=self._transaction)
+        return [_SessionSnapshot(s, _SessionDocument(self._session, s.reference)) for s in snapshots]
+
+class SessionClient:
+    """Request-scoped wrapper around the Firestore client.
+
+    Snapshots read by ID or by query are cached for the request, and writes
+    collect into a single WriteBatch sent by flush(). Field transforms
+    (ArrayUnion, SERVER_TIMESTAMP, ...) are resolved by the server, so reading a
+    document or querying a collection with buffered writes flushes first.
+    run_transaction() callbacks run once for their result and again at flush,
+    in a Firestore transaction, in order with the other buffered writes.
+    """
+
+    # Firestore's limit on writes per batch
+    MAX_BATCH_WRITES = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Any] = {}
+        self._queries: Dict[Tuple, List[Any]] = {}
+        # Buffered writes, and run_transaction() callbacks to run at flush
+        self._writes: List[Any] = []
+        self._dirty_docs: set = set()
+        self._dirty_collections: set = set()
+        self._flush_callbacks: List[Callable[[], None]] = []
+
+    def has_pending_writes(self) -> bool:
+        return bool(self._writes)
+
+    def on_flush(self, callback: Callable[[], None]):
+        """Run callback after the buffered writes have been sent"""
+        with self._lock:
+            self._flush_callbacks.append(callback)
+
+    def collection(self, collection_id: str) -> _SessionCollection:
+        return _SessionCollection(self, self._client.collection(collection_id))
+
+    def document(self, document_path: str) -> _SessionDocument:
+        return _SessionDocument(self, self._client.document(document_path))
+
+    def batch(self) -> _SessionBatch:
+        return _SessionBatch(self)
+
+    def _get_document(self, ref) -> _SessionSnapshot:
+        with self._lock:
+            if ref.path in self._dirty_docs:
+                self.flush()
+            if ref.path not in self._docs:
+                self._docs[ref.path] = ref.get()
+            return _SessionSnapshot(self._docs[ref.path], _SessionDocument(self, ref))
+
+    def get_all(self, references: List[_SessionDocument], transaction: Optional[_SessionTransaction] = None):
+        if transaction is not None:
+            return transaction.get_all(references)
+        with self._lock:
+            refs = [ref._ref for ref in references]
+            if any(ref.path in self._dirty_docs for ref in refs):
+                self.flush()
+            missing = list({ref.path: ref for ref in refs if ref.path not in self._docs}.values())
+            if missing:
+                for snapshot in self._client.get_all(missing):
+                    self._docs[snapshot.reference.path] = snapshot
+            return [_SessionSnapshot(self._docs[ref.path], _SessionDocument(self, ref)) for ref in refs]
+
+    def _run_query(self, query: _SessionQuery) -> List[_SessionSnapshot]:
+        with self._lock:
+            if query._collection_id in self._dirty_collections:
+                self.flush()
+            key = (query._collection_id,) + query._key if query._key is not None else None
+            snapshots = self._queries.get(key) if key is not None else None
+            if snapshots is None:
+                snapshots = list(query._query.stream())
+                # Projected snapshots are not whole documents
+                for snapshot in snapshots if not query._partial else ():
+                    self._docs.setdefault(snapshot.reference.path, snapshot)
+                if key is not None:
+                    self._queries[key] = snapshots
+            return [_SessionSnapshot(s, _SessionDocument(self, s.reference)) for s in snapshots]
+
+    def _mark_dirty(self, refs: Iterable[Any]):
+        with self._lock:
+            for ref in refs:
+                self._dirty_docs.add(ref.path)
+                self._dirty_collections.add(ref.parent.id)
+                self._docs.pop(ref.path, None)
+            self._queries = {k: v for k, v in self._queries.items() if k[0] not in self._dirty_collections}
+
+    def _buffer(self, writes: List[Tuple[str, Any, Optional[Dict[str, Any]], Dict[str, Any]]]):
+        with self._lock:
+            self._mark_dirty(ref for _, ref, _, _ in writes)
+            self._writes.extend(writes)
+
+    def run_transaction(self, fn: Callable[[_SessionTransaction], Any]) -> Any:
+        """Run fn(transaction) against this session for its result, and buffer
+        it to run again in a Firestore transaction at flush"""
+        with self._lock:
+            transaction = _SessionTransaction(self)
+            result = fn(transaction)
+            # The first run's writes are dropped; reading those documents
+            # again flushes, which makes them for real
+            self._mark_dirty(ref for _, ref, _, _ in transaction._writes)
+            self._writes.append(fn)
+            return result
+
+    def _transact(self, fn: Callable[[_SessionTransaction], Any]):
+        def attempt(transaction):
+            session_transaction = _SessionTransaction(self, transaction)
+            fn(session_transaction)
+            for op, ref, data, kwargs in session_transaction._writes:
+                if op == 'delete':
+                    transaction.delete(ref)
+                else:
+                    getattr(transaction, op)(ref, data, **kwargs)
+
+        run_transaction(self._client, attempt)
+
+    def _send(self, writes: List[Tuple[str, Any, Optional[Dict[str, Any]], Dict[str, Any]]]):
+        for start in range(0, len(writes), self.MAX_BATCH_WRITES):
+            batch = self._client.batch()
+            for op, ref, data, kwargs in writes[start:start + self.MAX_BATCH_WRITES]:
+                if op == 'delete':
+                    batch.delete(ref)
+                else:
+                    getattr(batch, op)(ref, data, **kwargs)
+            batch.commit()
+
+    def flush(self):
+        """Send buffered writes as one WriteBatch (chunked at Firestore's limit);
+        buffered transactions run in order between the batches"""
+        with self._lock:
+            writes, self._writes = self._writes, []
+            callbacks, self._flush_callbacks = self._flush_callbacks, []
+            pending = []
+            for write in writes:
+                if callable(write):
+                    self._send(pending)
+                    pending = []
+                    self._transact(write)
+                else:
+                    pending.append(write)
+            self._send(pending)
+            self._dirty_docs, self._dirty_collections = set(), set()
+            for callback in callbacks:
+                callback()
+
+    def discard(self):
+        with self._lock:
+            self._writes = []
+            for path in self._dirty_docs:
+                self._docs.pop(path, None)
+            self._dirty_docs, self._dirty_collections = set(), set()
+            self._queries = {}
+            self._flush_callbacks = []
+
+class Session:
+    """Unit of work for one request: repositories built with session.db share
+    its identity map, and their writes are sent together by commit()."""
+
+    def __init__(self, db=None):
+        db = db if db is not None else get_db()
+        self.db = SessionStore(db) if hasattr(db, 'create_document') else SessionClient(db)
+
+    async def commit(self):
+        await run_blocking(self.db.flush)
+
+    def rollback(self):
+        self.db.discard()
+
+async def get_session():
+    """FastAPI dependency: a Session per request, flushed if the endpoint
+    did not commit it and discarded if the endpoint raised"""
+    session = Session()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    else:
+        await session.commit()
@@ -1,19 +1,21 @@
 from typing import List, Optional
 from google.cloud import firestore
 from ..models.schemas import StudentTeacherRelation, CreateStudentTeacherRelationRequest
-from ..deps.firebase import get_db
+from .base import BaseRepository, invalidates, offload, run_transaction
+from .decoding import relation_codec
 from datetime import datetime
 
-class StudentTeacherRelationsRepository:
-    def __init__(self):
-        self.db = get_db()
+class StudentTeacherRelationsRepository(BaseRepository):
+    def __init__(self, db=None):
+        super().__init__(db)
         # Check if it's mock database
         if hasattr(self.db, 'create_document'):
             self.collection = None  # Mock database doesn't need collection
         else:
             self.collection = self.db.collection('student_teacher_relations')
     
-    async def create_relation(self, relation_data: CreateStudentTeacherRelationRequest, student_uid: str) -> str:
+    @offload
+    def create_relation(self, relation_data: CreateStudentTeacherRelationRequest, student_uid: str) -> str:
         """Create a new student-teacher relation request"""
         relation_doc = {
             "student_uid": student_uid,
@@ -31,38 +33,31 @@ class StudentTeacherRelationsRepository:
             doc_ref.set(relation_doc)
             return doc_ref.id
     
-    async def get_relation(self, relation_id: str) -> Optional[StudentTeacherRelation]:
+    @offload
+    def get_relation(self, relation_id: str) -> Optional[StudentTeacherRelation]:
         """Get relation by ID"""
         if hasattr(self.db, 'get_document'):
             # Mock database
             data = self.db.get_document('student_teacher_relations', relation_id)
             if data:
-                data['id'] = relation_id
-                data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                return StudentTeacherRelation(**data)
+                return relation_codec.decode(data, relation_id)
             return None
         else:
             # Firebase
             doc = self.collection.document(relation_id).get()
             if doc.exists:
-                data = doc.to_dict()
-                data['id'] = relation_id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                return StudentTeacherRelation(**data)
+                return relation_codec.from_snapshot(doc)
             return None
     
-    async def get_student_relations(self, student_uid: str) -> List[StudentTeacherRelation]:
+    @offload
+    def get_student_relations(self, student_uid: str) -> List[StudentTeacherRelation]:
         """Get all relations for a student"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_relations = self.db.get_all_documents('student_teacher_relations')
+            query = self.db.query('student_teacher_relations').where("student_uid", "==", student_uid)
             relations = []
-            for data in all_relations:
-                if data.get('student_uid') == student_uid:
-                    data['id'] = data.get('id', '')
-                    data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    relations.append(StudentTeacherRelation(**data))
+            for data in query.stream():
+                relations.append(relation_codec.decode(data))
             return relations
         else:
             # Firebase
@@ -70,25 +65,19 @@ class StudentTeacherRelationsRepository:
             relations = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                relations.append(StudentTeacherRelation(**data))
+                relations.append(relation_codec.from_snapshot(doc))
             
             return relations
     
-    async def get_teacher_relations(self, teacher_uid: str) -> List[StudentTeacherRelation]:
+    @offload
+    def get_teacher_relations(self, teacher_uid: str) -> List[StudentTeacherRelation]:
         """Get all relations for a teacher"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_relations = self.db.get_all_documents('student_teacher_relations')
+            query = self.db.query('student_teacher_relations').where("teacher_uid", "==", teacher_uid)
             relations = []
-            for data in all_relations:
-                if data.get('teacher_uid') == teacher_uid:
-                    data['id'] = data.get('id', '')
-                    data['created_at'] = datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    relations.append(StudentTeacherRelation(**data))
+            for data in query.stream():
+                relations.append(relation_codec.decode(data))
             return relations
         else:
             # Firebase
@@ -96,15 +85,12 @@ class StudentTeacherRelationsRepository:
             relations = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['id'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                relations.append(StudentTeacherRelation(**data))
+                relations.append(relation_codec.from_snapshot(doc))
             
             return relations
     
-    async def update_relation(self, relation_id: str, updates: dict) -> bool:
+    @offload
+    def update_relation(self, relation_id: str, updates: dict) -> bool:
         """Update relation"""
         if hasattr(self.db, 'update_document'):
             # Mock database
@@ -121,20 +107,67 @@ class StudentTeacherRelationsRepository:
             except Exception:
                 return False
     
-    async def accept_relation(self, relation_id: str) -> bool:
+    @offload
+    @invalidates('users')
+    def accept_relation(self, relation_id: str) -> bool:
         """Accept a relation request"""
         updates = {
             "status": "accepted",
             "accepted_at": datetime.now()
         }
-        return await self.update_relation(relation_id, updates)
+        return self._change_status(relation_id, updates)
     
-    async def reject_relation(self, relation_id: str) -> bool:
+    @offload
+    @invalidates('users')
+    def reject_relation(self, relation_id: str) -> bool:
         """Reject a relation request"""
         updates = {
             "status": "rejected"
         }
-        return await self.update_relation(relation_id, updates)
+        return self._change_status(relation_id, updates)
+    
+    def _change_status(self, relation_id: str, updates: dict) -> bool:
+        """Update a relation's status together with the teacher's accepted_student_count"""
+        try:
+            if hasattr(self.db, 'transact'):
+                # Mock database - the check and the write run under the store's transaction
+                found = False
+                
+                def write(get):
+                    nonlocal found
+                    relation = get('student_teacher_relations', relation_id)
+                    found = relation is not None
+                    if not found:
+                        return []
+                    ops = [('update', 'student_teacher_relations', relation_id, updates)]
+                    delta = (updates["status"] == "accepted") - (relation.get('status') == "accepted")
+                    teacher = get('users', relation['teacher_uid']) if delta else None
+                    if teacher:
+                        count = max(0, teacher.get('accepted_student_count', 0) + delta)
+                        ops.append(('update', 'users', relation['teacher_uid'], {'accepted_student_count': count}))
+                    return ops
+                
+                self.db.transact(write)
+                return found
+            else:
+                # Firebase
+                relation_ref = self.collection.document(relation_id)
+                
+                def write(transaction) -> bool:
+                    relation = relation_ref.get(transaction=transaction)
+                    if not relation.exists:
+                        return False
+                    relation = relation.to_dict()
+                    delta = (updates["status"] == "accepted") - (relation.get('status') == "accepted")
+                    transaction.update(relation_ref, updates)
+                    if delta:
+                        teacher_ref = self.db.collection('users').document(relation['teacher_uid'])
+                        transaction.update(teacher_ref, {"accepted_student_count": firestore.Increment(delta)})
+                    return True
+                
+                return run_transaction(self.db, write)
+        except Exception:
+            return False
     
     async def get_accepted_students_for_teacher(self, teacher_uid: str) -> List[str]:
         """Get list of student UIDs who have accepted relations with the teacher"""
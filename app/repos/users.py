@@ -1,19 +1,22 @@
 from typing import List, Optional
 from google.cloud import firestore
-from ..models.schemas import UserProfile, CreateUserRequest
-from ..deps.firebase import get_db
-from datetime import datetime
+from ..models.schemas import UserProfile, CreateUserRequest, Page
+from .base import BaseRepository, invalidates, offload
+from .decoding import user_codec
+from .pagination import DEFAULT_PAGE_SIZE, fetch_page
 
-class UsersRepository:
-    def __init__(self):
-        self.db = get_db()
+class UsersRepository(BaseRepository):
+    def __init__(self, db=None):
+        super().__init__(db)
         # Check if it's mock database
         if hasattr(self.db, 'create_document'):
             self.collection = None  # Mock database doesn't need collection
         else:
             self.collection = self.db.collection('users')
     
-    async def create_user(self, user_data: CreateUserRequest) -> str:
+    @offload
+    @invalidates('users')
+    def create_user(self, user_data: CreateUserRequest) -> str:
         """Create a new user in Firestore"""
         user_doc = {
             "role": user_data.role,
@@ -35,49 +38,59 @@ class UsersRepository:
             doc_ref.set(user_doc)
             return doc_ref.id
     
-    async def get_user(self, uid: str) -> Optional[UserProfile]:
+    @offload
+    def get_user(self, uid: str) -> Optional[UserProfile]:
         """Get user by UID"""
+        if hasattr(self.db, 'get_document'):
+            # Mock database
+            data = self.db.get_document('users', uid)
+            if data:
+                return user_codec.decode(data, uid)
+            return None
         doc = self.collection.document(uid).get()
         if doc.exists:
-            data = doc.to_dict()
-            data['uid'] = uid
-            # Convert Firestore timestamp to datetime
-            if 'created_at' in data:
-                data['created_at'] = data['created_at'].replace(tzinfo=None)
-            return UserProfile(**data)
+            return user_codec.from_snapshot(doc)
         return None
     
-    async def update_user(self, uid: str, updates: dict) -> bool:
+    @offload
+    def get_users_by_ids(self, uids: List[str]) -> List[UserProfile]:
+        """Get many users in one round trip, in the given order (unknown UIDs are skipped)"""
+        uids = list(dict.fromkeys(uids))
+        if not uids:
+            return []
+        if hasattr(self.db, 'get_documents'):
+            # Mock database
+            users = {uid: user_codec.decode(data, uid) for uid, data in self.db.get_documents('users', uids).items()}
+        else:
+            # Firebase - a single batched get for every UID
+            users = {}
+            for doc in self.db.get_all([self.collection.document(uid) for uid in uids]):
+                if doc.exists:
+                    users[doc.id] = user_codec.from_snapshot(doc)
+        return [users[uid] for uid in uids if uid in users]
+    
+    @offload
+    @invalidates('users')
+    def update_user(self, uid: str, updates: dict) -> bool:
         """Update user document"""
         try:
+            if hasattr(self.db, 'update_document'):
+                # Mock database
+                return self.db.update_document('users', uid, updates)
             self.collection.document(uid).update(updates)
             return True
         except Exception:
             return False
     
-    async def get_students_in_class(self, class_id: str) -> List[UserProfile]:
+    @offload
+    def get_students_in_class(self, class_id: str) -> List[UserProfile]:
         """Get all students in a specific class"""
         if hasattr(self.db, 'query_documents'):
-            # Mock database - get all students first, then filter
-            all_users = self.db.get_all_documents('users')
+            # Mock database
+            query = self.db.query('users').where("role", "==", "student").where("class_ids", "array_contains", class_id)
             students = []
-            for data in all_users:
-                if (data.get('role') == 'student' and 
-                    'class_ids' in data and 
-                    class_id in data.get('class_ids', [])):
-                    # Convert mock database format to UserProfile format
-                    student_data = {
-                        'uid': data.get('id', ''),
-                        'display_name': data.get('display_name', ''),
-                        'email': data.get('email', ''),
-                        'grade': data.get('grade', 5),
-                        'role': data.get('role', 'student'),
-                        'class_ids': data.get('class_ids', []),
-                        'guardian_of': data.get('guardian_of', []),
-                        'disabled': data.get('disabled', False),
-                        'created_at': datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    }
-                    students.append(UserProfile(**student_data))
+            for data in query.stream():
+                students.append(user_codec.decode(data))
             return students
         else:
             # Firebase
@@ -85,36 +98,20 @@ class UsersRepository:
             students = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['uid'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                students.append(UserProfile(**data))
+                students.append(user_codec.from_snapshot(doc))
             
             return students
     
-    async def get_available_students(self) -> List[UserProfile]:
+    @offload
+    def get_available_students(self) -> List[UserProfile]:
         """Get all available students (not in any class)"""
         if hasattr(self.db, 'get_all_documents'):
-            # Mock database - get all students first, then filter
-            all_users = self.db.get_all_documents('users')
+            # Mock database - get all students, then filter those not in any class
+            query = self.db.query('users').where("role", "==", "student")
             students = []
-            for data in all_users:
-                if (data.get('role') == 'student' and 
-                    (not data.get('class_ids') or len(data.get('class_ids', [])) == 0)):
-                    # Convert mock database format to UserProfile format
-                    student_data = {
-                        'uid': data.get('id', ''),
-                        'display_name': data.get('display_name', ''),
-                        'email': data.get('email', ''),
-                        'grade': data.get('grade', 5),
-                        'role': data.get('role', 'student'),
-                        'class_ids': data.get('class_ids', []),
-                        'guardian_of': data.get('guardian_of', []),
-                        'disabled': data.get('disabled', False),
-                        'created_at': datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    }
-                    students.append(UserProfile(**student_data))
+            for data in query.stream():
+                if not data.get('class_ids') or len(data.get('class_ids', [])) == 0:
+                    students.append(user_codec.decode(data))
             return students
         else:
             # Firebase - get all students, then filter those not in any class
@@ -122,73 +119,37 @@ class UsersRepository:
             students = []
             
             for doc in query.stream():
-                data = doc.to_dict()
-                data['uid'] = doc.id
+                student = user_codec.from_snapshot(doc)
                 # Only include students not in any class
-                if not data.get('class_ids') or len(data.get('class_ids', [])) == 0:
-                    if 'created_at' in data:
-                        data['created_at'] = data['created_at'].replace(tzinfo=None)
-                    students.append(UserProfile(**data))
+                if not student.class_ids:
+                    students.append(student)
             
             return students
     
-    async def add_student_to_class(self, student_uid: str, class_id: str) -> bool:
-        """Add student to a class"""
-        if hasattr(self.db, 'update_document'):
-            # Mock database
-            try:
-                student_data = self.db.get_document('users', student_uid)
-                if student_data:
-                    current_class_ids = student_data.get('class_ids', [])
-                    if class_id not in current_class_ids:
-                        current_class_ids.append(class_id)
-                        self.db.update_document('users', student_uid, {'class_ids': current_class_ids})
-                    return True
-                return False
-            except Exception:
-                return False
-        else:
-            # Firebase
-            try:
-                student_ref = self.collection.document(student_uid)
-                student_ref.update({
-                    "class_ids": firestore.ArrayUnion([class_id])
-                })
-                return True
-            except Exception:
-                return False
-    
-    async def remove_student_from_class(self, student_uid: str, class_id: str) -> bool:
-        """Remove student from a class"""
-        if hasattr(self.db, 'update_document'):
-            # Mock database
-            try:
-                student_data = self.db.get_document('users', student_uid)
-                if student_data:
-                    current_class_ids = student_data.get('class_ids', [])
-                    if class_id in current_class_ids:
-                        current_class_ids.remove(class_id)
-                        self.db.update_document('users', student_uid, {'class_ids': current_class_ids})
-                    return True
-                return False
-            except Exception:
-                return False
-        else:
-            # Firebase
-            try:
-                student_ref = self.collection.document(student_uid)
-                student_ref.update({
-                    "class_ids": firestore.ArrayRemove([class_id])
-                })
-                return True
-            except Exception:
-                return False
-    
-    async def bulk_create_students(self, students_data: List[dict], class_id: str) -> List[str]:
+    @offload
+    @invalidates('users')
+    def bulk_create_students(self, students_data: List[dict], class_id: str) -> List[str]:
         """Bulk create students from CSV data"""
         created_uids = []
         batch = self.db.batch()
         
+        if hasattr(self.db, 'create_document'):
+            # Mock database - one flush for the whole import
+            for student_data in students_data:
+                user_doc = {
+                    "role": "student",
+                    "display_name": student_data.get("name", ""),
+                    "email": student_data.get("email", ""),
+                    "grade": int(student_data.get("grade", 5)),
+                    "class_ids": [class_id],
+                    "guardian_of": [],
+                    "disabled": False
+                }
+                created_uids.append(batch.create('users', user_doc))
+            
+            batch.commit()
+            return created_uids
+        
         for student_data in students_data:
             doc_ref = self.collection.document()
             user_doc = {
@@ -207,21 +168,24 @@ class UsersRepository:
         batch.commit()
         return created_uids
 
-    async def get_all_teachers(self) -> List[dict]:
+    @offload
+    def get_all_teachers(self) -> List[dict]:
         """Get all teachers with basic information"""
+        return self._cached('users', 'teachers', self._fetch_all_teachers)
+    
+    def _fetch_all_teachers(self) -> List[dict]:
         if hasattr(self.db, 'get_all_documents'):
             # Mock database
-            all_users = self.db.get_all_documents('users')
+            query = self.db.query('users').where("role", "==", "teacher")
             teachers = []
-            for data in all_users:
-                if data.get('role') == 'teacher':
-                    teachers.append({
-                        'uid': data.get('id', ''),
-                        'display_name': data.get('display_name', ''),
-                        'email': data.get('email', ''),
-                        'student_count': len(data.get('student_relations', [])),
-                        'experience_years': data.get('experience_years', 'Belirtilmemiş')
-                    })
+            for data in query.stream():
+                teachers.append({
+                    'uid': data.get('id', ''),
+                    'display_name': data.get('display_name', ''),
+                    'email': data.get('email', ''),
+                    'student_count': data.get('accepted_student_count', 0),
+                    'experience_years': data.get('experience_years', 'Belirtilmemiş')
+                })
             return teachers
         else:
             # Firebase
@@ -234,47 +198,30 @@ class UsersRepository:
                     'uid': doc.id,
                     'display_name': data.get('display_name', ''),
                     'email': data.get('email', ''),
-                    'student_count': 0,  # This would need to be calculated from relations
+                    'student_count': data.get('accepted_student_count', 0),
                     'experience_years': data.get('experience_years', 'Belirtilmemiş')
                 })
             
             return teachers
 
-    async def get_all_students(self) -> List[UserProfile]:
-        """Get all students regardless of class status"""
+    @offload
+    def get_all_students(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None) -> Page[UserProfile]:
+        """Get one page of all students regardless of class status"""
         if hasattr(self.db, 'get_all_documents'):
             # Mock database - get all students
-            all_users = self.db.get_all_documents('users')
+            query = self.db.query('users').where("role", "==", "student")
+            results, next_cursor = fetch_page(query, limit, cursor)
             students = []
-            for data in all_users:
-                if data.get('role') == 'student':
-                    # Convert mock database format to UserProfile format
-                    student_data = {
-                        'uid': data.get('id', ''),
-                        'display_name': data.get('display_name', ''),
-                        'email': data.get('email', ''),
-                        'grade': data.get('grade', 5),
-                        'role': data.get('role', 'student'),
-                        'class_ids': data.get('class_ids', []),
-                        'guardian_of': data.get('guardian_of', []),
-                        'disabled': data.get('disabled', False),
-                        'selected_teacher_uid': data.get('selected_teacher_uid'),
-                        'level': data.get('level'),
-                        'total_points': data.get('total_points', 0),
-                        'created_at': datetime.fromisoformat(data.get('created_at', '').replace('Z', '+00:00'))
-                    }
-                    students.append(UserProfile(**student_data))
-            return students
+            for data in results:
+                students.append(user_codec.decode(data))
+            return Page(items=students, next_cursor=next_cursor)
         else:
             # Firebase - get all students
             query = self.collection.where("role", "==", "student")
+            results, next_cursor = fetch_page(query, limit, cursor)
             students = []
             
-            for doc in query.stream():
-                data = doc.to_dict()
-                data['uid'] = doc.id
-                if 'created_at' in data:
-                    data['created_at'] = data['created_at'].replace(tzinfo=None)
-                students.append(UserProfile(**data))
+            for doc in results:
+                students.append(user_codec.from_snapshot(doc))
             
-            return students
\ No newline at end of file
+            return Page(items=students, next_cursor=next_cursor)
\ No newline at end of file
@@ -1,9 +1,13 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Dict, Any
 from ..deps.firebase import require_teacher, require_student
 from ..repos.assignments import AssignmentsRepository
 from ..repos.classes import ClassesRepository
 from ..repos.users import UsersRepository
+from ..repos.cache import document_cache
+from ..services.analytics import AnalyticsService
+from ..services.item_analysis import ItemAnalysisService
 from ..services.scoring import ScoringService
 
 router = APIRouter()
@@ -11,98 +15,57 @@ router = APIRouter()
 @router.get("/teacher/overview")
 async def get_teacher_analytics(teacher: dict = Depends(require_teacher)):
     """Get overview analytics for teacher"""
-    classes_repo = ClassesRepository()
-    assignments_repo = AssignmentsRepository()
-    
-    # Get teacher's classes
-    classes = await classes_repo.get_teacher_classes(teacher['uid'])
-    
-    total_students = 0
-    total_assignments = 0
-    total_submissions = 0
-    average_score = 0
-    
-    for class_obj in classes:
-        # Count students in class
-        users_repo = UsersRepository()
-        students = await users_repo.get_students_in_class(class_obj.id)
-        total_students += len(students)
-        
-        # Count assignments in class
-        assignments = await assignments_repo.get_class_assignments(class_obj.id)
-        total_assignments += len(assignments)
-        
-        # Count submissions and calculate scores
-        for assignment in assignments:
-            submissions = await assignments_repo.get_assignment_submissions(assignment.id)
-            total_submissions += len(submissions)
-            
-            if submissions:
-                scores = [s.score for s in submissions if s.score is not None]
-                if scores:
-                    average_score += sum(scores)
-    
-    if total_submissions > 0:
-        average_score = average_score / total_submissions
-    
-    return {
-        "total_classes": len(classes),
-        "total_students": total_students,
-        "total_assignments": total_assignments,
-        "total_submissions": total_submissions,
-        "average_score": round(average_score, 2)
-    }
+    return await AnalyticsService().teacher_overview(teacher['uid'])
 
 @router.get("/teacher/class/{class_id}")
 async def get_class_analytics(class_id: str, teacher: dict = Depends(require_teacher)):
     """Get analytics for a specific class"""
     classes_repo = ClassesRepository()
-    assignments_repo = AssignmentsRepository()
     
     # Verify teacher owns this class
     class_obj = await classes_repo.get_class(class_id)
     if not class_obj or class_obj.teacher_uid != teacher['uid']:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    # Get students in class
-    users_repo = UsersRepository()
-    students = await users_repo.get_students_in_class(class_id)
+    return await AnalyticsService().class_breakdown(class_obj)
+
+@router.get("/teacher/assignment/{assignment_id}/items")
+async def get_item_analysis(assignment_id: str, teacher: dict = Depends(require_teacher)):
+    """Get per-question difficulty, discrimination and option statistics of an assignment"""
+    assignments_repo = AssignmentsRepository()
     
-    # Get assignments in class
-    assignments = await assignments_repo.get_class_assignments(class_id)
+    # Verify teacher owns this assignment
+    assignment = await assignments_repo.get_assignment(assignment_id)
+    if not assignment or assignment.teacher_uid != teacher['uid']:
+        raise HTTPException(status_code=404, detail="Assignment not found")
     
-    # Calculate analytics
-    assignment_analytics = []
-    for assignment in assignments:
-        submissions = await assignments_repo.get_assignment_submissions(assignment.id)
-        
-        if submissions:
-            scores = [s.score for s in submissions if s.score is not None]
-            avg_score = sum(scores) / len(scores) if scores else 0
-            completion_rate = len(submissions) / len(students) if students else 0
-            
-            assignment_analytics.append({
-                "assignment_id": assignment.id,
-                "title": assignment.title,
-                "total_students": len(students),
-                "submitted": len(submissions),
-                "completion_rate": round(completion_rate * 100, 1),
-                "average_score": round(avg_score, 2),
-                "max_score": assignment.question_count
-            })
+    return await ItemAnalysisService().analyze_assignment(assignment)
+
+# Declared before /student/{student_uid}, which would otherwise match it
+@router.get("/student/my-progress")
+async def get_my_progress(student: dict = Depends(require_student)):
+    """Get analytics for the current student"""
+    progress, recent = await asyncio.gather(AnalyticsService().student_progress(student['uid']),
+                                            AssignmentsRepository().get_recent_submissions(student['uid']))
+    average_score = progress["average_score"]
+    
+    # Get recent performance (last 5 submitted assignments)
+    recent_scores = [submission.score for submission in recent if submission.score is not None]
+    recent_average = sum(recent_scores) / len(recent_scores) if recent_scores else 0
     
     return {
-        "class_id": class_id,
-        "class_name": class_obj.name,
-        "total_students": len(students),
-        "total_assignments": len(assignments),
-        "assignment_analytics": assignment_analytics
+        "total_assignments": progress["total_assignments"],
+        "completed_assignments": progress["completed_assignments"],
+        "completion_rate": progress["completion_rate"],
+        "average_score": round(average_score, 2),
+        "recent_average": round(recent_average, 2),
+        "scores_over_time": progress["scores_over_time"],
+        "grade_level": ScoringService.get_grade_level(ScoringService.calculate_percentage(average_score, 1))
     }
 
 @router.get("/student/{student_uid}")
 async def get_student_analytics(student_uid: str, teacher: dict = Depends(require_teacher)):
     """Get analytics for a specific student"""
-    assignments_repo = AssignmentsRepository()
     users_repo = UsersRepository()
     
     # Get student profile
@@ -110,80 +73,20 @@ async def get_student_analytics(student_uid: str, teacher: dict = Depends(requir
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Get student's submissions
-    submissions = await assignments_repo.get_student_submissions(student_uid)
-    
-    # Calculate analytics
-    total_assignments = len(submissions)
-    completed_assignments = len([s for s in submissions if s.submitted_at])
-    
-    scores = [s.score for s in submissions if s.score is not None]
-    average_score = sum(scores) / len(scores) if scores else 0
-    
-    # Calculate scores over time
-    scores_over_time = []
-    for submission in submissions:
-        if submission.score is not None and submission.submitted_at:
-            scores_over_time.append({
-                "date": submission.submitted_at.isoformat(),
-                "score": submission.score,
-                "max_score": submission.max_score,
-                "percentage": ScoringService.calculate_percentage(submission.score, submission.max_score)
-            })
-    
-    # Sort by date
-    scores_over_time.sort(key=lambda x: x["date"])
+    progress = await AnalyticsService().student_progress(student_uid)
     
     return {
         "student_uid": student_uid,
         "student_name": student.display_name,
         "grade": student.grade,
-        "total_assignments": total_assignments,
-        "completed_assignments": completed_assignments,
-        "completion_rate": round((completed_assignments / total_assignments * 100) if total_assignments > 0 else 0, 1),
-        "average_score": round(average_score, 2),
-        "scores_over_time": scores_over_time
+        "total_assignments": progress["total_assignments"],
+        "completed_assignments": progress["completed_assignments"],
+        "completion_rate": progress["completion_rate"],
+        "average_score": round(progress["average_score"], 2),
+        "scores_over_time": progress["scores_over_time"]
     }
 
-@router.get("/student/my-progress")
-async def get_my_progress(student: dict = Depends(require_student)):
-    """Get analytics for the current student"""
-    assignments_repo = AssignmentsRepository()
-    
-    # Get student's submissions
-    submissions = await assignments_repo.get_student_submissions(student['uid'])
-    
-    # Calculate analytics
-    total_assignments = len(submissions)
-    completed_assignments = len([s for s in submissions if s.submitted_at])
-    
-    scores = [s.score for s in submissions if s.score is not None]
-    average_score = sum(scores) / len(scores) if scores else 0
-    
-    # Calculate scores over time
-    scores_over_time = []
-    for submission in submissions:
-        if submission.score is not None and submission.submitted_at:
-            scores_over_time.append({
-                "date": submission.submitted_at.isoformat(),
-                "score": submission.score,
-                "max_score": submission.max_score,
-                "percentage": ScoringService.calculate_percentage(submission.score, submission.max_score)
-            })
-    
-    # Sort by date
-    scores_over_time.sort(key=lambda x: x["date"])
-    
-    # Get recent performance (last 5 assignments)
-    recent_scores = scores[-5:] if len(scores) >= 5 else scores
-    recent_average = sum(recent_scores) / len(recent_scores) if recent_scores else 0
-    
-    return {
-        "total_assignments": total_assignments,
-        "completed_assignments": completed_assignments,
-        "completion_rate": round((completed_assignments / total_assignments * 100) if total_assignments > 0 else 0, 1),
-        "average_score": round(average_score, 2),
-        "recent_average": round(recent_average, 2),
-        "scores_over_time": scores_over_time,
-        "grade_level": ScoringService.get_grade_level(ScoringService.calculate_percentage(average_score, 1))
-    }
\ No newline at end of file
+@router.get("/cache")
+async def get_cache_stats(teacher: dict = Depends(require_teacher)):
+    """Get hit rates of the in-process document cache"""
+    return document_cache.stats()
@@ -2,7 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Dict, Any
 import random
 import time
-from ..deps.firebase import require_student, verify_token
+from ..deps.firebase import require_student, verify_token, get_firestore
+from ..deps.executor import run_blocking
 from ..models.schemas import GameResult
 from ..repos.users import UsersRepository
 from google.cloud import firestore
@@ -164,7 +165,7 @@ async def submit_game_result(
 ):
     """Submit game result for analytics"""
     try:
-        db = firestore.client()
+        db = get_firestore()
         game_results_collection = db.collection('game_results')
         
         # Create game result document
@@ -177,7 +178,7 @@ async def submit_game_result(
             "created_at": firestore.SERVER_TIMESTAMP
         }
         
-        doc_ref = game_results_collection.add(result_doc)
+        doc_ref = await run_blocking(game_results_collection.add, result_doc)
         
         return {
             "message": "Oyun sonucu kaydedildi!",
@@ -192,27 +193,29 @@ async def submit_game_result(
 async def get_game_leaderboard(game_name: str, limit: int = 10):
     """Get leaderboard for a specific game"""
     try:
-        db = firestore.client()
+        db = get_firestore()
         game_results_collection = db.collection('game_results')
         
         # Query for the specific game, ordered by score descending
         query = game_results_collection.where("game_name", "==", game_name).order_by("score", direction=firestore.Query.DESCENDING).limit(limit)
         
         results = []
-        for doc in query.stream():
+        for doc in await run_blocking(query.get):
             data = doc.to_dict()
             data['id'] = doc.id
             
-            # Get student name
-            users_repo = UsersRepository()
-            student = await users_repo.get_user(data['student_uid'])
-            data['student_name'] = student.display_name if student else "Bilinmeyen Öğrenci"
-            
             # Calculate percentage
             data['percentage'] = round((data['score'] / data['max_score']) * 100, 1)
             
             results.append(data)
         
+        # Get all student names with one batched read
+        users_repo = UsersRepository()
+        students = await users_repo.get_users_by_ids([data['student_uid'] for data in results])
+        names = {student.uid: student.display_name for student in students}
+        for data in results:
+            data['student_name'] = names.get(data['student_uid'], "Bilinmeyen Öğrenci")
+        
         return {
             "game_name": game_name,
             "leaderboard": results
@@ -225,7 +228,7 @@ async def get_game_leaderboard(game_name: str, limit: int = 10):
 async def get_my_game_stats(user: dict = Depends(verify_token)):
     """Get current user's game statistics"""
     try:
-        db = firestore.client()
+        db = get_firestore()
         game_results_collection = db.collection('game_results')
         
         # Query for user's game results
@@ -236,7 +239,7 @@ async def get_my_game_stats(user: dict = Depends(verify_token)):
         total_score = 0
         total_max_score = 0
         
-        for doc in query.stream():
+        for doc in await run_blocking(query.get):
             data = doc.to_dict()
             data['id'] = doc.id
             data['percentage'] = round((data['score'] / data['max_score']) * 100, 1)
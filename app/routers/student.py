@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional
 from ..deps.firebase import require_student
+from ..deps.responses import ModelResponse
 from ..models.schemas import (
-    Assignment, Submission, SubmitAnswersRequest, Lesson, 
-    IndividualAssignment, StudentTeacherRelation, CreateStudentTeacherRelationRequest
+    AssignmentSummary, Submission, SubmitAnswersRequest, Lesson, 
+    IndividualAssignment, StudentTeacherRelation, CreateStudentTeacherRelationRequest, Page
 )
 from ..repos.assignments import AssignmentsRepository
 from ..repos.classes import ClassesRepository
@@ -11,11 +12,13 @@ from ..repos.lessons import LessonsRepository
 from ..repos.individual_assignments import IndividualAssignmentsRepository
 from ..repos.student_teacher_relations import StudentTeacherRelationsRepository
 from ..repos.users import UsersRepository
+from ..repos.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from ..repos.session import Session, get_session
 from ..services.scoring import ScoringService
 
 router = APIRouter()
 
-@router.get("/assignments", response_model=List[Assignment])
+@router.get("/assignments", response_model=List[AssignmentSummary])
 async def get_student_assignments(student: dict = Depends(require_student)):
     """Get all assignments for the student's classes"""
     classes_repo = ClassesRepository()
@@ -26,10 +29,10 @@ async def get_student_assignments(student: dict = Depends(require_student)):
     
     all_assignments = []
     for class_obj in student_classes:
-        class_assignments = await assignments_repo.get_class_assignments(class_obj.id)
+        class_assignments = await assignments_repo.get_class_assignment_summaries(class_obj.id)
         all_assignments.extend(class_assignments)
     
-    return all_assignments
+    return ModelResponse(all_assignments)
 
 @router.get("/assignments/{assignment_id}")
 async def get_assignment_detail(assignment_id: str, student: dict = Depends(require_student)):
@@ -52,10 +55,11 @@ async def get_assignment_detail(assignment_id: str, student: dict = Depends(requ
 async def submit_assignment_answers(
     assignment_id: str,
     answers_data: SubmitAnswersRequest,
-    student: dict = Depends(require_student)
+    student: dict = Depends(require_student),
+    session: Session = Depends(get_session)
 ):
     """Save or submit student answers"""
-    assignments_repo = AssignmentsRepository()
+    assignments_repo = AssignmentsRepository(session.db)
     
     # Get assignment to validate and get answer schema
     assignment = await assignments_repo.get_assignment(assignment_id)
@@ -66,17 +70,10 @@ async def submit_assignment_answers(
         # Calculate max score
         max_score = float(len(assignment.answer_schema))
         
-        # Save answers
-        submission_id = await assignments_repo.save_student_answers(
-            assignment_id, 
-            student['uid'], 
-            answers_data,
-            max_score
-        )
-        
         # If submitting (not just saving), calculate score
         score = None
         feedback = None
+        question_scores = None
         
         if answers_data.submit:
             score, breakdown = ScoringService.score_submission(
@@ -85,10 +82,20 @@ async def submit_assignment_answers(
             )
             
             feedback = ScoringService.generate_feedback(breakdown, score, max_score)
-            
-            # Update submission with score and feedback
-            await assignments_repo.update_submission_score(submission_id, score, feedback)
+            question_scores = ScoringService.question_scores(breakdown)
         
+        # Save answers, with the score, feedback and per-question scores when submitting
+        submission_id = await assignments_repo.save_student_answers(
+            assignment_id, 
+            student['uid'], 
+            answers_data,
+            max_score,
+            score,
+            feedback,
+            question_scores
+        )
+        
+        await session.commit()
         return {
             "message": "Cevaplar kaydedildi!" if not answers_data.submit else "Ödev teslim edildi!",
             "submission_id": submission_id,
@@ -100,12 +107,12 @@ async def submit_assignment_answers(
         raise HTTPException(status_code=400, detail=f"Failed to submit answers: {str(e)}")
 
 @router.get("/submissions")
-async def get_student_submissions(student: dict = Depends(require_student)):
+async def get_student_submissions(student: dict = Depends(require_student), session: Session = Depends(get_session)):
     """Get all submissions for the student"""
     # This would require a more complex query or different data structure
     # For now, we'll get assignments and check for submissions
-    assignments_repo = AssignmentsRepository()
-    classes_repo = ClassesRepository()
+    assignments_repo = AssignmentsRepository(session.db)
+    classes_repo = ClassesRepository(session.db)
     
     # Get student's classes
     student_classes = await classes_repo.get_student_classes(student['uid'])
@@ -118,11 +125,11 @@ async def get_student_submissions(student: dict = Depends(require_student)):
             submission = await assignments_repo.get_student_submission(assignment.id, student['uid'])
             if submission and submission.visible_to_student:
                 all_submissions.append({
-                    "assignment": assignment.dict(),
-                    "submission": submission.dict()
+                    "assignment": assignment,
+                    "submission": submission
                 })
     
-    return all_submissions
+    return ModelResponse(all_submissions)
 
 # Öğrenci İzleme Sistemi Endpoint'leri
 
@@ -134,10 +141,10 @@ async def get_available_teachers(student: dict = Depends(require_student)):
     return teachers
 
 @router.post("/teachers/{teacher_uid}/request")
-async def request_teacher(teacher_uid: str, student: dict = Depends(require_student)):
+async def request_teacher(teacher_uid: str, student: dict = Depends(require_student), session: Session = Depends(get_session)):
     """Request to work with a specific teacher and update student's selected teacher"""
-    relations_repo = StudentTeacherRelationsRepository()
-    users_repo = UsersRepository()
+    relations_repo = StudentTeacherRelationsRepository(session.db)
+    users_repo = UsersRepository(session.db)
     
     # Check if relation already exists
     existing_relations = await relations_repo.get_student_relations(student['uid'])
@@ -152,6 +159,7 @@ async def request_teacher(teacher_uid: str, student: dict = Depends(require_stud
     # Update student's selected_teacher_uid
     await users_repo.update_user(student['uid'], {'selected_teacher_uid': teacher_uid})
     
+    await session.commit()
     return {"message": "Teacher request sent successfully", "relation_id": relation_id}
 
 @router.get("/teachers/my-teachers", response_model=List[dict])
@@ -162,14 +170,12 @@ async def get_my_teachers(student: dict = Depends(require_student)):
     
     users_repo = UsersRepository()
     teachers = []
-    for uid in teacher_uids:
-        user = await users_repo.get_user(uid)
-        if user:
-            teachers.append({
-                'uid': user.uid,
-                'display_name': user.display_name,
-                'email': user.email
-            })
+    for user in await users_repo.get_users_by_ids(teacher_uids):
+        teachers.append({
+            'uid': user.uid,
+            'display_name': user.display_name,
+            'email': user.email
+        })
     
     return teachers
 
@@ -178,15 +184,22 @@ async def get_pending_requests(student: dict = Depends(require_student)):
     """Get all pending teacher requests for the student"""
     relations_repo = StudentTeacherRelationsRepository()
     relations = await relations_repo.get_student_relations(student['uid'])
-    return [rel for rel in relations if rel.status == "pending"]
+    return ModelResponse([rel for rel in relations if rel.status == "pending"])
 
 # Ders Takip Sistemi
 
-@router.get("/lessons", response_model=List[Lesson])
-async def get_my_lessons(student: dict = Depends(require_student)):
-    """Get all lessons for the student"""
+@router.get("/lessons", response_model=Page[Lesson])
+async def get_my_lessons(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    student: dict = Depends(require_student)
+):
+    """Get one page of the student's lessons"""
     lessons_repo = LessonsRepository()
-    return await lessons_repo.get_student_lessons(student['uid'])
+    try:
+        return ModelResponse(await lessons_repo.get_student_lessons(student['uid'], limit, cursor))
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/lessons/{lesson_id}", response_model=Lesson)
 async def get_lesson_detail(lesson_id: str, student: dict = Depends(require_student)):
@@ -208,7 +221,7 @@ async def get_lesson_detail(lesson_id: str, student: dict = Depends(require_stud
 async def get_my_individual_assignments(student: dict = Depends(require_student)):
     """Get all individual assignments for the student"""
     individual_assignments_repo = IndividualAssignmentsRepository()
-    return await individual_assignments_repo.get_student_assignments(student['uid'])
+    return ModelResponse(await individual_assignments_repo.get_student_assignments(student['uid']))
 
 @router.get("/individual-assignments/{assignment_id}", response_model=IndividualAssignment)
 async def get_individual_assignment_detail(assignment_id: str, student: dict = Depends(require_student)):
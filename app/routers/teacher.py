@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, Query
+from typing import List, Optional
+import asyncio
 import csv
 import io
+from datetime import datetime
 from ..deps.firebase import require_teacher
+from ..deps.responses import ModelResponse
 from ..models.schemas import (
-    CreateUserRequest, CreateClassRequest, CreateAssignmentRequest, 
-    UserProfile, Class, Assignment, Lesson, CreateLessonRequest,
+    CreateUserRequest, CreateClassRequest, ClassMembershipRequest, CreateAssignmentRequest, 
+    UserProfile, Class, AssignmentSummary, Lesson, CreateLessonRequest,
     IndividualAssignment, CreateIndividualAssignmentRequest,
-    StudentTeacherRelation, CreateStudentTeacherRelationRequest
+    StudentTeacherRelation, CreateStudentTeacherRelationRequest, Page
 )
 from ..repos.users import UsersRepository
 from ..repos.classes import ClassesRepository
@@ -15,23 +18,27 @@ from ..repos.assignments import AssignmentsRepository
 from ..repos.lessons import LessonsRepository
 from ..repos.individual_assignments import IndividualAssignmentsRepository
 from ..repos.student_teacher_relations import StudentTeacherRelationsRepository
+from ..repos.membership import MembershipRepository
+from ..repos.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor
+from ..repos.session import Session, get_session
 from ..services.scoring import ScoringService
 
 router = APIRouter()
 
 @router.post("/users", response_model=str)
-async def create_user(user_data: CreateUserRequest, teacher: dict = Depends(require_teacher)):
+async def create_user(user_data: CreateUserRequest, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Create a new student or guardian"""
-    users_repo = UsersRepository()
+    users_repo = UsersRepository(session.db)
     
     try:
         user_id = await users_repo.create_user(user_data)
         
         # If creating a student, add to class
         if user_data.role == "student" and user_data.class_id:
-            classes_repo = ClassesRepository()
+            classes_repo = ClassesRepository(session.db)
             await classes_repo.add_student_to_class(user_data.class_id, user_id)
         
+        await session.commit()
         return user_id
     
     except Exception as e:
@@ -41,7 +48,8 @@ async def create_user(user_data: CreateUserRequest, teacher: dict = Depends(requ
 async def bulk_import_students(
     class_id: str = Form(...),
     file: UploadFile = File(...),
-    teacher: dict = Depends(require_teacher)
+    teacher: dict = Depends(require_teacher),
+    session: Session = Depends(get_session)
 ):
     """Bulk import students from CSV"""
     if not file.filename.endswith('.csv'):
@@ -62,14 +70,14 @@ async def bulk_import_students(
                 'grade': int(row.get('grade', row.get('Grade', 5)))
             })
         
-        users_repo = UsersRepository()
+        users_repo = UsersRepository(session.db)
         created_ids = await users_repo.bulk_create_students(students_data, class_id)
         
         # Update class with new students
-        classes_repo = ClassesRepository()
-        for student_id in created_ids:
-            await classes_repo.add_student_to_class(class_id, student_id)
+        classes_repo = ClassesRepository(session.db)
+        await classes_repo.add_students_to_class(class_id, created_ids)
         
+        await session.commit()
         return {
             "message": f"Successfully imported {len(created_ids)} students",
             "created_ids": created_ids
@@ -94,7 +102,7 @@ async def create_class(class_data: CreateClassRequest, teacher: dict = Depends(r
 async def get_teacher_classes(teacher: dict = Depends(require_teacher)):
     """Get all classes for the teacher"""
     classes_repo = ClassesRepository()
-    return await classes_repo.get_teacher_classes(teacher['uid'])
+    return ModelResponse(await classes_repo.get_teacher_classes(teacher['uid']))
 
 @router.get("/classes/{class_id}", response_model=Class)
 async def get_class_detail(class_id: str, teacher: dict = Depends(require_teacher)):
@@ -108,55 +116,83 @@ async def get_class_detail(class_id: str, teacher: dict = Depends(require_teache
     if class_data.teacher_uid != teacher['uid']:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Add student count
-    users_repo = UsersRepository()
-    students = await users_repo.get_students_in_class(class_id)
-    class_data.student_count = len(students)
-    
     return class_data
 
 @router.get("/classes/{class_id}/students", response_model=List[UserProfile])
 async def get_class_students(class_id: str, teacher: dict = Depends(require_teacher)):
     """Get all students in a class"""
     users_repo = UsersRepository()
-    return await users_repo.get_students_in_class(class_id)
+    return ModelResponse(await users_repo.get_students_in_class(class_id))
 
 @router.get("/students/available", response_model=List[UserProfile])
 async def get_available_students(teacher: dict = Depends(require_teacher)):
     """Get all available students (not in any class)"""
     users_repo = UsersRepository()
-    return await users_repo.get_available_students()
+    return ModelResponse(await users_repo.get_available_students())
 
-@router.get("/students/all", response_model=List[UserProfile])
-async def get_all_students(teacher: dict = Depends(require_teacher)):
-    """Get all students regardless of class status"""
+@router.get("/students/all", response_model=Page[UserProfile])
+async def get_all_students(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    teacher: dict = Depends(require_teacher)
+):
+    """Get one page of all students regardless of class status"""
     users_repo = UsersRepository()
-    return await users_repo.get_all_students()
+    try:
+        return ModelResponse(await users_repo.get_all_students(limit, cursor))
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.post("/classes/{class_id}/students/bulk-add")
+async def add_students_to_class(class_id: str, request: ClassMembershipRequest, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
+    """Add many students to a class in one commit"""
+    membership = MembershipRepository(session.db)
+    
+    try:
+        success = await membership.add_students(class_id, request.student_uids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if success:
+        await session.commit()
+        return {"message": f"{len(set(request.student_uids))} students added to class successfully"}
+    else:
+        raise HTTPException(status_code=400, detail="Failed to add students to class")
+
+@router.post("/classes/{class_id}/students/bulk-remove")
+async def remove_students_from_class(class_id: str, request: ClassMembershipRequest, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
+    """Remove many students from a class in one commit"""
+    membership = MembershipRepository(session.db)
+    
+    try:
+        success = await membership.remove_students(class_id, request.student_uids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if success:
+        await session.commit()
+        return {"message": f"{len(set(request.student_uids))} students removed from class successfully"}
+    else:
+        raise HTTPException(status_code=400, detail="Failed to remove students from class")
 
 @router.post("/classes/{class_id}/students/{student_uid}")
-async def add_student_to_class(class_id: str, student_uid: str, teacher: dict = Depends(require_teacher)):
+async def add_student_to_class(class_id: str, student_uid: str, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Add a student to a class"""
-    classes_repo = ClassesRepository()
-    users_repo = UsersRepository()
+    membership = MembershipRepository(session.db)
     
-    success1 = await classes_repo.add_student_to_class(class_id, student_uid)
-    success2 = await users_repo.add_student_to_class(student_uid, class_id)
-    
-    if success1 and success2:
+    if await membership.add_student(class_id, student_uid):
+        await session.commit()
         return {"message": "Student added to class successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to add student to class")
 
 @router.delete("/classes/{class_id}/students/{student_uid}")
-async def remove_student_from_class(class_id: str, student_uid: str, teacher: dict = Depends(require_teacher)):
+async def remove_student_from_class(class_id: str, student_uid: str, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Remove a student from a class"""
-    classes_repo = ClassesRepository()
-    users_repo = UsersRepository()
+    membership = MembershipRepository(session.db)
     
-    success1 = await classes_repo.remove_student_from_class(class_id, student_uid)
-    success2 = await users_repo.remove_student_from_class(student_uid, class_id)
-    
-    if success1 and success2:
+    if await membership.remove_student(class_id, student_uid):
+        await session.commit()
         return {"message": "Student removed from class successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to remove student from class")
@@ -173,16 +209,23 @@ async def create_assignment(assignment_data: CreateAssignmentRequest, teacher: d
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create assignment: {str(e)}")
 
-@router.get("/assignments", response_model=List[Assignment])
-async def get_teacher_assignments(teacher: dict = Depends(require_teacher)):
-    """Get all assignments for the teacher"""
+@router.get("/assignments", response_model=Page[AssignmentSummary])
+async def get_teacher_assignments(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    teacher: dict = Depends(require_teacher)
+):
+    """Get one page of the teacher's assignments"""
     assignments_repo = AssignmentsRepository()
-    return await assignments_repo.get_teacher_assignments(teacher['uid'])
+    try:
+        return ModelResponse(await assignments_repo.get_teacher_assignments(teacher['uid'], limit, cursor))
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/assignments/{assignment_id}/submissions")
-async def get_assignment_submissions(assignment_id: str, teacher: dict = Depends(require_teacher)):
+async def get_assignment_submissions(assignment_id: str, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Get all submissions for an assignment"""
-    assignments_repo = AssignmentsRepository()
+    assignments_repo = AssignmentsRepository(session.db)
     
     # Get assignment to verify teacher ownership
     assignment = await assignments_repo.get_assignment(assignment_id)
@@ -192,6 +235,8 @@ async def get_assignment_submissions(assignment_id: str, teacher: dict = Depends
     submissions = await assignments_repo.get_assignment_submissions(assignment_id)
     
     # Auto-score submissions that haven't been scored yet
+    new_scores = {}
+    new_question_scores = {}
     for submission in submissions:
         if submission.score is None and submission.submitted_at:
             score, breakdown = ScoringService.score_submission(
@@ -201,18 +246,20 @@ async def get_assignment_submissions(assignment_id: str, teacher: dict = Depends
             
             feedback = ScoringService.generate_feedback(breakdown, score, submission.max_score)
             
-            await assignments_repo.update_submission_score(
-                submission.id, 
-                score, 
-                feedback
-            )
+            new_scores[submission.id] = (score, feedback)
+            new_question_scores[submission.id] = ScoringService.question_scores(breakdown)
+            submission.question_scores = new_question_scores[submission.id]
             submission.score = score
             submission.feedback = feedback
     
-    return {
-        "assignment": assignment.dict(),
-        "submissions": [s.dict() for s in submissions]
-    }
+    if new_scores:
+        await assignments_repo.update_submission_scores(new_scores, new_question_scores)
+    
+    await session.commit()
+    return ModelResponse({
+        "assignment": assignment,
+        "submissions": submissions
+    })
 
 @router.patch("/submissions/{submission_id}")
 async def update_submission(
@@ -220,10 +267,11 @@ async def update_submission(
     score: float = None,
     feedback: str = None,
     visible_to_student: bool = None,
-    teacher: dict = Depends(require_teacher)
+    teacher: dict = Depends(require_teacher),
+    session: Session = Depends(get_session)
 ):
     """Update submission score, feedback, or visibility"""
-    assignments_repo = AssignmentsRepository()
+    assignments_repo = AssignmentsRepository(session.db)
     
     try:
         success = True
@@ -234,6 +282,7 @@ async def update_submission(
             success = success and await assignments_repo.toggle_submission_visibility(submission_id, visible_to_student)
         
         if success:
+            await session.commit()
             return {"message": "Submission updated successfully"}
         else:
             raise HTTPException(status_code=400, detail="Failed to update submission")
@@ -266,25 +315,36 @@ async def get_my_students(teacher: dict = Depends(require_teacher)):
     student_uids = await relations_repo.get_accepted_students_for_teacher(teacher['uid'])
     
     users_repo = UsersRepository()
-    students = []
-    for uid in student_uids:
-        user = await users_repo.get_user(uid)
-        if user:
-            students.append(user)
-    
-    return students
+    return ModelResponse(await users_repo.get_users_by_ids(student_uids))
 
 @router.get("/students/pending-requests", response_model=List[StudentTeacherRelation])
 async def get_pending_requests(teacher: dict = Depends(require_teacher)):
     """Get all pending student-teacher relation requests"""
     relations_repo = StudentTeacherRelationsRepository()
     relations = await relations_repo.get_teacher_relations(teacher['uid'])
-    return [rel for rel in relations if rel.status == "pending"]
+    return ModelResponse([rel for rel in relations if rel.status == "pending"])
+
+@router.get("/tracking-stats")
+async def get_tracking_stats(teacher: dict = Depends(require_teacher)):
+    """Summary cards of the student tracking page, counted over all of the
+    teacher's lessons and individual assignments"""
+    now = datetime.now()
+    lessons_repo = LessonsRepository()
+    individual_assignments_repo = IndividualAssignmentsRepository()
+    monthly_lessons, assignment_stats = await asyncio.gather(
+        lessons_repo.count_teacher_lessons_since(teacher['uid'], datetime(now.year, now.month, 1)),
+        individual_assignments_repo.get_teacher_assignment_stats(teacher['uid'])
+    )
+    return {
+        "monthly_lessons": monthly_lessons,
+        "active_assignments": assignment_stats["active"],
+        "average_score": round(assignment_stats["average_score"], 1)
+    }
 
 @router.post("/students/{student_uid}/accept")
-async def accept_student_request(student_uid: str, teacher: dict = Depends(require_teacher)):
+async def accept_student_request(student_uid: str, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Accept a student's request to work with the teacher"""
-    relations_repo = StudentTeacherRelationsRepository()
+    relations_repo = StudentTeacherRelationsRepository(session.db)
     relations = await relations_repo.get_teacher_relations(teacher['uid'])
     
     # Find the pending relation for this student
@@ -299,14 +359,15 @@ async def accept_student_request(student_uid: str, teacher: dict = Depends(requi
     
     success = await relations_repo.accept_relation(pending_relation.id)
     if success:
+        await session.commit()
         return {"message": "Student request accepted successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to accept student request")
 
 @router.post("/students/{student_uid}/reject")
-async def reject_student_request(student_uid: str, teacher: dict = Depends(require_teacher)):
+async def reject_student_request(student_uid: str, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Reject a student's request to work with the teacher"""
-    relations_repo = StudentTeacherRelationsRepository()
+    relations_repo = StudentTeacherRelationsRepository(session.db)
     relations = await relations_repo.get_teacher_relations(teacher['uid'])
     
     # Find the pending relation for this student
@@ -321,6 +382,7 @@ async def reject_student_request(student_uid: str, teacher: dict = Depends(requi
     
     success = await relations_repo.reject_relation(pending_relation.id)
     if success:
+        await session.commit()
         return {"message": "Student request rejected successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to reject student request")
@@ -338,11 +400,18 @@ async def create_lesson(lesson_data: CreateLessonRequest, teacher: dict = Depend
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create lesson: {str(e)}")
 
-@router.get("/lessons", response_model=List[Lesson])
-async def get_my_lessons(teacher: dict = Depends(require_teacher)):
-    """Get all lessons for the teacher"""
+@router.get("/lessons", response_model=Page[Lesson])
+async def get_my_lessons(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    teacher: dict = Depends(require_teacher)
+):
+    """Get one page of the teacher's lessons"""
     lessons_repo = LessonsRepository()
-    return await lessons_repo.get_teacher_lessons(teacher['uid'])
+    try:
+        return ModelResponse(await lessons_repo.get_teacher_lessons(teacher['uid'], limit, cursor))
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/lessons/{lesson_id}", response_model=Lesson)
 async def get_lesson_detail(lesson_id: str, teacher: dict = Depends(require_teacher)):
@@ -362,10 +431,11 @@ async def get_lesson_detail(lesson_id: str, teacher: dict = Depends(require_teac
 async def update_lesson(
     lesson_id: str,
     updates: dict,
-    teacher: dict = Depends(require_teacher)
+    teacher: dict = Depends(require_teacher),
+    session: Session = Depends(get_session)
 ):
     """Update lesson details"""
-    lessons_repo = LessonsRepository()
+    lessons_repo = LessonsRepository(session.db)
     lesson = await lessons_repo.get_lesson(lesson_id)
     
     if not lesson:
@@ -376,14 +446,15 @@ async def update_lesson(
     
     success = await lessons_repo.update_lesson(lesson_id, updates)
     if success:
+        await session.commit()
         return {"message": "Lesson updated successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to update lesson")
 
 @router.delete("/lessons/{lesson_id}")
-async def delete_lesson(lesson_id: str, teacher: dict = Depends(require_teacher)):
+async def delete_lesson(lesson_id: str, teacher: dict = Depends(require_teacher), session: Session = Depends(get_session)):
     """Delete a lesson"""
-    lessons_repo = LessonsRepository()
+    lessons_repo = LessonsRepository(session.db)
     lesson = await lessons_repo.get_lesson(lesson_id)
     
     if not lesson:
@@ -394,6 +465,7 @@ async def delete_lesson(lesson_id: str, teacher: dict = Depends(require_teacher)
     
     success = await lessons_repo.delete_lesson(lesson_id)
     if success:
+        await session.commit()
         return {"message": "Lesson deleted successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to delete lesson")
@@ -414,11 +486,18 @@ async def create_individual_assignment(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to create individual assignment: {str(e)}")
 
-@router.get("/individual-assignments", response_model=List[IndividualAssignment])
-async def get_my_individual_assignments(teacher: dict = Depends(require_teacher)):
-    """Get all individual assignments created by the teacher"""
+@router.get("/individual-assignments", response_model=Page[IndividualAssignment])
+async def get_my_individual_assignments(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    teacher: dict = Depends(require_teacher)
+):
+    """Get one page of the individual assignments created by the teacher"""
     individual_assignments_repo = IndividualAssignmentsRepository()
-    return await individual_assignments_repo.get_teacher_assignments(teacher['uid'])
+    try:
+        return ModelResponse(await individual_assignments_repo.get_teacher_assignments(teacher['uid'], limit, cursor))
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.get("/individual-assignments/{assignment_id}", response_model=IndividualAssignment)
 async def get_individual_assignment_detail(assignment_id: str, teacher: dict = Depends(require_teacher)):
@@ -439,10 +518,11 @@ async def submit_individual_assignment(
     assignment_id: str,
     score: float,
     feedback: str = None,
-    teacher: dict = Depends(require_teacher)
+    teacher: dict = Depends(require_teacher),
+    session: Session = Depends(get_session)
 ):
     """Submit an individual assignment with score and feedback"""
-    individual_assignments_repo = IndividualAssignmentsRepository()
+    individual_assignments_repo = IndividualAssignmentsRepository(session.db)
     assignment = await individual_assignments_repo.get_assignment(assignment_id)
     
     if not assignment:
@@ -453,6 +533,7 @@ async def submit_individual_assignment(
     
     success = await individual_assignments_repo.submit_assignment(assignment_id, score, feedback)
     if success:
+        await session.commit()
         return {"message": "Individual assignment submitted successfully"}
     else:
         raise HTTPException(status_code=400, detail="Failed to submit individual assignment")
\ No newline at end of file
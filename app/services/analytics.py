@@ -0,0 +1,156 @@
+import asyncio
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from ..models.schemas import AssignmentRollup, Class, ProgressBucket
+from ..repos.assignments import HISTOGRAM_BUCKETS, AssignmentsRepository
+from ..repos.base import chunked
+from ..repos.classes import ClassesRepository
+
+T = TypeVar("T")
+
+# Reads one dashboard may have in flight at once, so a teacher with many
+# classes does not take over the whole DB executor
+MAX_CONCURRENT_READS = 8
+
+# Rolling windows of a student's score timeline: (days, bucket period)
+PROGRESS_WINDOWS = ((7, "day"), (30, "day"), (90, "week"))
+
+class AnalyticsService:
+    """Dashboard aggregations planned as a few levels of batched reads.
+
+    Each level (classes -> assignments -> assignment rollups) is fetched
+    in chunks of the level above, run concurrently up to max_concurrency,
+    and the results are reduced in a single pass. Submissions themselves
+    are never read: their counts and score sums are kept in the rollups.
+    """
+
+    def __init__(self, db=None, max_concurrency: int = MAX_CONCURRENT_READS):
+        self.classes_repo = ClassesRepository(db)
+        self.assignments_repo = AssignmentsRepository(db)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _fan_out(self, fetch: Callable[[List[str]], Awaitable[List[T]]], ids: List[str]) -> List[T]:
+        """Run fetch over 'in'-sized chunks of ids concurrently and concatenate the results"""
+        async def bounded(chunk: List[str]) -> List[T]:
+            async with self._semaphore:
+                return await fetch(chunk)
+
+        results = await asyncio.gather(*(bounded(chunk) for chunk in chunked(ids)))
+        return [item for result in results for item in result]
+
+    async def teacher_overview(self, teacher_uid: str) -> Dict[str, Any]:
+        """Totals across all of a teacher's classes"""
+        classes = await self.classes_repo.get_teacher_classes(teacher_uid)
+        assignments = await self._fan_out(self.assignments_repo.get_assignment_summaries_in_classes,
+                                          [c.id for c in classes])
+        rollups = await self._fan_out(self.assignments_repo.get_assignment_rollups,
+                                      [a.id for a in assignments])
+
+        total_submissions = 0
+        score_sum = 0
+        for rollup in rollups:
+            total_submissions += rollup.submitted
+            score_sum += rollup.score_sum
+
+        return {
+            "total_classes": len(classes),
+            "total_students": sum(c.student_count for c in classes),
+            "total_assignments": len(assignments),
+            "total_submissions": total_submissions,
+            "average_score": round(score_sum / total_submissions, 2) if total_submissions else 0
+        }
+
+    async def class_breakdown(self, class_obj: Class) -> Dict[str, Any]:
+        """Per-assignment submission statistics for one class"""
+        assignments = await self.assignments_repo.get_class_assignment_summaries(class_obj.id)
+        rollups = await self._fan_out(self.assignments_repo.get_assignment_rollups,
+                                      [a.id for a in assignments])
+
+        assignment_analytics = []
+        for assignment, rollup in zip(assignments, rollups):
+            if not rollup.submitted:
+                continue
+            completion_rate = rollup.submitted / class_obj.student_count if class_obj.student_count else 0
+            assignment_analytics.append({
+                "assignment_id": assignment.id,
+                "title": assignment.title,
+                "total_students": class_obj.student_count,
+                "submitted": rollup.submitted,
+                "completion_rate": round(completion_rate * 100, 1),
+                "average_score": round(_mean(rollup), 2),
+                "score_stddev": round(_stddev(rollup), 2),
+                "score_histogram": [rollup.histogram.get(str(bucket), 0) for bucket in range(HISTOGRAM_BUCKETS)],
+                "max_score": assignment.question_count
+            })
+
+        return {
+            "class_id": class_obj.id,
+            "class_name": class_obj.name,
+            "total_students": class_obj.student_count,
+            "total_assignments": len(assignments),
+            "assignment_analytics": assignment_analytics
+        }
+
+    async def student_progress(self, student_uid: str, today: Optional[date] = None) -> Dict[str, Any]:
+        """Completion, average score and rolling score windows of one student.
+        Counts and the average come from aggregation queries and the windows
+        from day/week progress buckets, so the cost does not grow with the
+        student's history."""
+        today = today or datetime.now(timezone.utc).date()
+        starts = {days: _window_start(today, days, period) for days, period in PROGRESS_WINDOWS}
+        # One bucket read per period, from the start of its longest window
+        since = {}
+        for days, period in PROGRESS_WINDOWS:
+            since[period] = min(since.get(period, starts[days]), starts[days])
+        stats, *bucket_lists = await asyncio.gather(
+            self.assignments_repo.get_student_submission_stats(student_uid),
+            *(self.assignments_repo.get_progress_buckets(student_uid, period, start) for period, start in since.items())
+        )
+        buckets = dict(zip(since, bucket_lists))
+        
+        scores_over_time = {}
+        for days, period in PROGRESS_WINDOWS:
+            first = starts[days].isoformat()
+            scores_over_time[f"{days}d"] = _window(period, [b for b in buckets[period] if b.start >= first])
+        
+        total = stats["total"]
+        return {
+            "total_assignments": total,
+            "completed_assignments": stats["completed"],
+            "completion_rate": round((stats["completed"] / total * 100) if total > 0 else 0, 1),
+            "average_score": stats["average_score"],
+            "scores_over_time": scores_over_time
+        }
+
+def _mean(rollup: AssignmentRollup) -> float:
+    return rollup.score_sum / rollup.graded if rollup.graded else 0
+
+def _stddev(rollup: AssignmentRollup) -> float:
+    if not rollup.graded:
+        return 0
+    return math.sqrt(max(0, rollup.score_sumsq / rollup.graded - _mean(rollup) ** 2))
+
+def _window_start(today: date, days: int, period: str) -> date:
+    """First day of a window of days ending today; week windows start on that week's Monday"""
+    first = today - timedelta(days=days - 1)
+    return first - timedelta(days=first.weekday()) if period == "week" else first
+
+def _percentage(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+def _window(period: str, buckets: List[ProgressBucket]) -> Dict[str, Any]:
+    """Totals and the per-bucket series of one progress window"""
+    count = sum(bucket.count for bucket in buckets)
+    return {
+        "period": period,
+        "count": count,
+        "average_percentage": _percentage(sum(bucket.percentage_sum for bucket in buckets) / count) if count else 0,
+        "max_percentage": _percentage(max((b.percentage_max for b in buckets if b.percentage_max is not None), default=None)),
+        "buckets": [{
+            "start": bucket.start,
+            "count": bucket.count,
+            "average_percentage": _percentage(bucket.percentage_sum / bucket.count),
+            "max_percentage": _percentage(bucket.percentage_max)
+        } for bucket in buckets]
+    }
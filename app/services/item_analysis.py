@@ -0,0 +1,115 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..models.schemas import Assignment, Submission
+from ..repos.assignments import HISTOGRAM_BUCKETS, AssignmentsRepository
+from .scoring import ScoringService
+
+def _rounded(value: float, digits: int = 3) -> Optional[float]:
+    """JSON-friendly statistic: NaN or infinity (undefined for this data) becomes None"""
+    return round(float(value), digits) if np.isfinite(value) else None
+
+class ItemAnalysisService:
+    """Classical item analysis of one assignment.
+
+    The submitted submissions are loaded once as a students x questions
+    matrix of per-question scores (and, for mcq questions, a matrix of the
+    chosen options); every statistic is then a column-wise NumPy pass over
+    those matrices.
+    """
+
+    def __init__(self, db=None):
+        self.assignments_repo = AssignmentsRepository(db)
+
+    async def analyze_assignment(self, assignment: Assignment) -> Dict[str, Any]:
+        """Item statistics for all submitted submissions of an assignment"""
+        responses = await self.assignments_repo.get_item_responses(assignment.id)
+        return ItemAnalysisService.analyze(assignment, responses)
+
+    @staticmethod
+    def score_matrix(assignment: Assignment, responses: List[Submission]) -> np.ndarray:
+        """Per-question scores, one row per submission and one column per question.
+        Submissions saved before question_scores was stored are scored again."""
+        question_ids = list(assignment.answer_schema)
+        rows = []
+        for submission in responses:
+            scores = submission.question_scores
+            if not scores and submission.answers:
+                _, breakdown = ScoringService.score_submission(submission.answers, assignment.answer_schema)
+                scores = ScoringService.question_scores(breakdown)
+            rows.append([scores.get(question_id, 0.0) for question_id in question_ids])
+        return np.array(rows, dtype=float).reshape(len(rows), len(question_ids))
+
+    @staticmethod
+    def analyze(assignment: Assignment, responses: List[Submission]) -> Dict[str, Any]:
+        """Assignment-level and per-question statistics of the given submissions"""
+        question_ids = list(assignment.answer_schema)
+        scores = ItemAnalysisService.score_matrix(assignment, responses)
+        students, questions = scores.shape
+        max_score = float(questions)
+
+        result = {
+            "assignment_id": assignment.id,
+            "title": assignment.title,
+            "students": students,
+            "max_score": max_score,
+            "average_score": None,
+            "score_stddev": None,
+            "reliability": None,
+            "score_histogram": [0] * HISTOGRAM_BUCKETS,
+            "questions": []
+        }
+        if not students or not questions:
+            return result
+
+        totals = scores.sum(axis=1)
+        # p-value: mean item score, i.e. the share of the item's point the class earned
+        p_values = scores.mean(axis=0)
+        # Point-biserial discrimination against the rest score, so an item is
+        # not correlated with itself
+        rest = totals[:, None] - scores
+        item_dev = scores - p_values
+        rest_dev = rest - rest.mean(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            discrimination = (item_dev * rest_dev).sum(axis=0) / np.sqrt(
+                (item_dev ** 2).sum(axis=0) * (rest_dev ** 2).sum(axis=0))
+            # Cronbach's alpha (KR-20 for right/wrong items); undefined when every
+            # student has the same total
+            total_var = totals.var()
+            reliability = questions / (questions - 1) * (1 - scores.var(axis=0).sum() / total_var) \
+                if questions > 1 and total_var > 0 else np.nan
+
+        # Same deciles as the assignment rollups
+        buckets = np.clip((totals / max_score * HISTOGRAM_BUCKETS).astype(int), 0, HISTOGRAM_BUCKETS - 1)
+        result.update({
+            "average_score": _rounded(totals.mean(), 2),
+            "score_stddev": _rounded(totals.std(), 2),
+            "reliability": _rounded(reliability),
+            "score_histogram": np.bincount(buckets, minlength=HISTOGRAM_BUCKETS).tolist()
+        })
+
+        for column, question_id in enumerate(question_ids):
+            schema = assignment.answer_schema[question_id]
+            values, counts = np.unique(scores[:, column], return_counts=True)
+            item = {
+                "question_id": question_id,
+                "type": schema.type,
+                "p_value": _rounded(p_values[column]),
+                "discrimination": _rounded(discrimination[column]),
+                "score_counts": {f"{value:g}": int(count) for value, count in zip(values, counts)}
+            }
+            if schema.type == 'mcq':
+                # Chosen options, None where the question was skipped; fromiter keeps
+                # malformed (list) answers as single elements
+                chosen = np.fromiter((submission.answers.get(question_id) for submission in responses),
+                                     dtype=object, count=students)
+                options = {option: int(np.count_nonzero(chosen == option)) for option in schema.options or []}
+                omitted = int(np.count_nonzero(np.equal(chosen, None)))
+                item.update({
+                    "correct_option": schema.answer,
+                    "option_counts": options,
+                    "omitted": omitted,
+                    "other": students - omitted - sum(options.values())
+                })
+            result["questions"].append(item)
+
+        return result
@@ -0,0 +1,284 @@
+import asyncio
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Mapping, Tuple
+from ..deps.executor import run_blocking
+from ..deps.mock_db import thaw
+from ..repos.assignments import progress_bucket, progress_bucket_id, progress_change, rollup_contribution, submission_doc_id
+from ..repos.cache import document_cache
+from ..repos.decoding import parse_timestamp
+from ..repos.session import Session
+from .scoring import ScoringService
+
+def _recency(data: Mapping[str, Any]) -> Tuple[bool, datetime]:
+    """Sort key preferring submitted over in-progress, then the latest activity"""
+    timestamp = parse_timestamp(data.get('submitted_at') or data.get('started_at'))
+    if not isinstance(timestamp, datetime):
+        return data.get('submitted_at') is not None, datetime.min
+    return data.get('submitted_at') is not None, timestamp.replace(tzinfo=None)
+
+class MaintenanceService:
+    @staticmethod
+    def recount_students(db) -> Dict[str, int]:
+        """
+        Recompute the denormalized student counters from scratch:
+        classes.student_count from the class rosters and
+        users.accepted_student_count from accepted teacher relations.
+        Only documents whose stored counter is wrong are written.
+        Returns the number of documents fixed per collection.
+        """
+        if hasattr(db, 'create_document'):
+            # Mock database
+            classes = {data['id']: data for data in db.query('classes').stream()}
+            teachers = {data['id']: data for data in db.query('users').where("role", "==", "teacher").stream()}
+            relations = list(db.query('student_teacher_relations').where("status", "==", "accepted").stream())
+        else:
+            # Firebase
+            classes = {doc.id: doc.to_dict() for doc in db.collection('classes').stream()}
+            teachers = {doc.id: doc.to_dict() for doc in db.collection('users').where("role", "==", "teacher").stream()}
+            relations = [doc.to_dict() for doc in
+                         db.collection('student_teacher_relations').where("status", "==", "accepted").stream()]
+
+        accepted = defaultdict(set)
+        for relation in relations:
+            accepted[relation['teacher_uid']].add(relation['student_uid'])
+
+        class_updates = {}
+        for class_id, data in classes.items():
+            count = len(set(data.get('student_uids', [])))
+            if data.get('student_count') != count:
+                class_updates[class_id] = {'student_count': count}
+
+        teacher_updates = {}
+        for teacher_uid, data in teachers.items():
+            count = len(accepted[teacher_uid])
+            if data.get('accepted_student_count') != count:
+                teacher_updates[teacher_uid] = {'accepted_student_count': count}
+
+        batch = db.batch()
+        for collection, updates in (('classes', class_updates), ('users', teacher_updates)):
+            for doc_id, fields in updates.items():
+                if hasattr(db, 'create_document'):
+                    batch.update(collection, doc_id, fields)
+                else:
+                    batch.update(db.collection(collection).document(doc_id), fields)
+        batch.commit()
+
+        return {'classes': len(class_updates), 'users': len(teacher_updates)}
+
+    @staticmethod
+    async def repair_counters() -> Dict[str, int]:
+        """Run recount_students in one session and drop cached copies of the fixed documents"""
+        session = Session()
+        fixed = await run_blocking(MaintenanceService.recount_students, session.db)
+        await session.commit()
+        for collection, count in fixed.items():
+            if count:
+                document_cache.invalidate(collection)
+        return fixed
+
+    @staticmethod
+    def migrate_submission_ids(db) -> int:
+        """
+        Move submissions stored under random IDs to submission_doc_id(assn_id, student_uid).
+        When a student has several submissions for one assignment, the submitted
+        (then most recent) one is kept and the others are deleted.
+        Returns the number of documents moved or removed.
+        """
+        local = hasattr(db, 'create_document')
+        if local:
+            # Mock database
+            docs = [(data['id'], thaw(data)) for data in db.query('submissions').stream()]
+        else:
+            # Firebase
+            docs = [(doc.id, doc.to_dict()) for doc in db.collection('submissions').stream()]
+
+        groups = defaultdict(list)
+        for doc_id, data in docs:
+            groups[submission_doc_id(data['assn_id'], data['student_uid'])].append((doc_id, data))
+
+        batch = db.batch()
+        changed = 0
+        for target_id, group in groups.items():
+            if len(group) == 1 and group[0][0] == target_id:
+                continue
+            _, keep = max(group, key=lambda item: _recency(item[1]))
+            if local:
+                batch.set('submissions', target_id, keep)
+            else:
+                batch.set(db.collection('submissions').document(target_id), keep)
+            for doc_id, _ in group:
+                if doc_id == target_id:
+                    continue
+                if local:
+                    batch.delete('submissions', doc_id)
+                else:
+                    batch.delete(db.collection('submissions').document(doc_id))
+                changed += 1
+        batch.commit()
+
+        return changed
+
+    @staticmethod
+    async def rekey_submissions() -> int:
+        """Run migrate_submission_ids in one session"""
+        session = Session()
+        changed = await run_blocking(MaintenanceService.migrate_submission_ids, session.db)
+        await session.commit()
+        return changed
+
+    @staticmethod
+    def rebuild_rollups(db) -> int:
+        """
+        Recompute every assignment's submission rollup from its submissions
+        and overwrite the stored one. Returns the number of rollups written.
+        """
+        if hasattr(db, 'create_document'):
+            # Mock database
+            assignment_ids = [data['id'] for data in db.query('assignments').select(['class_id']).stream()]
+            submissions = list(db.query('submissions').stream())
+        else:
+            # Firebase
+            assignment_ids = [doc.id for doc in db.collection('assignments').select(['class_id']).stream()]
+            submissions = [doc.to_dict() for doc in db.collection('submissions').stream()]
+
+        rollups = {assignment_id: {'submitted': 0, 'graded': 0, 'score_sum': 0, 'score_sumsq': 0, 'histogram': {}}
+                   for assignment_id in assignment_ids}
+        for data in submissions:
+            rollup = rollups.get(data['assn_id'])
+            if rollup is None:
+                continue
+            contribution = rollup_contribution(data.get('submitted_at') is not None, data.get('score'), data.get('max_score'))
+            for key, amount in contribution.items():
+                if key.startswith('histogram.'):
+                    bucket = key.split('.', 1)[1]
+                    rollup['histogram'][bucket] = rollup['histogram'].get(bucket, 0) + amount
+                else:
+                    rollup[key] += amount
+
+        batch = db.batch()
+        for assignment_id, rollup in rollups.items():
+            if hasattr(db, 'create_document'):
+                batch.set('assignment_rollups', assignment_id, rollup)
+            else:
+                batch.set(db.collection('assignment_rollups').document(assignment_id), rollup)
+        batch.commit()
+
+        return len(rollups)
+
+    @staticmethod
+    async def refresh_rollups() -> int:
+        """Run rebuild_rollups in one session"""
+        session = Session()
+        written = await run_blocking(MaintenanceService.rebuild_rollups, session.db)
+        await session.commit()
+        return written
+
+    @staticmethod
+    def backfill_question_scores(db) -> int:
+        """
+        Score submitted submissions that were saved before per-question
+        scores were stored, and write their question_scores.
+        Returns the number of submissions updated.
+        """
+        if hasattr(db, 'create_document'):
+            # Mock database
+            schemas = {data['id']: data.get('answer_schema', {})
+                       for data in db.query('assignments').select(['answer_schema']).stream()}
+            submissions = [(data['id'], data) for data in db.query('submissions').stream()]
+        else:
+            # Firebase
+            schemas = {doc.id: doc.to_dict().get('answer_schema', {})
+                       for doc in db.collection('assignments').select(['answer_schema']).stream()}
+            submissions = [(doc.id, doc.to_dict()) for doc in db.collection('submissions').stream()]
+
+        updates = {}
+        for doc_id, data in submissions:
+            schema = schemas.get(data['assn_id'])
+            if data.get('submitted_at') is None or data.get('question_scores') or not schema:
+                continue
+            _, breakdown = ScoringService.score_submission(thaw(data.get('answers', {})), thaw(schema))
+            updates[doc_id] = {'question_scores': ScoringService.question_scores(breakdown)}
+
+        batch = db.batch()
+        for doc_id, fields in updates.items():
+            if hasattr(db, 'create_document'):
+                batch.update('submissions', doc_id, fields)
+            else:
+                batch.update(db.collection('submissions').document(doc_id), fields)
+        batch.commit()
+
+        return len(updates)
+
+    @staticmethod
+    async def store_question_scores() -> int:
+        """Run backfill_question_scores in one session"""
+        session = Session()
+        updated = await run_blocking(MaintenanceService.backfill_question_scores, session.db)
+        await session.commit()
+        return updated
+
+    @staticmethod
+    def rebuild_progress(db) -> int:
+        """
+        Recompute every student's day and week progress buckets from the
+        scored submissions, overwrite the stored ones and delete buckets that
+        no longer have submissions. Buckets written before they kept their
+        submissions' scores need this once. Returns the number of buckets written.
+        """
+        if hasattr(db, 'create_document'):
+            # Mock database
+            submissions = list(db.query('submissions').stream())
+            existing = [data['id'] for data in db.query('progress_buckets').select(['student_uid']).stream()]
+        else:
+            # Firebase
+            submissions = [dict(doc.to_dict(), id=doc.id) for doc in db.collection('submissions').stream()]
+            existing = [doc.id for doc in db.collection('progress_buckets').select(['student_uid']).stream()]
+
+        changes = {}
+        for data in submissions:
+            progress_change(changes, data['student_uid'], data['id'], data.get('submitted_at'),
+                            data.get('score'), data.get('max_score'), 1)
+
+        buckets = {
+            progress_bucket_id(*key): progress_bucket(*key, scores)
+            for key, scores in changes.items()
+        }
+
+        batch = db.batch()
+        for bucket_id in existing:
+            if bucket_id not in buckets:
+                if hasattr(db, 'create_document'):
+                    batch.delete('progress_buckets', bucket_id)
+                else:
+                    batch.delete(db.collection('progress_buckets').document(bucket_id))
+        for bucket_id, bucket in buckets.items():
+            if hasattr(db, 'create_document'):
+                batch.set('progress_buckets', bucket_id, bucket)
+            else:
+                batch.set(db.collection('progress_buckets').document(bucket_id), bucket)
+        batch.commit()
+
+        return len(buckets)
+
+    @staticmethod
+    async def refresh_progress() -> int:
+        """Run rebuild_progress in one session"""
+        session = Session()
+        written = await run_blocking(MaintenanceService.rebuild_progress, session.db)
+        await session.commit()
+        return written
+
+JOBS = {
+    'counters': MaintenanceService.repair_counters,
+    'submission-ids': MaintenanceService.rekey_submissions,
+    'rollups': MaintenanceService.refresh_rollups,
+    'question-scores': MaintenanceService.store_question_scores,
+    'progress': MaintenanceService.refresh_progress,
+}
+
+if __name__ == "__main__":
+    # python -m app.services.maintenance [counters|submission-ids|rollups|question-scores|progress ...]
+    for job in sys.argv[1:] or ['counters']:
+        print(job, asyncio.run(JOBS[job]()))
@@ -16,6 +16,9 @@ class ScoringService:
                 continue
                 
             schema = answer_schema[question_id]
+            if hasattr(schema, 'dict'):
+                # Validated QuestionSchema models coming from Assignment
+                schema = schema.dict(exclude_none=True)
             question_score = 0
             feedback = ""
             
@@ -102,6 +105,11 @@ class ScoringService:
         
         return total_score, breakdown
     
+    @staticmethod
+    def question_scores(breakdown: Dict[str, Any]) -> Dict[str, float]:
+        """Compact per-question scores of a breakdown, as stored on the submission"""
+        return {question_id: float(item['score']) for question_id, item in breakdown.items()}
+    
     @staticmethod
     def generate_feedback(breakdown: Dict[str, Any], score: float, max_score: float) -> str:
         """Generate overall feedback based on score breakdown"""
@@ -0,0 +1,35 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.deps import firebase
+from app.deps.mock_db import MockDatabase
+from app.deps.sqlite_db import SQLiteDatabase
+from app.repos.cache import document_cache
+
+@pytest.fixture(params=["mock", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "mock":
+        return MockDatabase(str(tmp_path / "mock_data.json"), journal=True, indexes={})
+    return SQLiteDatabase(str(tmp_path / "mock_data.sqlite3"), seed_file=None, indexes={})
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    # The document cache is process-wide; every test starts from its own store
+    document_cache.clear()
+    yield
+    document_cache.clear()
+
+@pytest.fixture
+def user():
+    """Who the api client is signed in as; tests change uid and role in place"""
+    return {"uid": "teacher_1", "role": "teacher"}
+
+@pytest.fixture
+def api(store, user, monkeypatch):
+    """Test client whose requests run against store"""
+    from app.main import app
+
+    monkeypatch.setattr(firebase, "_db", store)
+    app.dependency_overrides[firebase.verify_token] = lambda: dict(user)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
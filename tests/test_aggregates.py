@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from app.deps.firestore_fake import FakeFirestore
+from app.deps.mock_db import thaw
+from app.repos.assignments import AssignmentsRepository
+from app.repos.individual_assignments import IndividualAssignmentsRepository
+from app.repos.lessons import LessonsRepository
+
+@pytest.fixture(params=["local", "firestore"])
+def client(request, store):
+    """The store itself, or the Firestore fake over it to run the Firebase code paths"""
+    return store if request.param == "local" else FakeFirestore(store)
+
+def documents(store, collection, **filters):
+    return [thaw(data) for data in store.get_all_documents(collection)
+            if all(data.get(field) == value for field, value in filters.items())]
+
+def python_submission_stats(store, student_uid):
+    """What student analytics computed before it used aggregation queries"""
+    submissions = documents(store, "submissions", student_uid=student_uid)
+    scores = [s["score"] for s in submissions if s.get("score") is not None]
+    return {
+        "total": len(submissions),
+        "completed": len([s for s in submissions if s.get("submitted_at")]),
+        "average_score": sum(scores) / len(scores) if scores else 0
+    }
+
+def fill_submissions(store):
+    rows = [
+        ("s1", "2025-01-01T10:00:00", 3), ("s1", "2025-01-02T10:00:00", 4.5),
+        ("s1", "2025-01-03T10:00:00", 0), ("s1", None, None),
+        # Graded draft: counts for the average but not as completed
+        ("s1", None, 2),
+        ("s2", "2025-01-01T10:00:00", None), ("s2", None, None),
+        ("s3", "2025-01-01T10:00:00", 1),
+    ]
+    store.create_documents("submissions", [
+        {"assn_id": f"a{i}", "student_uid": student_uid, "answers": {}, "max_score": 5,
+         "submitted_at": submitted_at, "score": score}
+        for i, (student_uid, submitted_at, score) in enumerate(rows)
+    ])
+
+@pytest.mark.parametrize("student_uid", ["s1", "s2", "s3", "nobody"])
+def test_student_submission_stats_match_python(store, client, student_uid):
+    fill_submissions(store)
+    stats = asyncio.run(AssignmentsRepository(client).get_student_submission_stats(student_uid))
+    assert stats == pytest.approx(python_submission_stats(store, student_uid))
+
+def test_teacher_assignment_stats_match_python(store, client):
+    store.create_documents("individual_assignments", [
+        {"teacher_uid": teacher_uid, "student_uid": f"s{i}", "status": status, "score": score}
+        for i, (teacher_uid, status, score) in enumerate([
+            ("t1", "assigned", None), ("t1", "in_progress", None), ("t1", "in_progress", 3),
+            ("t1", "completed", 80), ("t1", "completed", 65.5), ("t1", "completed", None),
+            ("t1", "cancelled", 10), ("t2", "completed", 5), ("t2", "assigned", None),
+        ])
+    ])
+    repo = IndividualAssignmentsRepository(client)
+    for teacher_uid in ("t1", "t2", "t3"):
+        assignments = documents(store, "individual_assignments", teacher_uid=teacher_uid)
+        scores = [a["score"] for a in assignments if a["status"] == "completed" and a["score"] is not None]
+        assert asyncio.run(repo.get_teacher_assignment_stats(teacher_uid)) == pytest.approx({
+            "active": len([a for a in assignments if a["status"] in ("assigned", "in_progress")]),
+            "average_score": sum(scores) / len(scores) if scores else 0
+        })
+
+def test_lesson_count_matches_python(store, client):
+    dates = ["2025-01-31T23:00:00", "2025-02-01T00:00:00", "2025-02-14T09:30:00", "2025-03-01T09:00:00"]
+    store.create_documents("lessons", [
+        {"teacher_uid": teacher_uid, "student_uid": "s1", "lesson_date": lesson_date}
+        for teacher_uid in ("t1", "t2") for lesson_date in dates[:3 if teacher_uid == "t2" else 4]
+    ])
+    repo = LessonsRepository(client)
+    since = datetime(2025, 2, 1)
+    for teacher_uid in ("t1", "t2", "t3"):
+        lessons = documents(store, "lessons", teacher_uid=teacher_uid)
+        expected = len([l for l in lessons if datetime.fromisoformat(l["lesson_date"]) >= since])
+        assert asyncio.run(repo.count_teacher_lessons_since(teacher_uid, since)) == expected
+
+def test_student_analytics_endpoint_matches_python(store, api):
+    fill_submissions(store)
+    batch = store.batch()
+    batch.set("users", "s1", {"role": "student", "display_name": "s1", "email": "s1@example.com"})
+    batch.commit()
+    response = api.get("/api/analytics/student/s1")
+    assert response.status_code == 200
+    expected = python_submission_stats(store, "s1")
+    body = response.json()
+    assert (body["total_assignments"], body["completed_assignments"], body["completion_rate"]) == \
+        (expected["total"], expected["completed"], round(expected["completed"] / expected["total"] * 100, 1))
+    assert body["average_score"] == round(expected["average_score"], 2)
@@ -0,0 +1,93 @@
+import asyncio
+import math
+
+from app.deps.mock_db import thaw
+from app.models.schemas import SubmitAnswersRequest
+from app.repos.assignments import HISTOGRAM_BUCKETS, AssignmentsRepository
+from app.repos.base import IN_QUERY_LIMIT
+from app.repos.decoding import class_codec
+from app.services.analytics import AnalyticsService
+
+def fill_school(store):
+    """More classes than one 'in' query takes, with graded, ungraded and draft submissions"""
+    repo = AssignmentsRepository(store)
+    classes = store.create_documents("classes", [
+        {"name": f"Sınıf {i}", "teacher_uid": "t1" if i <= IN_QUERY_LIMIT + 5 else "t2", "grade": 7,
+         "student_uids": [], "student_count": 3 + i % 4}
+        for i in range(IN_QUERY_LIMIT + 8)
+    ])
+    assignments = store.create_documents("assignments", [
+        {"title": f"Ödev {i}", "class_id": class_id, "teacher_uid": "t1", "type": "homework",
+         "question_count": 4, "answer_schema": {}}
+        for i, class_id in enumerate(classes * 2) if i % 3
+    ])
+
+    async def save_all():
+        for i, assignment_id in enumerate(assignments):
+            for student in range(i % 4):
+                submit = (i + student) % 3 != 0
+                score = float((i * 7 + student) % 5) if submit and student != 1 else None
+                await repo.save_student_answers(assignment_id, f"s{student}", SubmitAnswersRequest(answers={}, submit=submit), 4, score)
+
+    asyncio.run(save_all())
+    return classes
+
+def teacher_data(store, teacher_uid):
+    classes = [thaw(d) for d in store.get_all_documents("classes") if d["teacher_uid"] == teacher_uid]
+    class_ids = {c["id"] for c in classes}
+    assignments = [thaw(d) for d in store.get_all_documents("assignments") if d["class_id"] in class_ids]
+    return classes, assignments
+
+def submitted(store, assignment_id):
+    return [thaw(d) for d in store.get_all_documents("submissions")
+            if d["assn_id"] == assignment_id and d.get("submitted_at") is not None]
+
+def test_teacher_overview_matches_an_unbatched_count(store):
+    fill_school(store)
+    classes, assignments = teacher_data(store, "t1")
+    submissions = [s for a in assignments for s in submitted(store, a["id"])]
+    score_sum = sum(s["score"] or 0 for s in submissions)
+
+    overview = asyncio.run(AnalyticsService(store).teacher_overview("t1"))
+    assert len(classes) > IN_QUERY_LIMIT
+    assert overview == {
+        "total_classes": len(classes),
+        "total_students": sum(c["student_count"] for c in classes),
+        "total_assignments": len(assignments),
+        "total_submissions": len(submissions),
+        "average_score": round(score_sum / len(submissions), 2)
+    }
+
+def test_class_breakdown_matches_an_unbatched_computation(store):
+    class_ids = fill_school(store)
+    service = AnalyticsService(store)
+    checked = 0
+    for class_id in class_ids[:6]:
+        class_obj = class_codec.decode(store.get_document("classes", class_id))
+        expected = []
+        for assignment in [thaw(d) for d in store.get_all_documents("assignments") if d["class_id"] == class_id]:
+            submissions = submitted(store, assignment["id"])
+            if not submissions:
+                continue
+            scores = [s["score"] for s in submissions if s["score"] is not None]
+            mean = sum(scores) / len(scores) if scores else 0
+            histogram = [0] * HISTOGRAM_BUCKETS
+            for score in scores:
+                histogram[min(int(score / 4 * HISTOGRAM_BUCKETS), HISTOGRAM_BUCKETS - 1)] += 1
+            expected.append({
+                "assignment_id": assignment["id"],
+                "title": assignment["title"],
+                "total_students": class_obj.student_count,
+                "submitted": len(submissions),
+                "completion_rate": round(len(submissions) / class_obj.student_count * 100, 1),
+                "average_score": round(mean, 2),
+                "score_stddev": round(math.sqrt(sum((s - mean) ** 2 for s in scores) / len(scores)) if scores else 0, 2),
+                "score_histogram": histogram,
+                "max_score": 4
+            })
+
+        breakdown = asyncio.run(service.class_breakdown(class_obj))
+        assert sorted(breakdown["assignment_analytics"], key=lambda a: a["assignment_id"]) == \
+            sorted(expected, key=lambda a: a["assignment_id"])
+        checked += len(expected)
+    assert checked
@@ -0,0 +1,100 @@
+import asyncio
+
+from app.repos import cache
+from app.repos.assignments import AssignmentsRepository
+from app.repos.cache import DocumentCache, document_cache
+from app.repos.session import SessionStore
+
+class Loader:
+    """Loader that counts its calls and returns the call number"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls
+
+def create_assignment(store, teacher_uid="t1", title="Kesirler"):
+    return store.create_document("assignments", {
+        "title": title, "class_id": "c1", "teacher_uid": teacher_uid, "type": "homework",
+        "question_files": [{"name": "q.pdf"}], "question_count": 1,
+        "answer_schema": {"q1": {"type": "mcq", "options": ["A", "B"], "answer": "A"}},
+        "created_at": "2025-01-01T10:00:00"
+    })
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    documents = DocumentCache(ttls={"things": 10})
+    load = Loader()
+
+    assert documents.get_or_load("things", "k", load) == 1
+    now[0] += 9
+    assert documents.get_or_load("things", "k", load) == 1
+    now[0] += 2
+    assert documents.get_or_load("things", "k", load) == 2
+
+def test_least_recently_used_entry_is_evicted():
+    documents = DocumentCache(max_entries=2, ttls={"things": 60})
+    for key in ("a", "b"):
+        documents.get_or_load("things", key, lambda: key)
+    # Reading a makes b the least recently used
+    documents.get_or_load("things", "a", Loader())
+    documents.get_or_load("things", "c", lambda: "c")
+
+    load = Loader()
+    assert documents.get_or_load("things", "a", load) == "a"
+    assert documents.get_or_load("things", "b", load) == 1
+    assert documents.stats()["collections"]["things"]["evictions"] == 2
+
+def test_load_racing_an_invalidation_is_not_stored():
+    documents = DocumentCache(ttls={"things": 60})
+
+    def stale_load():
+        # A write lands while this read is still running
+        documents.invalidate("things")
+        return "stale"
+
+    assert documents.get_or_load("things", "k", stale_load) == "stale"
+    assert documents.get_or_load("things", "k", lambda: "fresh") == "fresh"
+
+def test_session_writes_invalidate_again_on_flush(store):
+    assignment_id = create_assignment(store)
+    assert asyncio.run(AssignmentsRepository(store).get_assignment(assignment_id)).title == "Kesirler"
+
+    session = SessionStore(store)
+    assert asyncio.run(AssignmentsRepository(session).update_assignment(assignment_id, {"title": "Oranlar"}))
+    # Read by another request before the session is flushed: caches the old title again
+    assert asyncio.run(AssignmentsRepository(store).get_assignment(assignment_id)).title == "Kesirler"
+
+    session.flush()
+    assert asyncio.run(AssignmentsRepository(store).get_assignment(assignment_id)).title == "Oranlar"
+
+def test_changing_a_returned_model_leaves_the_cache_alone(store):
+    repo = AssignmentsRepository(store)
+    assignment_id = create_assignment(store)
+
+    assignment = asyncio.run(repo.get_assignment(assignment_id))
+    assignment.title = "Changed"
+    assignment.question_files[0]["name"] = "changed.pdf"
+    assignment.answer_schema["q1"].options.append("C")
+    assignment.answer_schema["q2"] = assignment.answer_schema["q1"]
+
+    hits = document_cache.stats()["collections"]["assignments"]["hits"]
+    cached = asyncio.run(repo.get_assignment(assignment_id))
+    assert document_cache.stats()["collections"]["assignments"]["hits"] == hits + 1
+    assert cached.title == "Kesirler"
+    assert cached.question_files == [{"name": "q.pdf"}]
+    assert list(cached.answer_schema) == ["q1"]
+    assert cached.answer_schema["q1"].options == ["A", "B"]
+
+def test_only_the_first_teacher_assignments_page_is_cached(store):
+    repo = AssignmentsRepository(store)
+    for i in range(3):
+        create_assignment(store, title=f"Ödev {i}")
+
+    assert len(asyncio.run(repo.get_teacher_assignments("t1")).items) == 3
+    assert document_cache.stats()["entries"] == 1
+    first = asyncio.run(repo.get_teacher_assignments("t1", limit=2))
+    asyncio.run(repo.get_teacher_assignments("t1", limit=2, cursor=first.next_cursor))
+    assert document_cache.stats()["entries"] == 1
@@ -0,0 +1,111 @@
+"""Concurrent writers against the local stores.
+
+Run with: python -m pytest tests
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from google.cloud import firestore
+
+from app.deps.firestore_fake import FakeFirestore
+from app.models.schemas import SubmitAnswersRequest
+from app.repos.assignments import AssignmentsRepository, rollup_contribution
+from app.repos.classes import ClassesRepository
+from app.repos.membership import MembershipRepository
+from app.repos.session import SessionStore
+
+WRITERS = 200
+
+def hammer(fn, count: int = WRITERS):
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(fn, range(count)))
+
+def test_batch_increments_are_not_lost(store):
+    client = FakeFirestore(store)
+    ref = client.collection("counters").document("c1")
+    ref.set({"value": 0})
+
+    def increment(_):
+        batch = client.batch()
+        batch.update(ref, {"value": firestore.Increment(1)})
+        batch.commit()
+
+    hammer(increment)
+    assert ref.get().to_dict()["value"] == WRITERS
+
+def test_session_transforms_apply_to_current_data(store):
+    FakeFirestore(store).collection("counters").document("c1").set({"value": 0})
+
+    def increment(_):
+        # One request: read the counter, then increment it
+        session = SessionStore(store)
+        ref = FakeFirestore(session).collection("counters").document("c1")
+        ref.get()
+        ref.update({"value": firestore.Increment(1)})
+        session.flush()
+
+    hammer(increment)
+    assert FakeFirestore(store).collection("counters").document("c1").get().to_dict()["value"] == WRITERS
+
+def test_concurrent_saves_keep_rollups_consistent(store):
+    students = [f"s{i}" for i in range(10)]
+
+    def save(i):
+        # One request per save: drafts and submissions of the same students interleave
+        session = SessionStore(store)
+        repo = AssignmentsRepository(session)
+        submit = (i // len(students)) % 2 == 1
+        asyncio.run(repo.save_student_answers(
+            "a1", students[i % len(students)], SubmitAnswersRequest(answers={"q1": "A"}, submit=submit),
+            4, float(i % 5) if submit else None, "ok" if submit else None))
+        session.flush()
+
+    hammer(save, 100)
+
+    repo = AssignmentsRepository(store)
+    submissions = asyncio.run(repo.get_assignment_submissions("a1"))
+    assert len(submissions) == len(students)
+    # Every student submitted at least once; a later draft must not undo that
+    assert all(submission.submitted_at is not None for submission in submissions)
+    expected = {}
+    for submission in submissions:
+        for key, amount in rollup_contribution(True, submission.score, submission.max_score).items():
+            expected[key] = expected.get(key, 0) + amount
+    rollup = FakeFirestore(store).collection("assignment_rollups").document("a1").get().to_dict()
+    histogram = {key.split(".", 1)[1]: amount for key, amount in expected.items() if key.startswith("histogram.")}
+    assert rollup["submitted"] == expected["submitted"]
+    assert rollup["graded"] == expected["graded"]
+    assert rollup["score_sum"] == pytest.approx(expected["score_sum"])
+    assert {k: v for k, v in rollup["histogram"].items() if v} == histogram
+
+def test_concurrent_class_membership_changes(store):
+    class_id = store.create_document("classes", {"name": "7A", "student_uids": [], "student_count": 0})
+
+    def join(i):
+        session = SessionStore(store)
+        assert asyncio.run(ClassesRepository(session).add_student_to_class(class_id, f"s{i % 50}"))
+        session.flush()
+
+    hammer(join)
+    class_data = store.get_document("classes", class_id)
+    assert sorted(class_data["student_uids"]) == sorted(f"s{i}" for i in range(50))
+    assert class_data["student_count"] == 50
+
+def test_concurrent_membership_changes_keep_both_sides(store):
+    class_id = store.create_document("classes", {"name": "7B", "student_uids": [], "student_count": 0})
+    batch = store.batch()
+    for i in range(20):
+        batch.set("users", f"s{i}", {"role": "student", "class_ids": []})
+    batch.commit()
+
+    def join(i):
+        session = SessionStore(store)
+        assert asyncio.run(MembershipRepository(session).add_students(class_id, [f"s{i % 20}", f"s{(i + 1) % 20}"]))
+        session.flush()
+
+    hammer(join)
+    class_data = store.get_document("classes", class_id)
+    assert sorted(class_data["student_uids"]) == sorted(f"s{i}" for i in range(20))
+    assert class_data["student_count"] == 20
+    assert all(list(store.get_document("users", f"s{i}")["class_ids"]) == [class_id] for i in range(20))
@@ -0,0 +1,32 @@
+def test_accepting_a_student_moves_the_teacher_counter(store, api, user):
+    batch = store.batch()
+    batch.set("users", "teacher_1", {"role": "teacher", "display_name": "Selami", "email": "t@example.com",
+                                     "class_ids": [], "accepted_student_count": 0})
+    for uid in ("s1", "s2"):
+        batch.set("users", uid, {"role": "student", "display_name": uid, "email": f"{uid}@example.com",
+                                 "class_ids": [], "created_at": "2025-01-01T10:00:00"})
+    batch.commit()
+    store.create_documents("student_teacher_relations", [
+        {"student_uid": uid, "teacher_uid": "teacher_1", "status": "pending"} for uid in ("s1", "s2")
+    ])
+
+    assert api.post("/api/teacher/students/s1/accept").status_code == 200
+    assert api.post("/api/teacher/students/s2/reject").status_code == 200
+    assert api.post("/api/teacher/students/s2/accept").status_code == 404
+    assert store.get_document("users", "teacher_1")["accepted_student_count"] == 1
+
+    user.update(uid="s1", role="student")
+    teachers = api.get("/api/student/teachers/available").json()
+    assert [(t["uid"], t["student_count"]) for t in teachers] == [("teacher_1", 1)]
+
+def test_student_profiles_leave_out_the_teacher_counter(store, api):
+    class_id = store.create_document("classes", {"name": "7A", "teacher_uid": "teacher_1", "grade": 7,
+                                                 "student_uids": ["s1"], "student_count": 1})
+    batch = store.batch()
+    batch.set("users", "s1", {"role": "student", "display_name": "s1", "email": "s1@example.com",
+                              "class_ids": [class_id], "created_at": "2025-01-01T10:00:00"})
+    batch.commit()
+
+    students = api.get(f"/api/teacher/classes/{class_id}/students").json()
+    assert [student["uid"] for student in students] == ["s1"]
+    assert "accepted_student_count" not in students[0]
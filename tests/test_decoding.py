@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime
+
+from app.repos.classes import ClassesRepository
+from app.repos.decoding import assignment_codec, class_codec
+
+def test_changing_a_decoded_model_cannot_reach_the_store(store, monkeypatch):
+    # Read straight from the store, not from the document cache
+    monkeypatch.setenv("CACHE_TTL_CLASSES", "0")
+    class_id = store.create_document("classes", {"name": "7A", "teacher_uid": "t1", "grade": 7,
+                                                 "student_uids": ["s1"], "student_count": 1})
+    repo = ClassesRepository(store)
+
+    for class_obj in (asyncio.run(repo.get_class(class_id)), asyncio.run(repo.get_teacher_classes("t1"))[0]):
+        class_obj.student_uids.append("s2")
+        class_obj.name = "Changed"
+
+    stored = store.get_document("classes", class_id)
+    assert (list(stored["student_uids"]), stored["name"]) == (["s1"], "7A")
+    assert asyncio.run(repo.get_class(class_id)).student_uids == ["s1"]
+
+def test_decode_copies_only_model_fields(store):
+    assignment_id = store.create_document("assignments", {
+        "title": "Kesirler", "class_id": "c1", "teacher_uid": "t1", "type": "quiz", "question_count": 1,
+        "question_files": [{"name": "q.pdf"}],
+        "answer_schema": {"q1": {"type": "mcq", "options": ["A", "B"], "answer": "A"}},
+        "unused": {"big": list(range(10))}
+    })
+    assignment = assignment_codec.decode(store.get_document("assignments", assignment_id))
+
+    assert assignment.id == assignment_id
+    assert isinstance(assignment.created_at, datetime)
+    assert assignment.answer_schema["q1"].options == ["A", "B"]
+    # Plain JSON types, so the model serializes
+    assert isinstance(assignment.question_files[0], dict)
+    assert "unused" not in assignment.model_dump_json()
+    assignment.answer_schema["q1"].options.append("C")
+    assert list(store.get_document("assignments", assignment_id)["answer_schema"]["q1"]["options"]) == ["A", "B"]
+
+def test_decode_takes_the_id_from_the_caller():
+    assert class_codec.decode({"name": "7A", "teacher_uid": "t1", "grade": 7, "created_at": "2025-01-01T10:00:00",
+                               "id": "stored"}, "given").id == "given"
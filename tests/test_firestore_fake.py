@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from google.cloud import firestore
+
+from app.deps.firestore_fake import FakeFirestore
+from app.deps.mock_db import MockDatabase
+
+def test_only_fields_written_as_timestamps_decode(tmp_path):
+    client = FakeFirestore(MockDatabase(str(tmp_path / "mock_data.json"), journal=True, indexes={}))
+    ref = client.collection("notes").document("n1")
+    ref.set({
+        "text": "2024-01-01T10:00:00",
+        "created_at": firestore.SERVER_TIMESTAMP,
+        "meta": {"due": datetime(2024, 1, 2, tzinfo=timezone.utc)}
+    })
+    ref.update({"created_at": "later"})
+
+    data = ref.get().to_dict()
+    assert data["text"] == "2024-01-01T10:00:00"
+    assert data["created_at"] == "later"
+    assert data["meta"]["due"] == datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    selected = next(client.collection("notes").select(["meta"]).stream()).to_dict()
+    assert selected["meta"]["due"] == datetime(2024, 1, 2, tzinfo=timezone.utc)
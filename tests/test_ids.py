@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.deps import ids
+from app.deps.ids import IdAllocator
+
+def test_ids_are_unique_and_ordered_across_threads():
+    allocator = IdAllocator()
+    per_thread = {}
+
+    def allocate(n):
+        mine = []
+        for i in range(500):
+            mine += allocator.new_ids("docs", 3) if i % 5 == 0 else [allocator.new_id("docs")]
+        per_thread[threading.get_ident(), n] = mine
+
+    threads = [threading.Thread(target=allocate, args=(n,)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    all_ids = [doc_id for mine in per_thread.values() for doc_id in mine]
+    assert len(all_ids) == len(set(all_ids)) == 16 * (400 + 100 * 3)
+    for mine in per_thread.values():
+        # Each thread sees its IDs in the order it asked for them
+        assert mine == sorted(mine)
+    assert all(doc_id.startswith("docs_") and len(doc_id) == len(all_ids[0]) for doc_id in all_ids)
+
+def test_ids_keep_increasing_when_the_clock_steps_back_or_stalls(monkeypatch):
+    clock = [1_700_000_000.0]
+    monkeypatch.setattr(ids.time, "time", lambda: clock[0])
+    allocator = IdAllocator()
+
+    issued = allocator.new_ids("docs", 10)
+    clock[0] -= 5
+    issued += allocator.new_ids("docs", 10)
+    # More IDs in one millisecond than the sequence holds
+    issued += allocator.new_ids("docs", ids._MAX_SEQ + 10)
+    clock[0] += 10
+    issued += [allocator.new_id("docs")]
+
+    assert issued == sorted(issued)
+    assert len(set(issued)) == len(issued)
+
+def test_stores_create_unique_ids_under_concurrent_writers(store):
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        created = list(pool.map(lambda i: store.create_document("notes", {"n": i}), range(200)))
+    created += store.create_documents("notes", [{"n": i} for i in range(50)])
+
+    assert len(set(created)) == len(created) == 250
+    assert sorted(data["id"] for data in store.get_all_documents("notes")) == sorted(created)
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from app.models.schemas import Assignment, QuestionSchema, Submission
+from app.services.item_analysis import ItemAnalysisService
+
+def assignment(**questions):
+    return Assignment(id="a1", title="Kesirler", class_id="c1", teacher_uid="t1", type="quiz",
+                      question_count=len(questions), answer_schema=questions, created_at=datetime(2025, 1, 1))
+
+def responses(*rows):
+    """One submission per (question_scores, answers) row"""
+    return [Submission(id=f"a1__s{i}", assn_id="a1", student_uid=f"s{i}", max_score=len(scores),
+                       question_scores=scores, answers=answers)
+            for i, (scores, answers) in enumerate(rows)]
+
+def test_statistics_of_a_small_class():
+    quiz = assignment(
+        q1=QuestionSchema(type="mcq", options=["A", "B", "C"], answer="A"),
+        q2=QuestionSchema(type="mcq", options=["A", "B", "C"], answer="B"),
+        q3=QuestionSchema(type="numeric", answer=4)
+    )
+    result = ItemAnalysisService.analyze(quiz, responses(
+        ({"q1": 1, "q2": 1, "q3": 1}, {"q1": "A", "q2": "B", "q3": 4}),
+        ({"q1": 1, "q2": 1, "q3": 0}, {"q1": "A", "q2": "B", "q3": 5}),
+        # "D" is not one of the options
+        ({"q1": 1, "q2": 0, "q3": 0}, {"q1": "A", "q2": "D"}),
+        # q1 skipped
+        ({"q1": 0, "q2": 0, "q3": 0}, {"q2": "A"}),
+    ))
+
+    # Totals 3, 2, 1, 0 out of 3
+    assert result["students"] == 4
+    assert result["max_score"] == 3.0
+    assert result["average_score"] == 1.5
+    assert result["score_stddev"] == 1.12
+    # alpha = 3/2 * (1 - (0.1875 + 0.25 + 0.1875) / 1.25)
+    assert result["reliability"] == 0.75
+    assert result["score_histogram"] == [1, 0, 0, 1, 0, 0, 1, 0, 0, 1]
+
+    q1, q2, q3 = result["questions"]
+    assert [q["p_value"] for q in (q1, q2, q3)] == [0.75, 0.5, 0.25]
+    # Item-rest correlations: 0.75 / sqrt(0.75 * 2.75), 1 / sqrt(2), 0.75 / sqrt(0.75 * 2.75)
+    assert [q["discrimination"] for q in (q1, q2, q3)] == [0.522, 0.707, 0.522]
+    assert q1["score_counts"] == {"0": 1, "1": 3}
+    assert (q1["correct_option"], q1["option_counts"], q1["omitted"], q1["other"]) == \
+        ("A", {"A": 3, "B": 0, "C": 0}, 1, 0)
+    assert (q2["correct_option"], q2["option_counts"], q2["omitted"], q2["other"]) == \
+        ("B", {"A": 1, "B": 2, "C": 0}, 0, 1)
+    assert "option_counts" not in q3
+
+def test_constant_totals_have_no_reliability():
+    quiz = assignment(q1=QuestionSchema(type="numeric", answer=1), q2=QuestionSchema(type="numeric", answer=2))
+    result = ItemAnalysisService.analyze(quiz, responses(
+        ({"q1": 1, "q2": 0}, {}),
+        ({"q1": 0, "q2": 1}, {}),
+    ))
+    assert result["score_stddev"] == 0.0
+    assert result["reliability"] is None
+    assert [q["discrimination"] for q in result["questions"]] == [-1.0, -1.0]
+
+def test_single_question_has_no_discrimination_or_reliability():
+    quiz = assignment(q1=QuestionSchema(type="numeric", answer=1))
+    result = ItemAnalysisService.analyze(quiz, responses(({"q1": 1}, {}), ({"q1": 0}, {})))
+    assert result["questions"][0]["p_value"] == 0.5
+    assert result["questions"][0]["discrimination"] is None
+    assert result["reliability"] is None
+
+def test_no_submissions():
+    quiz = assignment(q1=QuestionSchema(type="numeric", answer=1))
+    result = ItemAnalysisService.analyze(quiz, [])
+    assert (result["students"], result["average_score"], result["questions"]) == (0, None, [])
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.deps.firestore_fake import FakeFirestore
+from app.deps.mock_db import thaw
+from app.models.schemas import SubmitAnswersRequest
+from app.repos.assignments import AssignmentsRepository, submission_doc_id
+from app.services.maintenance import MaintenanceService
+
+@pytest.fixture(params=["local", "firestore"])
+def client(request, store):
+    """The store itself, or the Firestore fake over it to run the Firebase code paths"""
+    return store if request.param == "local" else FakeFirestore(store)
+
+def set_documents(store, collection, docs):
+    batch = store.batch()
+    for doc_id, data in docs.items():
+        batch.set(collection, doc_id, data)
+    batch.commit()
+
+def submission(assignment_id, student_uid, started_at, submitted_at=None, score=None, answers=None):
+    return {"assn_id": assignment_id, "student_uid": student_uid, "answers": answers or {},
+            "score": score, "max_score": 4, "started_at": started_at, "submitted_at": submitted_at}
+
+def test_migrate_submission_ids_keeps_the_submitted_duplicate(store, client):
+    set_documents(store, "submissions", {
+        # s1 submitted twice and then opened a new draft
+        "legacy_1": submission("a1", "s1", "2025-01-01T10:00:00", "2025-01-01T11:00:00", 1, {"q1": "A"}),
+        "legacy_2": submission("a1", "s1", "2025-01-02T10:00:00", "2025-01-02T11:00:00", 3, {"q1": "B"}),
+        "legacy_3": submission("a1", "s1", "2025-01-03T10:00:00", answers={"q1": "C"}),
+        "legacy_4": submission("a1", "s2", "2025-01-01T10:00:00"),
+        submission_doc_id("a2", "s3"): submission("a2", "s3", "2025-01-01T10:00:00", "2025-01-01T11:00:00", 4),
+    })
+
+    assert MaintenanceService.migrate_submission_ids(client) == 4
+    stored = {data["id"]: thaw(data) for data in store.query("submissions").stream()}
+    assert sorted(stored) == sorted([submission_doc_id("a1", "s1"), submission_doc_id("a1", "s2"),
+                                     submission_doc_id("a2", "s3")])
+    kept = stored[submission_doc_id("a1", "s1")]
+    assert (kept["answers"], kept["score"], kept["submitted_at"]) == ({"q1": "B"}, 3, "2025-01-02T11:00:00")
+
+    repo = AssignmentsRepository(store)
+    assert asyncio.run(repo.get_student_submission("a1", "s2")).started_at is not None
+    # Nothing left to move
+    assert MaintenanceService.migrate_submission_ids(client) == 0
+
+def rollups(store):
+    """Stored rollups, histograms without emptied buckets"""
+    result = {}
+    for data in store.query("assignment_rollups").stream():
+        rollup = {k: v for k, v in thaw(data).items() if k != "id"}
+        rollup["histogram"] = {k: v for k, v in rollup.get("histogram", {}).items() if v}
+        rollup["score_sum"] = round(rollup.get("score_sum", 0), 6)
+        rollup["score_sumsq"] = round(rollup.get("score_sumsq", 0), 6)
+        result[data["id"]] = rollup
+    return result
+
+def test_rebuild_rollups_matches_the_incremental_rollups(store, client):
+    assignments = store.create_documents("assignments", [
+        {"title": f"Ödev {i}", "class_id": "c1", "teacher_uid": "t1", "question_count": 4} for i in range(3)
+    ])
+    repo = AssignmentsRepository(store)
+
+    async def work():
+        for i in range(12):
+            assignment_id = assignments[i % 3]
+            submit = i % 4 != 3
+            await repo.save_student_answers(assignment_id, f"s{i % 5}", SubmitAnswersRequest(answers={}, submit=submit),
+                                            4, float(i % 5) if submit else None)
+        # Regrades, including one that removes a grade's histogram bucket
+        await repo.update_submission_scores({submission_doc_id(assignments[0], "s0"): (4.0, "ok"),
+                                             submission_doc_id(assignments[1], "s1"): (0.5, "ok")})
+
+    asyncio.run(work())
+    incremental = rollups(store)
+    assert sum(rollup["submitted"] for rollup in incremental.values()) > 0
+
+    batch = store.batch()
+    batch.set("assignment_rollups", assignments[0], {"submitted": 99, "graded": 0, "score_sum": 0,
+                                                     "score_sumsq": 0, "histogram": {"3": 7}})
+    batch.delete("assignment_rollups", assignments[1])
+    batch.commit()
+
+    assert MaintenanceService.rebuild_rollups(client) == len(assignments)
+    assert rollups(store) == incremental
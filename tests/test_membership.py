@@ -0,0 +1,64 @@
+from app.repos.membership import MAX_STUDENTS_PER_COMMIT
+
+def setup_class(store, students=5):
+    class_id = store.create_document("classes", {"name": "7A", "teacher_uid": "teacher_1",
+                                                 "student_uids": [], "student_count": 0})
+    batch = store.batch()
+    for i in range(students):
+        batch.set("users", f"s{i}", {"role": "student", "display_name": f"Öğrenci {i}", "class_ids": []})
+    batch.commit()
+    return class_id
+
+def membership(store, class_id, students):
+    """Both sides of a class's membership: (roster, count, {uid: class_ids})"""
+    class_data = store.get_document("classes", class_id)
+    return (list(class_data["student_uids"]), class_data["student_count"],
+            {uid: list(store.get_document("users", uid)["class_ids"]) for uid in students})
+
+def test_bulk_add_and_remove_update_both_sides(store, api):
+    class_id = setup_class(store)
+    students = [f"s{i}" for i in range(5)]
+
+    response = api.post(f"/api/teacher/classes/{class_id}/students/bulk-add",
+                        json={"student_uids": ["s0", "s1", "s2", "s1"]})
+    assert response.status_code == 200
+    assert membership(store, class_id, students) == (
+        ["s0", "s1", "s2"], 3, {"s0": [class_id], "s1": [class_id], "s2": [class_id], "s3": [], "s4": []})
+
+    response = api.post(f"/api/teacher/classes/{class_id}/students/bulk-remove",
+                        json={"student_uids": ["s0", "s2", "s3"]})
+    assert response.status_code == 200
+    assert membership(store, class_id, students) == (
+        ["s1"], 1, {"s0": [], "s1": [class_id], "s2": [], "s3": [], "s4": []})
+
+def test_unknown_student_changes_nothing(store, api):
+    class_id = setup_class(store)
+    students = [f"s{i}" for i in range(5)]
+    api.post(f"/api/teacher/classes/{class_id}/students/bulk-add", json={"student_uids": ["s0", "s1"]})
+    before = membership(store, class_id, students)
+
+    for action in ("bulk-add", "bulk-remove"):
+        response = api.post(f"/api/teacher/classes/{class_id}/students/{action}",
+                            json={"student_uids": ["s1", "s2", "missing"]})
+        assert response.status_code == 400
+        assert membership(store, class_id, students) == before
+
+    response = api.post("/api/teacher/classes/missing/students/bulk-add", json={"student_uids": ["s3"]})
+    assert response.status_code == 400
+    assert membership(store, class_id, students) == before
+
+def test_bulk_changes_are_capped(store, api):
+    class_id = setup_class(store, students=MAX_STUDENTS_PER_COMMIT + 1)
+    students = [f"s{i}" for i in range(MAX_STUDENTS_PER_COMMIT + 1)]
+
+    response = api.post(f"/api/teacher/classes/{class_id}/students/bulk-add", json={"student_uids": students})
+    assert response.status_code == 400
+    assert str(MAX_STUDENTS_PER_COMMIT) in response.json()["detail"]
+    assert store.get_document("classes", class_id)["student_count"] == 0
+
+    response = api.post(f"/api/teacher/classes/{class_id}/students/bulk-add",
+                        json={"student_uids": students[:MAX_STUDENTS_PER_COMMIT]})
+    assert response.status_code == 200
+    roster, count, class_ids = membership(store, class_id, students)
+    assert count == MAX_STUDENTS_PER_COMMIT and roster == students[:MAX_STUDENTS_PER_COMMIT]
+    assert class_ids[students[-1]] == [] and class_ids[students[0]] == [class_id]
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from app.deps.mock_db import MockDatabase
+
+def test_compaction_keeps_leftover_rotated_journal(tmp_path, monkeypatch):
+    data_file = str(tmp_path / "mock_data.json")
+    db = MockDatabase(data_file, journal=True, indexes={})
+    db.create_document("notes", {"n": 1})
+    # An earlier compaction rotated the journal aside and stopped before saving the shard
+    db._journal_fhs.pop("notes").close()
+    os.replace(db._journal_path("notes"), db._rotated_journal_path("notes"))
+    db.create_document("notes", {"n": 2})
+
+    def crash(collection, docs):
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(db, "_save_shard", crash)
+    with pytest.raises(RuntimeError):
+        db.compact()
+
+    reopened = MockDatabase(data_file, journal=True, indexes={})
+    assert sorted(doc["n"] for doc in reopened.get_all_documents("notes")) == [1, 2]
+
+INDEXES = {"users": {"role": "hash", "class_ids": "array", "meta": "hash"}}
+
+def fill_users(db):
+    """The same writes, including updates and deletes of indexed fields, on any store"""
+    batch = db.batch()
+    for i in range(30):
+        batch.set("users", f"u{i}", {
+            "role": ["student", "teacher", "guardian"][i % 3],
+            "class_ids": [f"c{i % 4}", f"c{i % 5}"] if i % 6 else [],
+            "meta": {"level": i % 2}
+        })
+    batch.commit()
+    db.update_document("users", "u1", {"role": "student", "class_ids": ["c9", "c9"]})
+    db.update_document("users", "u2", {"class_ids": "not a list"})
+    db.update_document("users", "u4", {"meta": {"level": 5}})
+    db.delete_document("users", "u3")
+    db.delete_document("users", "u7")
+
+def ids(results):
+    return sorted(data["id"] for data in results)
+
+@pytest.mark.parametrize("field,operator,value", [
+    ("role", "==", "student"),
+    ("role", "==", "nobody"),
+    ("class_ids", "array_contains", "c1"),
+    ("class_ids", "array_contains", "c9"),
+    ("meta", "==", {"level": 1}),
+    ("meta", "==", {"level": 5}),
+])
+def test_index_lookups_match_a_full_scan(tmp_path, field, operator, value):
+    indexed = MockDatabase(str(tmp_path / "indexed.json"), journal=True, indexes=INDEXES)
+    scanned = MockDatabase(str(tmp_path / "scanned.json"), journal=True, indexes={})
+    fill_users(indexed)
+    fill_users(scanned)
+    reopened = MockDatabase(str(tmp_path / "indexed.json"), journal=True, indexes=INDEXES)
+
+    expected = ids(scanned.query_documents("users", field, operator, value))
+    assert expected == ids(d for d in scanned.get_all_documents("users")
+                           if field in d and (d[field] == value if operator == "==" else
+                                              isinstance(d[field], tuple) and value in d[field]))
+    for db in (indexed, reopened):
+        assert ids(db.query_documents("users", field, operator, value)) == expected
+        assert ids(db.query("users").where(field, operator, value).stream()) == expected
+
+@pytest.mark.parametrize("field,operator,value", [
+    ("role", "in", ["teacher", "guardian"]),
+    ("class_ids", "array_contains_any", ["c0", "c9"]),
+])
+def test_multi_value_index_lookups_match_a_full_scan(tmp_path, field, operator, value):
+    indexed = MockDatabase(str(tmp_path / "indexed.json"), journal=True, indexes=INDEXES)
+    scanned = MockDatabase(str(tmp_path / "scanned.json"), journal=True, indexes={})
+    fill_users(indexed)
+    fill_users(scanned)
+
+    query = lambda db: db.query("users").where(field, operator, value).where("meta", "==", {"level": 0})
+    assert ids(query(indexed).stream()) == ids(query(scanned).stream())
+    assert ids(query(indexed).stream())
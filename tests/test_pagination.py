@@ -0,0 +1,110 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from google.cloud import firestore
+
+from app.deps.firestore_fake import FakeFirestore
+from app.repos.pagination import MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor, fetch_page
+
+def token(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def fill(store, count, created_at="2025-01-01T10:00:00"):
+    return store.create_documents("notes", [{"owner": "t1", "created_at": created_at, "n": i} for i in range(count)])
+
+def queries(store):
+    """The same filtered query on the local store and through the Firestore fake"""
+    return [store.query("notes").where("owner", "==", "t1"),
+            FakeFirestore(store).collection("notes").where("owner", "==", "t1")]
+
+def doc_id(result):
+    return result["id"] if isinstance(result, dict) or hasattr(result, "keys") else result.id
+
+def all_pages(query, limit, order_field=None, direction=firestore.Query.ASCENDING):
+    ids, cursor = [], None
+    while True:
+        results, cursor = fetch_page(query, limit, cursor, order_field, direction)
+        ids += [doc_id(result) for result in results]
+        if cursor is None:
+            return ids
+
+def test_cursor_round_trip():
+    values = [datetime(2025, 1, 2, 3, 4, 5), 7, "x"]
+    assert decode_cursor(encode_cursor(values, "doc_1")) == (values, "doc_1")
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    token(["a", "list"]),
+    token({"v": "not a list", "id": "doc_1"}),
+    token({"v": [], "id": 5}),
+    token({"v": [{"$dt": "yesterday"}], "id": "doc_1"}),
+    token({"id": "doc_1"}),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+def test_cursor_for_another_ordering_is_rejected(store):
+    fill(store, 3)
+    for query in queries(store):
+        with pytest.raises(InvalidCursor):
+            fetch_page(query, 2, encode_cursor([], "notes_1"), "created_at")
+
+def test_tampered_cursor_is_a_bad_request(api):
+    response = api.get("/api/teacher/assignments", params={"cursor": "not a cursor!"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+def test_last_page_has_no_cursor(store):
+    fill(store, 3)
+    for query in queries(store):
+        results, cursor = fetch_page(query, 3, None, "n")
+        assert len(results) == 3 and cursor is None
+
+        results, cursor = fetch_page(query, 2, None, "n")
+        assert len(results) == 2 and cursor is not None
+        results, cursor = fetch_page(query, 2, cursor, "n")
+        assert len(results) == 1 and cursor is None
+
+def test_ties_are_broken_by_id(store):
+    ids = fill(store, 5) + fill(store, 4, created_at="2025-02-01T10:00:00")
+    for query in queries(store):
+        for limit in (1, 2, 4):
+            assert all_pages(query, limit, "created_at") == ids
+            assert all_pages(query, limit, "created_at", firestore.Query.DESCENDING) == \
+                ids[5:][::-1] + ids[:5][::-1]
+
+def test_limit_is_clamped(store):
+    fill(store, MAX_PAGE_SIZE + 5)
+    for query in queries(store):
+        results, cursor = fetch_page(query, 10 * MAX_PAGE_SIZE)
+        assert len(results) == MAX_PAGE_SIZE and cursor is not None
+        results, _ = fetch_page(query, 0)
+        assert len(results) == 1
+
+def test_endpoint_limits_are_validated(api):
+    assert api.get("/api/teacher/assignments", params={"limit": MAX_PAGE_SIZE + 1}).status_code == 422
+    assert api.get("/api/teacher/assignments", params={"limit": 0}).status_code == 422
+
+def test_tracking_stats_count_everything_on_the_server(store, api):
+    now = datetime.now()
+    this_month = datetime(now.year, now.month, 1, 9).isoformat()
+    last_year = datetime(now.year - 1, now.month, 1, 9).isoformat()
+    store.create_documents("lessons", [
+        {"teacher_uid": "teacher_1", "student_uid": "s1", "lesson_date": this_month},
+        {"teacher_uid": "teacher_1", "student_uid": "s2", "lesson_date": this_month},
+        {"teacher_uid": "teacher_1", "student_uid": "s1", "lesson_date": last_year},
+        {"teacher_uid": "teacher_2", "student_uid": "s3", "lesson_date": this_month},
+    ])
+    # More than one page of individual assignments
+    store.create_documents("individual_assignments", [
+        {"teacher_uid": "teacher_1", "student_uid": f"s{i}", "status": status, "score": score}
+        for i, (status, score) in enumerate([("assigned", None), ("in_progress", None)] * 30
+                                            + [("completed", 80), ("completed", 95), ("completed", None)])
+    ] + [{"teacher_uid": "teacher_2", "student_uid": "s1", "status": "completed", "score": 10}])
+
+    response = api.get("/api/teacher/tracking-stats")
+    assert response.status_code == 200
+    assert response.json() == {"monthly_lessons": 2, "active_assignments": 60, "average_score": 87.5}
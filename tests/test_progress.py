@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.deps.mock_db import thaw
+from app.models.schemas import SubmitAnswersRequest
+from app.repos.assignments import AssignmentsRepository, progress_bucket_id, progress_bucket_starts, submission_doc_id
+from app.services.maintenance import MaintenanceService
+
+STUDENT = "s1"
+
+def buckets(store):
+    """Stored progress buckets by ID, with sums rounded for comparison"""
+    return {
+        data["id"]: {k: round(v, 6) if isinstance(v, float) else v for k, v in thaw(data).items() if k != "id"}
+        for data in store.query("progress_buckets").stream()
+    }
+
+def submit(store, assignment_id, score, max_score=4):
+    asyncio.run(AssignmentsRepository(store).save_student_answers(
+        assignment_id, STUDENT, SubmitAnswersRequest(answers={}, submit=True), max_score, score, "ok"))
+
+def regrade(store, assignment_id, score):
+    assert asyncio.run(AssignmentsRepository(store).update_submission_scores(
+        {submission_doc_id(assignment_id, STUDENT): (score, "regraded")}))
+
+def submit_days_ago(store, assignment_id, days, score, max_score=4):
+    """Submission handed in days ago, graded now"""
+    submitted_at = datetime.now(timezone.utc) - timedelta(days=days)
+    batch = store.batch()
+    batch.set("submissions", submission_doc_id(assignment_id, STUDENT), {
+        "assn_id": assignment_id, "student_uid": STUDENT, "answers": {}, "score": None,
+        "max_score": max_score, "submitted_at": submitted_at.isoformat()
+    })
+    batch.commit()
+    regrade(store, assignment_id, score)
+    return submitted_at
+
+def bucket(store, submitted_at, period):
+    start = progress_bucket_starts(submitted_at)[period]
+    return buckets(store).get(progress_bucket_id(STUDENT, period, start))
+
+def test_submit_creates_day_and_week_buckets(store):
+    submit(store, "a1", 3)
+    now = datetime.now(timezone.utc)
+    for period in ("day", "week"):
+        assert bucket(store, now, period) == {
+            "student_uid": STUDENT, "period": period, "start": progress_bucket_starts(now)[period],
+            "scores": {submission_doc_id("a1", STUDENT): 75.0},
+            "count": 1, "percentage_sum": 75.0, "percentage_max": 75.0
+        }
+
+def test_regrade_lowers_max_and_average(store):
+    submit(store, "a1", 4)
+    submit(store, "a2", 2)
+    now = datetime.now(timezone.utc)
+    assert bucket(store, now, "day")["percentage_max"] == 100.0
+
+    regrade(store, "a1", 1)
+    for period in ("day", "week"):
+        day = bucket(store, now, period)
+        assert day["count"] == 2
+        assert day["percentage_max"] == 50.0
+        assert day["percentage_sum"] / day["count"] == 37.5
+
+def test_resubmit_moves_score_between_buckets(store):
+    earlier = submit_days_ago(store, "a1", 10, 2)
+    assert bucket(store, earlier, "day")["count"] == 1
+
+    submit(store, "a1", 4)
+    now = datetime.now(timezone.utc)
+    # The earlier day and week buckets lost their only submission
+    assert bucket(store, earlier, "day") is None
+    assert bucket(store, earlier, "week") is None
+    assert bucket(store, now, "day")["scores"] == {submission_doc_id("a1", STUDENT): 100.0}
+    assert bucket(store, now, "week")["count"] == 1
+
+def test_my_progress_windows(store, api, user):
+    submit(store, "today", 4)
+    submit_days_ago(store, "last_week", 10, 2)
+    submit_days_ago(store, "last_month", 40, 1)
+    submit_days_ago(store, "last_year", 200, 4)
+
+    user.update(uid=STUDENT, role="student")
+    response = api.get("/api/analytics/student/my-progress")
+    assert response.status_code == 200
+    windows = response.json()["scores_over_time"]
+    assert {name: (w["period"], w["count"], w["average_percentage"], w["max_percentage"])
+            for name, w in windows.items()} == {
+        "7d": ("day", 1, 100.0, 100.0),
+        "30d": ("day", 2, 75.0, 100.0),
+        "90d": ("week", 3, 58.33, 100.0),
+    }
+    assert [b["count"] for b in windows["30d"]["buckets"]] == [1, 1]
+
+def test_rebuild_matches_incremental_buckets(store):
+    submit(store, "a1", 4)
+    submit(store, "a2", 3)
+    submit_days_ago(store, "a3", 10, 1)
+    submit_days_ago(store, "a4", 40, 2)
+    regrade(store, "a1", 2)
+    submit(store, "a3", 4)
+    incremental = buckets(store)
+
+    # A stale bucket with no submissions left and a damaged one
+    batch = store.batch()
+    batch.set("progress_buckets", progress_bucket_id(STUDENT, "day", "2000-01-01"),
+              {"student_uid": STUDENT, "period": "day", "start": "2000-01-01", "count": 1})
+    first = sorted(incremental)[0]
+    batch.set("progress_buckets", first, dict(incremental[first], count=99))
+    batch.commit()
+
+    assert MaintenanceService.rebuild_progress(store) == len(incremental)
+    assert buckets(store) == incremental
@@ -0,0 +1,69 @@
+import pytest
+
+from app.deps.mock_db import MockDatabase, thaw
+from app.deps.sqlite_db import SQLiteDatabase
+
+def fill(db):
+    batch = db.batch()
+    for i in range(12):
+        doc = {"teacher_uid": f"t{i % 3}", "score": i % 5, "title": f"Ödev {i:02d}", "tags": [f"g{i % 4}"],
+               "due_at": f"2025-01-{1 + i % 6:02d}T10:00:00"}
+        if i % 4 == 0:
+            doc["score"] = None
+        if i == 7:
+            del doc["due_at"]
+        batch.set("assignments", f"a{i:02d}", doc)
+    batch.commit()
+
+@pytest.fixture
+def stores(tmp_path):
+    """The SQLite store (with and without indexes) and the mock store as the reference"""
+    reference = MockDatabase(str(tmp_path / "mock_data.json"), journal=True, indexes={})
+    sqlite = SQLiteDatabase(str(tmp_path / "a.sqlite3"), seed_file=None, indexes={})
+    indexed = SQLiteDatabase(str(tmp_path / "b.sqlite3"), seed_file=None,
+                             indexes={"assignments": {"teacher_uid": "hash", "tags": "array"}})
+    for db in (reference, sqlite, indexed):
+        fill(db)
+    return reference, [sqlite, indexed]
+
+QUERIES = {
+    "equal": lambda q: q.where("teacher_uid", "==", "t1"),
+    "not equal": lambda q: q.where("teacher_uid", "!=", "t1"),
+    "null": lambda q: q.where("score", "==", None),
+    "not null": lambda q: q.where("score", "!=", None),
+    "range": lambda q: q.where("score", ">=", 2).where("score", "<", 4),
+    "in": lambda q: q.where("teacher_uid", "in", ["t0", "t2"]),
+    "not in": lambda q: q.where("score", "not-in", [1, 2]),
+    "array contains": lambda q: q.where("tags", "array_contains", "g1"),
+    "array contains any": lambda q: q.where("tags", "array_contains_any", ["g0", "g3"]),
+    "timestamp range": lambda q: q.where("due_at", ">", "2025-01-03T00:00:00"),
+    "ordered": lambda q: q.order_by("due_at"),
+    "ordered descending with nulls": lambda q: q.order_by("score", direction="DESCENDING"),
+    "two orders": lambda q: q.where("teacher_uid", "==", "t0").order_by("score").order_by("title", direction="DESCENDING"),
+    "limit": lambda q: q.where("teacher_uid", "==", "t2").order_by("title").limit(2),
+    "start after": lambda q: q.order_by("score").start_after({"score": 2, "id": "a02"}).limit(4),
+    "start after descending": lambda q: q.order_by("due_at", direction="DESCENDING")
+                                         .start_after({"due_at": "2025-01-04T10:00:00", "id": "a03"}),
+    "select": lambda q: q.where("teacher_uid", "==", "t1").order_by("title").select(["title", "missing"]),
+}
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_queries_match_the_mock_store(stores, name):
+    reference, sqlite_stores = stores
+    build = QUERIES[name]
+    expected = [thaw(data) for data in build(reference.query("assignments")).stream()]
+    assert expected
+    for db in sqlite_stores:
+        assert [thaw(data) for data in build(db.query("assignments")).stream()] == expected
+
+def test_ordering_and_cursor_results(stores):
+    _, (db, _) = stores
+    titles = [data["title"] for data in db.query("assignments").where("teacher_uid", "==", "t0")
+              .order_by("due_at", direction="DESCENDING").stream()]
+    assert titles == ["Ödev 03", "Ödev 09", "Ödev 00", "Ödev 06"]
+
+    page = db.query("assignments").order_by("title").start_after({"title": "Ödev 09", "id": "a09"}).stream()
+    assert [data["id"] for data in page] == ["a10", "a11"]
+
+    selected = next(db.query("assignments").where("teacher_uid", "==", "t1").select(["score"]).stream())
+    assert dict(selected) == {"id": "a01", "score": 1}